@@ -0,0 +1,69 @@
+"""
+Бенчмарк AnalyticsEngine.calculate_all_metrics: число проходов groupby по сырым строкам и время.
+
+Для сравнения прогоняются пять отдельных groupby, которые движок делал до куба
+(category, entity дважды, ABC-группировка, дневные пики).
+
+Запуск из каталога app/:
+    python -m benchmarks.bench_analytics --rows 20000000
+"""
+import argparse
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+from unittest.mock import patch
+
+import pandas as pd
+
+from core.analytics_engine import AnalyticsEngine
+from core.data_loader import DataLoader
+
+
+@contextmanager
+def count_full_scans(df: pd.DataFrame) -> Iterator[Dict[str, int]]:
+    """Считает вызовы DataFrame.groupby по фрейму той же длины, что и исходный"""
+    counter = {'scans': 0}
+    original = pd.DataFrame.groupby
+
+    def counting_groupby(self: pd.DataFrame, *args: Any, **kwargs: Any) -> Any:
+        if len(self) == len(df):
+            counter['scans'] += 1
+        return original(self, *args, **kwargs)
+
+    with patch.object(pd.DataFrame, 'groupby', counting_groupby):
+        yield counter
+
+
+def legacy_passes(df: pd.DataFrame) -> None:
+    df.groupby('category', observed=True)['value'].sum()
+    df.groupby('entity', observed=True)['value'].sum()
+    df.groupby('category', observed=True)['value'].sum()
+    df.groupby('entity', observed=True)['value'].sum()
+    df.groupby('date')['value'].sum()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20_000_000)
+    parser.add_argument("--entities", type=int, default=500)
+    args = parser.parse_args()
+
+    df = DataLoader()._generate_test_data(days=365, entity_count=args.entities, n_rows=args.rows)
+    filter_state = {'date_range': (df['date'].min(), df['date'].max())}
+    print(f"Фрейм: {len(df):,} строк")
+
+    with count_full_scans(df) as counter:
+        start = time.perf_counter()
+        legacy_passes(df)
+        legacy_time = time.perf_counter() - start
+    print(f"  раздельные groupby: {counter['scans']} проходов, {legacy_time:.2f} s")
+
+    with count_full_scans(df) as counter:
+        start = time.perf_counter()
+        AnalyticsEngine().calculate_all_metrics(df, filter_state)
+        cube_time = time.perf_counter() - start
+    print(f"  куб:                {counter['scans']} проход,  {cube_time:.2f} s (все метрики)")
+
+
+if __name__ == "__main__":
+    main()
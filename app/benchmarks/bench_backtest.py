@@ -0,0 +1,177 @@
+"""
+Бэктест методов прогноза со скользящей точкой отсечения (rolling origin).
+
+Для каждого ряда и каждой точки отсечения методы обучаются на истории до неё
+и прогнозируют следующие --horizon дней; считаются MAPE (по дням с ненулевым
+фактом), sMAPE и время обучения/прогноза. Простые методы вкладки прогноза
+считаются по блокам рядов в пуле процессов, Holt-Winters — пакетно ForecastEngine.
+Результат — JSON-отчёт для сравнения точности и скорости между релизами.
+
+Запуск из каталога app/:
+    python -m benchmarks.bench_backtest --series 500 --days 365 --horizon 14 --folds 4
+    python -m benchmarks.bench_backtest --input sales.parquet --date-col Дата --entity-col Магазин \\
+        --value-col Сумма --output backtest.json
+"""
+import argparse
+import json
+import os
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.data_loader import DataLoader
+from core.forecast_engine import SIMPLE_METHODS, ForecastEngine
+
+
+def load_dataset(args: argparse.Namespace) -> pd.DataFrame:
+    if not args.input:
+        return DataLoader()._generate_test_data(days=args.days, entity_count=args.series, categories=["Все"])
+
+    columns = [args.date_col, args.entity_col, args.value_col]
+    if args.input.endswith(".parquet"):
+        df = pd.read_parquet(args.input, columns=columns)
+    else:
+        df = pd.read_csv(args.input, usecols=columns)
+    df = df.rename(columns={args.date_col: "date", args.entity_col: "entity", args.value_col: "value"})
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["value"] = pd.to_numeric(df["value"], errors="coerce")
+    return df.dropna(subset=["date", "value"])
+
+
+def origins(n_days: int, horizon: int, folds: int, step: int) -> List[int]:
+    """Индексы точек отсечения: последняя оставляет ровно horizon дней на проверку"""
+    last = n_days - horizon
+    return [o for o in range(last - (folds - 1) * step, last + 1, step) if o >= 14]
+
+
+def error_sums(actual: np.ndarray, forecast: np.ndarray) -> np.ndarray:
+    """Суммы для пулового MAPE/sMAPE: [Σ|e|/|a|, число a≠0, Σ sMAPE, число точек]"""
+    actual, forecast = np.broadcast_arrays(actual, forecast)
+    nonzero = actual != 0
+    ape = np.abs(forecast - actual)[nonzero] / np.abs(actual[nonzero])
+    denom = np.abs(actual) + np.abs(forecast)
+    sape = np.divide(2 * np.abs(forecast - actual), denom, out=np.zeros(actual.shape), where=denom > 0)
+    return np.array([ape.sum(), nonzero.sum(), sape.sum(), actual.size], dtype=np.float64)
+
+
+def evaluate_chunk(matrix: pd.DataFrame, cut_points: List[int], horizon: int) -> Dict[str, Dict[str, Any]]:
+    """Простые методы по блоку рядов: суммы ошибок и время на метод"""
+    result: Dict[str, Dict[str, Any]] = {name: {"sums": np.zeros(4), "seconds": 0.0} for name in SIMPLE_METHODS}
+    for column in matrix.columns:
+        series = matrix[column]
+        for cut in cut_points:
+            history, actual = series.iloc[:cut], series.to_numpy()[cut:cut + horizon]
+            for name, method in SIMPLE_METHODS.items():
+                start = time.perf_counter()
+                forecast = method(history, horizon)
+                result[name]["seconds"] += time.perf_counter() - start
+                result[name]["sums"] += error_sums(actual, forecast)
+    return result
+
+
+def evaluate_simple(matrix: pd.DataFrame, cut_points: List[int], horizon: int,
+                    workers: int, chunk: int) -> Dict[str, Dict[str, Optional[float]]]:
+    blocks = [matrix.iloc[:, i:i + chunk] for i in range(0, matrix.shape[1], chunk)]
+    start = time.perf_counter()
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks))) as pool:
+            parts = list(pool.map(evaluate_chunk, blocks, [cut_points] * len(blocks), [horizon] * len(blocks)))
+    else:
+        parts = [evaluate_chunk(block, cut_points, horizon) for block in blocks]
+    wall = time.perf_counter() - start
+
+    report = {}
+    for name in SIMPLE_METHODS:
+        sums = sum((part[name]["sums"] for part in parts), np.zeros(4))
+        # У простых методов обучение и прогноз — один вызов: всё время относится к fit_s
+        report[name] = summarize(sums, fit_s=sum(part[name]["seconds"] for part in parts), predict_s=0.0)
+        report[name]["wall_s"] = round(wall, 4)  # общее время пула на все простые методы
+    return report
+
+
+def evaluate_holt_winters(matrix: pd.DataFrame, cut_points: List[int], horizon: int,
+                          workers: int) -> Dict[str, Optional[float]]:
+    engine = ForecastEngine(horizon=horizon, max_workers=workers)
+    sums, fit_s, predict_s = np.zeros(4), 0.0, 0.0
+    for cut in cut_points:
+        start = time.perf_counter()
+        engine.level_ = "series"
+        engine.state_ = engine._fit_matrix(matrix.iloc[:cut])
+        fit_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        forecast = engine.predict(horizon)
+        predict_s += time.perf_counter() - start
+
+        predicted = forecast.pivot(index="date", columns="series", values="forecast")[matrix.columns]
+        sums += error_sums(matrix.iloc[cut:cut + horizon].to_numpy(), predicted.to_numpy())
+    return summarize(sums, fit_s, predict_s)
+
+
+def summarize(sums: np.ndarray, fit_s: float, predict_s: float) -> Dict[str, Optional[float]]:
+    ape, n_nonzero, sape, n_points = sums
+    return {
+        "mape": round(float(ape / n_nonzero * 100), 3) if n_nonzero else None,
+        "smape": round(float(sape / n_points * 100), 3) if n_points else None,
+        "points": int(n_points),
+        "fit_s": round(fit_s, 4),
+        "predict_s": round(predict_s, 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="CSV/Parquet с историей; без него — сгенерированные данные")
+    parser.add_argument("--date-col", default="date")
+    parser.add_argument("--entity-col", default="entity")
+    parser.add_argument("--value-col", default="value")
+    parser.add_argument("--series", type=int, default=500, help="число рядов для генератора")
+    parser.add_argument("--days", type=int, default=365, help="длина истории для генератора")
+    parser.add_argument("--max-series", type=int, default=0, help="ограничить число рядов (0 — все)")
+    parser.add_argument("--horizon", type=int, default=14)
+    parser.add_argument("--folds", type=int, default=4)
+    parser.add_argument("--step", type=int, default=0, help="шаг между отсечениями (0 — horizon)")
+    parser.add_argument("--workers", type=int, default=0, help="0 — по числу CPU")
+    parser.add_argument("--chunk", type=int, default=100, help="рядов на задачу пула")
+    parser.add_argument("--output", default="backtest_report.json")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    matrix = ForecastEngine.daily_matrix(load_dataset(args), "entity")
+    matrix.columns = matrix.columns.astype(str)
+    if args.max_series:
+        matrix = matrix.iloc[:, :args.max_series]
+
+    cut_points = origins(len(matrix), args.horizon, args.folds, args.step or args.horizon)
+    if not cut_points:
+        raise SystemExit(f"Мало истории: {len(matrix)} дней на горизонт {args.horizon}")
+
+    methods = evaluate_simple(matrix, cut_points, args.horizon, workers, args.chunk)
+    methods["holt_winters"] = evaluate_holt_winters(matrix, cut_points, args.horizon, workers)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "dataset": args.input or f"generated:{args.series}x{args.days}",
+        "series": int(matrix.shape[1]),
+        "days": int(matrix.shape[0]),
+        "horizon": args.horizon,
+        "origins": [str(matrix.index[c].date()) for c in cut_points],
+        "workers": workers,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "methods": methods,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"{report['series']} рядов × {len(cut_points)} отсечений, горизонт {args.horizon} → {args.output}")
+    print(pd.DataFrame(methods).T[["mape", "smape", "fit_s", "predict_s"]].to_string())
+
+
+if __name__ == "__main__":
+    main()
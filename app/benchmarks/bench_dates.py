@@ -0,0 +1,50 @@
+"""
+Бенчмарк разбора дат: pd.to_datetime(errors="coerce") с поэлементным угадыванием формата
+против schema_profiler — формат определяется по выборке, колонка разбирается одним
+векторным strptime.
+
+Запуск из каталога app/:
+    python -m benchmarks.bench_dates --rows 10000000 --format "%d.%m.%Y %H:%M"
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from core.schema_profiler import parse_dates, sniff_date_format
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--format", default="%d.%m.%Y %H:%M", help="формат строк в синтетической колонке")
+    parser.add_argument("--legacy-rows", type=int, default=1_000_000,
+                        help="строк для старого пути (время экстраполируется на --rows)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    stamps = pd.Series(pd.date_range("2022-01-01", periods=max(args.rows // 10, 1), freq="min"))
+    series = pd.Series(rng.choice(stamps.dt.strftime(args.format).to_numpy(), args.rows))
+    print(f"Колонка: {args.rows:,} строк вида {series.iloc[0]!r}")
+
+    legacy = series.head(args.legacy_rows)
+    start = time.perf_counter()
+    expected = pd.to_datetime(legacy, errors="coerce", dayfirst="%d" in args.format.split("%m")[0])
+    legacy_time = (time.perf_counter() - start) * args.rows / len(legacy)
+    print(f"  pd.to_datetime (угадывание): ~{legacy_time:6.2f} s на {args.rows:,} строк")
+
+    start = time.perf_counter()
+    fmt = sniff_date_format(series)
+    sniff_time = time.perf_counter() - start
+    start = time.perf_counter()
+    parsed = parse_dates(series, fmt)
+    parse_time = time.perf_counter() - start
+    print(f"  профиль + strptime:          {sniff_time + parse_time:6.2f} s (формат {fmt!r}, выборка {sniff_time:.3f} s)")
+
+    mismatches = int((parsed.head(len(legacy)).to_numpy() != expected.to_numpy()).sum())
+    print(f"  расхождений с pd.to_datetime: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
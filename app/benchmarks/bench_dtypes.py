@@ -0,0 +1,69 @@
+"""
+Бенчмарк компактных типов после ColumnMapper.apply: память и скорость groupby/isin.
+
+Сравнивается фрейм со строковыми entity/category и float64 value
+с тем же фреймом после нормализации (category + float32).
+
+Запуск из каталога app/:
+    python -m benchmarks.bench_dtypes --rows 10000000
+"""
+import argparse
+import time
+from typing import Any, Callable, Dict
+
+import pandas as pd
+
+from core.data_loader import DataLoader
+from ui.components.column_mapper import ColumnMapper
+
+MAPPING = {"date": "date", "value": "value", "entity": "entity", "category": "category"}
+
+
+def _timed(func: Callable[[], Any], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _profile(df: pd.DataFrame) -> Dict[str, float]:
+    selected = df["entity"].iloc[:1000].unique()[:8].tolist()
+    return {
+        "memory_mb": df.memory_usage(deep=True).sum() / 1024 ** 2,
+        "groupby entity": _timed(lambda: df.groupby("entity", observed=True)["value"].sum()),
+        "groupby date×entity×category": _timed(
+            lambda: df.groupby(["date", "entity", "category"], observed=True)["value"].sum(), repeat=1
+        ),
+        "isin entity": _timed(lambda: df["entity"].isin(selected)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--entities", type=int, default=500)
+    args = parser.parse_args()
+
+    generated = DataLoader()._generate_test_data(entity_count=args.entities, n_rows=args.rows)
+    raw = generated.assign(
+        entity=generated["entity"].astype(str).astype(object),
+        category=generated["category"].astype(str).astype(object),
+        value=generated["value"].astype("float64"),
+    )
+    del generated
+    normalized = ColumnMapper.apply(raw, MAPPING)
+
+    before, after = _profile(raw), _profile(normalized)
+    print(f"{len(raw):,} строк; dtypes после нормализации: "
+          f"{', '.join(f'{c}={t}' for c, t in normalized.dtypes.astype(str).items())}")
+    print(f"{'':32}{'строки/float64':>16}{'category/float32':>18}{'выигрыш':>10}")
+    for name in before:
+        unit = "MB" if name == "memory_mb" else "s"
+        print(f"{name:32}{before[name]:>13.2f} {unit:2}{after[name]:>15.2f} {unit:2}"
+              f"{before[name] / after[name]:>9.1f}×")
+
+
+if __name__ == "__main__":
+    main()
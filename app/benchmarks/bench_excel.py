@@ -0,0 +1,82 @@
+"""
+Бенчмарк загрузки Excel: pd.read_excel по всем листам против core.excel_reader.read_workbook
+(calamine или openpyxl read_only + iter_rows, листы в отдельных процессах) и повторного
+открытия той же книги из DatasetCache.get_raw.
+
+Запуск из каталога app/:
+    python -m benchmarks.bench_excel --rows 200000 --sheets 4
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from core.excel_reader import excel_engine, read_workbook
+from data.cache import DatasetCache
+
+
+class Upload(io.BytesIO):
+    """Заменитель UploadedFile: байты плюс имя файла"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fh:
+            super().__init__(fh.read())
+        self.name = os.path.basename(path)
+
+
+def _write_workbook(path: str, rows: int, sheets: int) -> None:
+    rng = np.random.default_rng(42)
+    dates = pd.date_range("2024-01-01", periods=365, freq="D").to_pydatetime()
+    entities = [f"Entity_{i:03d}" for i in range(1, 201)]
+    categories = ["Электроника", "Одежда", "Продукты", "Бытовая техника", "Косметика"]
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+    for s in range(sheets):
+        sheet = workbook.add_worksheet(f"Лист{s + 1}")
+        sheet.write_row(0, 0, ["date", "entity", "category", "value"])
+        sheet.set_column(0, 0, 12, date_format)
+        d, e, c = rng.integers(0, 365, rows), rng.integers(0, 200, rows), rng.integers(0, 5, rows)
+        values = rng.gamma(2, 100, rows).round(2)
+        for i in range(rows):
+            sheet.write_row(i + 1, 0, [dates[d[i]], entities[e[i]], categories[c[i]], values[i]])
+    workbook.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="строк на лист")
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--xlsx", help="Готовая книга (иначе генерируется синтетическая)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.xlsx
+        if path is None:
+            path = os.path.join(tmp, "bench.xlsx")
+            _write_workbook(path, args.rows, args.sheets)
+        print(f"Книга: {path} ({os.path.getsize(path) / 1024 ** 2:.1f} MB), движок: {excel_engine(path) or 'pandas'}")
+
+        start = time.perf_counter()
+        expected = pd.concat(pd.read_excel(path, sheet_name=None).values(), ignore_index=True)
+        print(f"  pd.read_excel:      {time.perf_counter() - start:7.2f} s, {len(expected):,} строк")
+
+        start = time.perf_counter()
+        df, skipped = read_workbook(Upload(path))
+        print(f"  read_workbook:      {time.perf_counter() - start:7.2f} s, {len(df):,} строк"
+              + (f", пропущены листы: {', '.join(skipped)}" if skipped else ""))
+        pd.testing.assert_frame_equal(df, expected, check_dtype=False)
+
+        cache = DatasetCache(os.path.join(tmp, "cache"))
+        cache.put_raw("bench", df)
+        start = time.perf_counter()
+        cache.get_raw("bench")
+        print(f"  повтор (get_raw):   {time.perf_counter() - start:7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Бенчмарк пакетного прогноза ForecastEngine по объектам.
+
+Запуск из каталога app/:
+    python -m benchmarks.bench_forecast --series 5000 --days 365 --horizon 30
+"""
+import argparse
+import time
+
+from core.data_loader import DataLoader
+from core.forecast_engine import ForecastEngine
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--horizon", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=0, help="0 — по числу CPU")
+    args = parser.parse_args()
+
+    df = DataLoader()._generate_test_data(days=args.days, entity_count=args.series, categories=["Все"])
+    engine = ForecastEngine(horizon=args.horizon, max_workers=args.workers or None)
+
+    start = time.perf_counter()
+    forecast = engine.forecast(df, level="entity")
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.series} рядов × {args.days} дней → {len(forecast):,} точек прогноза "
+          f"за {elapsed:.2f} s ({engine.max_workers} процессов)")
+    assert engine.state_ is not None
+    print(engine.state_[["alpha", "beta", "gamma"]].value_counts().head(5).to_string())
+
+
+if __name__ == "__main__":
+    main()
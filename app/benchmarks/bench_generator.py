@@ -0,0 +1,42 @@
+"""
+Бенчмарк генератора тестовых данных DataLoader._generate_test_data.
+
+Запуск из каталога app/:
+    python -m benchmarks.bench_generator --entities 500 --categories 50 --days 1095
+"""
+import argparse
+import time
+
+from core.data_loader import DataLoader
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=500)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--rows", type=int, help="Сэмплировать N строк вместо полной сетки")
+    parser.add_argument("--hourly", action="store_true")
+    parser.add_argument("--anomaly-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    categories = [f"Category_{i:02d}" for i in range(1, args.categories + 1)]
+
+    start = time.perf_counter()
+    df = DataLoader()._generate_test_data(
+        days=args.days,
+        entity_count=args.entities,
+        categories=categories,
+        n_rows=args.rows,
+        hourly=args.hourly,
+        anomaly_rate=args.anomaly_rate,
+    )
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(df):,} строк за {elapsed:.2f} s ({len(df) / elapsed / 1e6:.1f} M строк/с), "
+          f"{df.memory_usage(deep=True).sum() / 1024 ** 2:.0f} MB")
+    print(df["value"].describe().round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
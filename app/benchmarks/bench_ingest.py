@@ -0,0 +1,99 @@
+"""
+Бенчмарк загрузки CSV: целиком (pd.read_csv + ColumnMapper.apply) против потокового DataLoader.load_streaming.
+
+Запуск из каталога app/:
+    python -m benchmarks.bench_ingest --rows 2000000
+Каждый режим выполняется в отдельном процессе, чтобы пиковый RSS не смешивался.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+MAPPING = {"date": "date", "value": "value", "entity": "entity", "category": "category"}
+
+
+def _write_csv(path: str, rows: int) -> None:
+    rng = np.random.default_rng(42)
+    dates = pd.date_range("2024-01-01", periods=365, freq="D")
+    entities = np.array([f"Entity_{i:03d}" for i in range(1, 201)])
+    categories = np.array(["Электроника", "Одежда", "Продукты", "Бытовая техника", "Косметика"])
+    step = 1_000_000
+    for start in range(0, rows, step):
+        n = min(step, rows - start)
+        pd.DataFrame({
+            "date": dates[rng.integers(0, len(dates), n)].strftime("%Y-%m-%d"),
+            "entity": entities[rng.integers(0, len(entities), n)],
+            "category": categories[rng.integers(0, len(categories), n)],
+            "value": rng.gamma(2, 100, n).round(2),
+        }).to_csv(path, mode="a", header=start == 0, index=False)
+
+
+def _peak_rss_kb() -> int:
+    # VmHWM, а не ru_maxrss: последний наследуется от родителя через fork/exec
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+
+def _run_mode(mode: str, path: str) -> Dict[str, Any]:
+    from core.data_loader import DataLoader
+    from ui.components.column_mapper import ColumnMapper
+
+    start = time.perf_counter()
+    if mode == "eager":
+        df = ColumnMapper.apply(pd.read_csv(path), MAPPING)
+    else:
+        df = DataLoader().load_streaming(path, MAPPING)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "rows": len(df),
+        "seconds": round(elapsed, 2),
+        "peak_rss_mb": round(_peak_rss_kb() / 1024, 1),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 1024 ** 2, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--csv", help="Готовый CSV (иначе генерируется синтетический)")
+    parser.add_argument("--mode", choices=["eager", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(_run_mode(args.mode, args.csv)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if path is None:
+            path = os.path.join(tmp, "bench.csv")
+            _write_csv(path, args.rows)
+        file_mb = os.path.getsize(path) / 1024 ** 2
+        print(f"CSV: {path} ({file_mb:.1f} MB)")
+
+        for mode in ("eager", "streaming"):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_ingest", "--mode", mode, "--csv", path],
+                capture_output=True, text=True, check=True
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{result['mode']:>10}: {result['seconds']:>7.2f} s, "
+                  f"peak RSS {result['peak_rss_mb']:>8.1f} MB, "
+                  f"итоговый фрейм {result['frame_mb']:>7.1f} MB ({result['rows']} строк)")
+
+
+if __name__ == "__main__":
+    main()
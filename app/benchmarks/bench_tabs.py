@@ -0,0 +1,75 @@
+"""
+Стоимость перезапуска скрипта при ленивых и обычных вкладках (TabManager.render_all).
+
+Приложение прогоняется через streamlit.testing.AppTest на демо-данных: первый
+запуск (холодные кэши), повторные перезапуски без изменений и переходы по всем
+вкладкам. В ленивом режиме на каждом перезапуске выполняется только открытая вкладка.
+Каждый режим — в отдельном процессе, чтобы кэши одного не прогревали другой.
+
+Запуск из каталога app/:
+    python -m benchmarks.bench_tabs --reruns 5
+"""
+import argparse
+import json
+import logging
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from streamlit.testing.v1 import AppTest
+
+from config import config
+from ui.tabs.tab_manager import TabManager
+
+MAIN = str(Path(__file__).resolve().parents[1] / "main.py")
+
+
+def timed_run(app: AppTest) -> float:
+    start = time.perf_counter()
+    app.run(timeout=600)
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return time.perf_counter() - start
+
+
+def measure(lazy: bool, reruns: int) -> Dict[str, Any]:
+    config.LAZY_TABS = lazy
+    app = AppTest.from_file(MAIN, default_timeout=600)
+    cold = timed_run(app)
+    warm = [timed_run(app) for _ in range(reruns)]
+
+    visits = {}
+    for label in TabManager.TAB_NAMES.values():
+        app.session_state["active_tab"] = label
+        visits[label] = timed_run(app)
+    return {"cold": cold, "rerun": statistics.median(warm), "visits": visits}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--mode", choices=["lazy", "eager"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        logging.disable(logging.WARNING)
+        print(json.dumps(measure(args.mode == "lazy", args.reruns), ensure_ascii=False))
+        return
+
+    for mode, title in (("lazy", "ленивые"), ("eager", "все сразу")):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_tabs", "--mode", mode, "--reruns", str(args.reruns)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{title:>10}: первый запуск {result['cold']:.2f} s, "
+              f"перезапуск (медиана) {result['rerun'] * 1000:.0f} ms")
+        print("            переходы: " + ", ".join(f"{label} {sec * 1000:.0f} ms"
+                                                  for label, sec in result["visits"].items()))
+
+
+if __name__ == "__main__":
+    main()
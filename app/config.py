@@ -25,24 +25,64 @@ class AppConfig:
     MAX_FILE_SIZE_MB: int = 100
     SUPPORTED_FILE_TYPES: List[str] = None
     
+    # ===== Настройки загрузки =====
+    CSV_STREAMING_MIN_MB: int = 50       # CSV крупнее читается чанками
+    CSV_CHUNK_ROWS: int = 500_000
+    CSV_PREVIEW_ROWS: int = 5_000        # строк для сопоставления колонок
+    PROFILE_SAMPLE_ROWS: int = 5_000     # строк для угадывания ролей и форматов колонок
+    DATE_FORMAT_MIN_MATCH: float = 0.95  # доля выборки, которую должен разобрать формат даты
+    EXCEL_ENGINE: str = "auto"           # auto | calamine | openpyxl
+    EXCEL_MAX_WORKERS: int = 0           # процессов для листов Excel (0 — по числу CPU)
+    VALUE_FLOAT32_ATOL: float = 0.005    # допустимая погрешность value во float32
+    
     # ===== Настройки аналитики =====
     ABC_A_THRESHOLD: float = 80.0
     ABC_B_THRESHOLD: float = 95.0
+    XYZ_X_THRESHOLD: float = 10.0        # CV сумм по периодам, %: X — стабильные
+    XYZ_Y_THRESHOLD: float = 25.0        # Y — умеренные колебания, выше — Z
+    XYZ_PERIOD: str = "W"                # W — недели, M — месяцы
     PARETO_THRESHOLD: float = 80.0
     ANOMALY_CONTAMINATION: float = 0.1
+    ANOMALY_BATCH_ROWS: int = 1_000_000  # строк на батч при оценке
+    ANOMALY_FIT_SAMPLE: int = 100_000    # размер обучающей выборки детектора
+    SERIES_ANOMALY_WINDOW: int = 28      # дней истории ряда для робастной базы
+    SERIES_ANOMALY_MIN_PERIODS: int = 7
     FORECAST_DAYS: int = 30
+    FORECAST_MAX_WORKERS: int = 0        # процессов для пакетного прогноза (0 — по числу CPU)
+    FORECAST_CHUNK_SERIES: int = 500     # рядов на задачу пула
+    FORECAST_REFIT_EVERY_DAYS: int = 7   # полное переобучение раз в N новых дней
+    FORECAST_CACHE_DIR: str = ".cache/forecast"
+    FORECAST_CACHE_MAX_MB: int = 256     # диск под состояния прогнозов; сверх — удаляются давно не читавшиеся
     
     # ===== Настройки кэширования =====
     CACHE_TTL_DATA_LOADER: int = 3600  # 1 час
     CACHE_TTL_ANALYTICS: int = 300     # 5 минут
     CACHE_TTL_TEST_DATA: int = 600     # 10 минут
+    DATASET_CACHE_DIR: str = ".cache/datasets"  # Arrow-кэш нормализованных загрузок
+    DATASET_CACHE_MAX_MB: int = 4096   # диск под Arrow-кэш; сверх — удаляются давно не открытые файлы
+    FILTER_CACHE_MAX_MB: int = 1024    # бюджет LRU-кэша результатов фильтрации
+    FILTER_CACHE_MAX_ENTRIES: int = 32
+    QUERY_BACKEND: str = "pandas"      # pandas | polars | duckdb — где считать фильтры и куб
+    QUERY_BACKEND_THREADS: int = 0     # потоков DuckDB (0 — по умолчанию)
+    QUERY_DETAIL_ROWS: int = 200_000   # строк выборки для вкладок при внешнем движке (аномалии, таблицы)
+    FIGURE_CACHE_MAX_MB: int = 256     # бюджет кэша готовых фигур Plotly
+    FIGURE_CACHE_MAX_ENTRIES: int = 128
     
     # ===== Настройки UI =====
     CHART_HEIGHT: int = 500
+    CHART_POINT_BUDGET: int = 5_000      # максимум точек на трассу графика
+    CHART_WEBGL_THRESHOLD: int = 1_000   # трассы крупнее рисуются через Scattergl
+    LAZY_TABS: bool = True               # считать только открытую вкладку
     COLOR_SCHEME: str = "reds"
     DEFAULT_SCENARIOS: Dict[str, float] = None
     ENABLE_DARK_MODE: bool = True
     
+    # ===== Настройки экспорта =====
+    EXPORT_CHUNK_ROWS: int = 100_000     # строк на порцию записи
+    EXPORT_MAX_WORKERS: int = 1          # фоновых сборок отчётов одновременно
+    EXPORT_TMP_DIR: str = ""             # каталог временных файлов ("" — системный)
+    EXPORT_TMP_MAX_AGE_MIN: int = 60     # готовые отчёты старше удаляются при следующей сборке
+
     # ===== Настройки безопасности =====
     ENABLE_CSRF_PROTECTION: bool = False
     ALLOWED_FILE_EXTENSIONS: List[str] = None
@@ -56,7 +96,7 @@ class AppConfig:
             ]
         
         if self.SUPPORTED_FILE_TYPES is None:
-            self.SUPPORTED_FILE_TYPES = ['csv', 'xlsx', 'xls', 'parquet']
+            self.SUPPORTED_FILE_TYPES = ['csv', 'gz', 'zst', 'zstd', 'xlsx', 'xls', 'parquet', 'feather', 'arrow']
         
         if self.DEFAULT_SCENARIOS is None:
             self.DEFAULT_SCENARIOS = {
@@ -67,7 +107,8 @@ class AppConfig:
             }
         
         if self.ALLOWED_FILE_EXTENSIONS is None:
-            self.ALLOWED_FILE_EXTENSIONS = ['.csv', '.xlsx', '.xls', '.parquet']
+            self.ALLOWED_FILE_EXTENSIONS = ['.csv', '.csv.gz', '.csv.zst', '.csv.zstd', '.xlsx', '.xls',
+                                            '.parquet', '.feather', '.arrow']
     
     @classmethod
     def from_env(cls) -> "AppConfig":
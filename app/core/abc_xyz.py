@@ -0,0 +1,214 @@
+# core/abc_xyz.py
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from config import config
+from core.rollups import TimeRollups
+
+
+class ABCClassifier:
+    """ABC-классификация без построчного apply.
+
+    Позиции сортируются по убыванию значения один раз, накопленный процент
+    хранится массивом. Смена порогов A/B — два searchsorted по этому массиву
+    и заполнение срезов, без пересортировки. Уровень группировки любой:
+    объект, категория, SKU или несколько колонок сразу (MultiIndex).
+    """
+
+    def __init__(self, values: pd.Series):
+        raw = values.to_numpy(dtype=np.float64)
+        order = np.argsort(-raw, kind='stable')
+        self.index = values.index[order]
+        self.values = raw[order]
+        total = self.values.sum()
+        cumulative = np.cumsum(self.values) / total * 100 if total else np.zeros(len(self.values))
+        self.cumulative_percentage = cumulative.round(2)
+        # При отрицательных значениях накопленный процент не монотонен — searchsorted неприменим
+        self._monotonic = bool(np.all(np.diff(self.cumulative_percentage) >= 0))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, by: Union[str, Sequence[str]], value: str = 'value') -> "ABCClassifier":
+        """Классификатор по сумме value в разрезе by (колонка или список колонок)"""
+        keys: List[str] = [by] if isinstance(by, str) else list(by)
+        return cls(df.groupby(keys, observed=True)[value].sum())
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes + self.cumulative_percentage.nbytes + self.index.memory_usage())
+
+    def boundaries(self, a_threshold: Optional[float] = None, b_threshold: Optional[float] = None) -> Tuple[int, int]:
+        """Число позиций в классе A и в классах A+B"""
+        a = config.ABC_A_THRESHOLD if a_threshold is None else a_threshold
+        b = config.ABC_B_THRESHOLD if b_threshold is None else b_threshold
+        n_a, n_b = np.searchsorted(self.cumulative_percentage, [a, max(a, b)], side='right')
+        return int(n_a), int(n_b)
+
+    def classify(self, a_threshold: Optional[float] = None, b_threshold: Optional[float] = None) -> np.ndarray:
+        """Классы A/B/C в порядке убывания значения"""
+        if not self._monotonic:
+            a = config.ABC_A_THRESHOLD if a_threshold is None else a_threshold
+            b = config.ABC_B_THRESHOLD if b_threshold is None else b_threshold
+            cumulative = self.cumulative_percentage
+            return np.select([cumulative <= a, cumulative <= b], ['A', 'B'], 'C')
+
+        n_a, n_b = self.boundaries(a_threshold, b_threshold)
+        labels = np.full(len(self.values), 'C')
+        labels[:n_a] = 'A'
+        labels[n_a:n_b] = 'B'
+        return labels
+
+    def frame(self, a_threshold: Optional[float] = None, b_threshold: Optional[float] = None) -> pd.DataFrame:
+        """Таблица: ключи группировки, value, cumulative_percentage, abc_class"""
+        result = self.index.to_frame(index=False)
+        result['value'] = self.values
+        result['cumulative_percentage'] = self.cumulative_percentage
+        result['abc_class'] = self.classify(a_threshold, b_threshold)
+        return result
+
+    def class_value(self, cls: str = 'A', a_threshold: Optional[float] = None,
+                    b_threshold: Optional[float] = None) -> float:
+        """Сумма значений класса"""
+        labels = self.classify(a_threshold, b_threshold)
+        return float(self.values[labels == cls].sum())
+
+
+class PeriodAggregates:
+    """Агрегаты по периодам для ABC, XYZ и Парето из одного куба.
+
+    Исходник — дневной куб (date × измерения → value), который движок уже строит
+    одним проходом по строкам. Недельные/месячные суммы считаются по кубу сразу
+    в конструкторе — до того, как объект попадёт в FilterResultCache и будет
+    оценён его nbytes; итоги для ABC/Парето и CV для XYZ на любом уровне
+    группировки берутся из них без обращения к сырым строкам.
+
+    Экземпляр общий для сессий (через кэш), поэтому запоминание итогов
+    и классификаторов по уровням — под локом.
+    """
+
+    FREQS = {'W': "Недели", 'M': "Месяцы"}
+    NO_DATA = "нет данных"  # подпись позиции с CV = NaN (нулевое среднее или нет полных периодов)
+
+    def __init__(self, cube: pd.DataFrame, date_range: Optional[Tuple[Any, Any]] = None):
+        """date_range — диапазон дат фильтра (включительно); без него — наблюдаемые min/max куба"""
+        self.keys = [c for c in cube.columns if c not in ('date', 'value', 'count')]
+        self.cube = cube[self.keys + ['date', 'value']] if 'date' in cube.columns else cube[self.keys + ['value']]
+        self.bounds: Optional[Tuple[np.datetime64, np.datetime64]] = None
+        if date_range is not None:
+            self.bounds = tuple(np.datetime64(pd.Timestamp(d).date(), 'D') for d in date_range)
+        elif 'date' in self.cube.columns and len(self.cube):
+            days = self.cube['date'].to_numpy().astype('datetime64[D]')
+            self.bounds = (days.min(), days.max())
+        self._periods: Dict[str, pd.DataFrame] = {}
+        if 'date' in self.cube.columns:
+            self._periods = {freq: self._build_period_frame(freq) for freq in self.FREQS}
+        self._totals: Dict[Tuple[str, ...], pd.Series] = {}
+        self._abc: Dict[Tuple[str, ...], ABCClassifier] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        frames = [self.cube] + list(self._periods.values())
+        with self._lock:
+            memo = sum(int(t.memory_usage(index=True)) for t in self._totals.values())
+            memo += sum(c.nbytes for c in self._abc.values())
+        return int(sum(f.memory_usage(index=True, deep=False).sum() for f in frames)) + memo
+
+    @staticmethod
+    def _period_ids(days: np.ndarray, freq: str) -> np.ndarray:
+        """Номер недели (с понедельника) или месяца для массива datetime64[D]"""
+        if freq == 'W':
+            return TimeRollups.week_code(days)
+        return TimeRollups.month_code(days)
+
+    def period_frame(self, freq: str = 'W') -> pd.DataFrame:
+        """Суммы по (измерения, период) — все периоды, включая неполные крайние"""
+        return self._periods[freq]
+
+    def _build_period_frame(self, freq: str) -> pd.DataFrame:
+        period = self._period_ids(self.cube['date'].to_numpy().astype('datetime64[D]'), freq)
+        # dropna=False: пустой entity не должен терять value в итогах по category
+        return (self.cube.assign(period=period)
+                .groupby(self.keys + ['period'], observed=True, dropna=False, sort=False)['value']
+                .sum().reset_index())
+
+    def full_periods(self, freq: str = 'W') -> Tuple[int, int]:
+        """Первый и последний период, целиком лежащие в диапазоне дат; first > last — полных нет.
+
+        Неполная крайняя неделя/месяц занижает сумму периода и завышает CV,
+        поэтому в XYZ участвуют только полные периоды.
+        """
+        if self.bounds is None:
+            return 0, -1
+        start, end = self.bounds
+        one_day = np.timedelta64(1, 'D')
+        # Период полный, если день до начала диапазона — в предыдущем периоде, а день после конца — в следующем
+        first = int(self._period_ids(np.array([start - one_day]), freq)[0]) + 1
+        last = int(self._period_ids(np.array([end + one_day]), freq)[0]) - 1
+        return first, last
+
+    def totals(self, level: Sequence[str]) -> pd.Series:
+        """Сумма value по уровню за весь период — из недельных/месячных сумм, не из дневного куба"""
+        level = tuple(level)
+        with self._lock:
+            if level in self._totals:
+                return self._totals[level]
+        source = self.period_frame(config.XYZ_PERIOD) if 'date' in self.cube.columns else self.cube
+        totals = source.groupby(list(level), observed=True)['value'].sum()
+        with self._lock:
+            return self._totals.setdefault(level, totals)
+
+    def abc(self, level: Sequence[str]) -> ABCClassifier:
+        level = tuple(level)
+        with self._lock:
+            if level in self._abc:
+                return self._abc[level]
+        classifier = ABCClassifier(self.totals(level))
+        with self._lock:
+            return self._abc.setdefault(level, classifier)
+
+    def xyz(self, level: Sequence[str], freq: str = 'W', x_threshold: Optional[float] = None,
+            y_threshold: Optional[float] = None) -> pd.DataFrame:
+        """Коэффициент вариации сумм по полным периодам (пустые периоды — нули) и класс X/Y/Z.
+
+        Без значений в полных периодах cv = NaN, класс Z.
+        """
+        frame = self.period_frame(freq)
+        first, last = self.full_periods(freq)
+        n_periods = max(last - first + 1, 0)
+        level = list(level)
+        # Значения неполных крайних периодов обнуляются, а не отбрасываются: позиция остаётся в таблице
+        value = frame['value'].where(frame['period'].between(first, last), 0)
+        per_period = frame.assign(value=value).groupby(level + ['period'], observed=True, sort=False)['value'].sum()
+        moments = pd.DataFrame({'sum': per_period, 'sum_sq': per_period ** 2}).groupby(level, observed=True).sum()
+
+        # Периоды без значений в группировке отсутствуют, но входят в n_periods как нули
+        mean = moments['sum'] / n_periods if n_periods else moments['sum'] * np.nan
+        variance = (moments['sum_sq'] / n_periods - mean ** 2).clip(lower=0)
+        # Нулевое среднее — CV не определён: NaN, класс Z («нет данных»), а не бесконечность
+        cv = (np.sqrt(variance) / mean.abs() * 100).where(mean != 0)
+
+        x = config.XYZ_X_THRESHOLD if x_threshold is None else x_threshold
+        y = config.XYZ_Y_THRESHOLD if y_threshold is None else y_threshold
+        result = pd.DataFrame({'mean': mean, 'cv': cv.round(1)})
+        # NaN не проходит ни одно сравнение — попадает в Z
+        result['xyz_class'] = np.select([cv <= x, cv <= y], ['X', 'Y'], 'Z')
+        return result
+
+    def abc_xyz(self, level: Sequence[str], freq: str = 'W', a_threshold: Optional[float] = None,
+                b_threshold: Optional[float] = None, x_threshold: Optional[float] = None,
+                y_threshold: Optional[float] = None) -> pd.DataFrame:
+        """ABC-таблица уровня с колонками cv и xyz_class"""
+        level = list(level)
+        abc = self.abc(level).frame(a_threshold, b_threshold)
+        xyz = self.xyz(level, freq, x_threshold, y_threshold)[['cv', 'xyz_class']]
+        return abc.merge(xyz, left_on=level, right_index=True, how='left')
+
+    @staticmethod
+    def matrix(abc_xyz: pd.DataFrame) -> pd.DataFrame:
+        """Матрица 3×3: число позиций и сумма value в каждой ячейке ABC × XYZ"""
+        index = pd.MultiIndex.from_product([list('ABC'), list('XYZ')], names=['abc_class', 'xyz_class'])
+        cells = abc_xyz.groupby(['abc_class', 'xyz_class'])['value'].agg(['count', 'sum']).reindex(index, fill_value=0)
+        return cells
@@ -1,59 +1,112 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
 
+from config import config
+from core.abc_xyz import ABCClassifier, PeriodAggregates
+
 class AnalyticsEngine:
     """Универсальный движок аналитики — работает с колонками date / value / entity / category"""
 
     def calculate_all_metrics(self, df: pd.DataFrame, filter_state: Dict[str, Any]) -> Dict[str, Any]:
+        base = self.calculate_base_metrics(df, filter_state)
+        return self.apply_scenarios(base, filter_state)
+
+    def calculate_base_metrics(self, df: pd.DataFrame, filter_state: Dict[str, Any],
+                               cube: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        """Тяжёлая часть: агрегаты по строкам. Зависит только от данных и фильтров, не от слайдеров сценариев.
+
+        cube — готовый куб от внешнего движка (core.query_backend); тогда строки df не сканируются.
+        """
         if df.empty or 'value' not in df.columns:
             return {}
 
+        # Один проход по сырым строкам: куб (date, entity, category) → sum/count,
+        # все остальные метрики считаются уже по кубу
+        if cube is None:
+            cube = self._build_cube(df)
+
+        # Суммы по периодам из куба — общий источник для ABC, XYZ и Парето;
+        # границы периодов XYZ — по диапазону фильтра, а не по первой/последней продаже
+        periods = PeriodAggregates(cube, filter_state.get('date_range'))
+
         # Основные метрики
-        current_value = self._calculate_total_value(df)
-        category_losses = self._calculate_category_losses(df)
-        entity_losses = self._calculate_entity_losses(df)
+        current_value = self._calculate_total_value(cube)
+        category_losses = self._calculate_category_losses(cube, periods)
+        entity_losses = self._calculate_entity_losses(cube, periods)
+        entity_stats = self._calculate_entity_stats(cube)
 
         # ABC/XYZ и Pareto (теперь на entity)
-        abc_xyz = self._calculate_abc_xyz(df)
-        pareto_entity = self._calculate_pareto(df)
+        # Классификатор хранит отсортированный накопленный процент: вкладка ABC
+        # пересчитывает классы при смене порогов без новой сортировки
+        abc_classifier = self._calculate_abc_xyz(cube, df, periods)
+        abc_xyz = self._abc_xyz_frame(abc_classifier, periods)
+        pareto_entity = self._calculate_pareto(entity_losses)
 
         # What-if компоненты
         a_class_value = self._calculate_a_class_value(abc_xyz)
-        peak_days_value = self._calculate_peak_days_value(df)
+        peak_days_value = self._calculate_peak_days_value(cube)
         top_entity_value = self._calculate_top_entity_value(pareto_entity)
 
+        # Период для годовой экстраполяции; без фильтра — по кубу: df может быть лишь выборкой строк
+        dates = cube['date'] if 'date' in cube.columns else df['date']
+        date_range = filter_state.get('date_range', (dates.min(), dates.max()))
+        period_days = (date_range[1] - date_range[0]).days + 1 if isinstance(date_range[0], datetime) else 30
+
+        return {
+            'n_rows': int(cube['count'].sum()),      # строк после фильтра — по кубу, df может быть выборкой
+            'current_value': current_value,          # было current_losses
+            'category_losses': category_losses,
+            'entity_losses': entity_losses,          # было store_losses
+            'entity_stats': entity_stats,
+            'abc_xyz': abc_xyz,
+            'abc_classifier': abc_classifier,
+            'period_aggregates': periods,
+            'pareto_entity': pareto_entity,          # было pareto_store
+            'a_class_value': a_class_value,
+            'peak_days_value': peak_days_value,
+            'top_entity_value': top_entity_value,
+            'period_days': period_days
+        }
+
+    def apply_scenarios(self, base: Dict[str, Any], filter_state: Dict[str, Any]) -> Dict[str, Any]:
+        """Лёгкая часть: what-if поверх готовых агрегатов — O(1), строки не трогает"""
+        if not base:
+            return {}
+
         # Сценарии из фильтров
         scenarios = {
             'reduce_a': filter_state.get('reduce_a', 10.0),
             'reduce_peak': filter_state.get('reduce_peak', 15.0),
-            'reduce_top_entity': filter_state.get('reduce_top_store', 20.0),  # оставил старый ключ для совместимости
+            'reduce_top_entity': filter_state.get('reduce_top_entity', filter_state.get('reduce_top_store', 20.0)),  # старый ключ для совместимости
             'investments': filter_state.get('investments', 50000.0)
         }
 
         # Расчёт экономии
-        savings_a = round(a_class_value * scenarios['reduce_a'] / 100)
-        savings_peak = round(peak_days_value * scenarios['reduce_peak'] / 100)
-        savings_entity = round(top_entity_value * scenarios['reduce_top_entity'] / 100)
+        savings_a = round(base['a_class_value'] * scenarios['reduce_a'] / 100)
+        savings_peak = round(base['peak_days_value'] * scenarios['reduce_peak'] / 100)
+        savings_entity = round(base['top_entity_value'] * scenarios['reduce_top_entity'] / 100)
         total_savings = savings_a + savings_peak + savings_entity
 
-        # Период для годовой экстраполяции
-        date_range = filter_state.get('date_range', (df['date'].min(), df['date'].max()))
-        period_days = (date_range[1] - date_range[0]).days + 1 if isinstance(date_range[0], datetime) else 30
+        period_days = base['period_days']
         annual_savings = round(total_savings * (365 / period_days)) if period_days else 0
 
         roi = round(total_savings / scenarios['investments'] * 100, 1) if scenarios['investments'] else 0
 
         return {
-            'current_value': current_value,          # было current_losses
-            'category_losses': category_losses,
-            'entity_losses': entity_losses,          # было store_losses
-            'abc_xyz': abc_xyz,
-            'pareto_entity': pareto_entity,          # было pareto_store
-            'a_class_value': a_class_value,
-            'peak_days_value': peak_days_value,
-            'top_entity_value': top_entity_value,
+            'n_rows': base['n_rows'],
+            'current_value': base['current_value'],
+            'category_losses': base['category_losses'],
+            'entity_losses': base['entity_losses'],
+            'entity_stats': base['entity_stats'],
+            'abc_xyz': base['abc_xyz'],
+            'abc_classifier': base['abc_classifier'],
+            'period_aggregates': base['period_aggregates'],
+            'pareto_entity': base['pareto_entity'],
+            'a_class_value': base['a_class_value'],
+            'peak_days_value': base['peak_days_value'],
+            'top_entity_value': base['top_entity_value'],
             'scenarios': scenarios,
             'savings_a': savings_a,
             'savings_peak': savings_peak,
@@ -65,28 +118,51 @@ class AnalyticsEngine:
         }
 
     # ====================== ВНУТРЕННИЕ МЕТОДЫ ======================
-    def _calculate_total_value(self, df: pd.DataFrame) -> float:
-        return float(df['value'].sum()) if 'value' in df.columns else 0.0
-
-    def _calculate_category_losses(self, df: pd.DataFrame) -> pd.DataFrame:
-        if 'category' not in df.columns or 'value' not in df.columns:
+    CUBE_KEYS = ('date', 'entity', 'category')
+
+    def _build_cube(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Предагрегат (date, entity, category) → value/count за один groupby по всем строкам"""
+        keys = [c for c in self.CUBE_KEYS if c in df.columns]
+        if not keys:
+            return pd.DataFrame({'value': [df['value'].sum()], 'count': [len(df)]})
+        # dropna=False: строка с пустым entity должна попасть в сумму по category, и наоборот
+        cube = df.groupby(keys, observed=True, dropna=False, sort=False)['value'].agg(['sum', 'count'])
+        cube = cube.rename(columns={'sum': 'value'}).reset_index()
+        # value может храниться во float32 — дальнейшие суммы считаем в float64
+        cube['value'] = cube['value'].astype('float64')
+        return cube
+
+    def _calculate_total_value(self, cube: pd.DataFrame) -> float:
+        return float(cube['value'].sum()) if 'value' in cube.columns else 0.0
+
+    def _calculate_category_losses(self, cube: pd.DataFrame, periods: PeriodAggregates) -> pd.DataFrame:
+        if 'category' not in cube.columns or 'value' not in cube.columns:
             return pd.DataFrame()
-        cat_loss = df.groupby('category')['value'].sum().reset_index()
+        cat_loss = periods.totals(['category']).reset_index()
         cat_loss = cat_loss.sort_values('value', ascending=False)
         cat_loss['percentage'] = (cat_loss['value'] / cat_loss['value'].sum() * 100).round(1)
         return cat_loss
 
-    def _calculate_entity_losses(self, df: pd.DataFrame) -> pd.DataFrame:
-        if 'entity' not in df.columns or 'value' not in df.columns:
+    def _calculate_entity_losses(self, cube: pd.DataFrame, periods: PeriodAggregates) -> pd.DataFrame:
+        if 'entity' not in cube.columns or 'value' not in cube.columns:
             return pd.DataFrame()
-        ent_loss = df.groupby('entity')['value'].sum().reset_index()
+        ent_loss = periods.totals(['entity']).reset_index()
         ent_loss = ent_loss.sort_values('value', ascending=False)
         ent_loss['percentage'] = (ent_loss['value'] / ent_loss['value'].sum() * 100).round(1)
         return ent_loss
 
-    def _calculate_abc_xyz(self, df: pd.DataFrame) -> pd.DataFrame:
-        if 'value' not in df.columns:
+    def _calculate_entity_stats(self, cube: pd.DataFrame) -> pd.DataFrame:
+        """Сумма, среднее на строку и число строк по объектам — из sum/count куба, без сырых строк"""
+        if 'entity' not in cube.columns or 'count' not in cube.columns:
             return pd.DataFrame()
+        stats = cube.groupby('entity', observed=True)[['value', 'count']].sum()
+        stats['mean'] = stats['value'] / stats['count']
+        return stats[['value', 'mean', 'count']].rename(columns={'value': 'sum'})
+
+    def _calculate_abc_xyz(self, cube: pd.DataFrame, df: pd.DataFrame,
+                           periods: PeriodAggregates) -> Optional[ABCClassifier]:
+        if 'value' not in df.columns:
+            return None
 
         if 'category' in df.columns:
             group_col = 'category'
@@ -95,24 +171,25 @@ class AnalyticsEngine:
         else:
             group_col = df.columns[0]
 
-        abc_data = df.groupby(group_col)['value'].sum().reset_index()
-        abc_data = abc_data.sort_values('value', ascending=False)
-        abc_data['cumulative_percentage'] = (abc_data['value'].cumsum() / abc_data['value'].sum() * 100).round(2)
-
-        def assign_abc(row):
-            if row['cumulative_percentage'] <= 80: return 'A'
-            elif row['cumulative_percentage'] <= 95: return 'B'
-            return 'C'
+        # Группировка не по измерению куба (нет ни category, ни entity) — только тогда идём в сырые строки
+        if group_col in periods.keys:
+            return periods.abc([group_col])
+        return ABCClassifier.from_frame(df, group_col)
 
-        abc_data['abc_class'] = abc_data.apply(assign_abc, axis=1)
-        return abc_data
-
-    def _calculate_pareto(self, df: pd.DataFrame) -> pd.DataFrame:
-        if 'entity' not in df.columns or 'value' not in df.columns:
+    def _abc_xyz_frame(self, classifier: Optional[ABCClassifier], periods: PeriodAggregates) -> pd.DataFrame:
+        if classifier is None:
+            return pd.DataFrame()
+        abc = classifier.frame()
+        level = list(classifier.index.names)
+        if 'date' not in periods.cube.columns or not set(level) <= set(periods.keys):
+            return abc
+        xyz = periods.xyz(level, config.XYZ_PERIOD)[['cv', 'xyz_class']]
+        return abc.merge(xyz, left_on=level, right_index=True, how='left')
+
+    def _calculate_pareto(self, entity_losses: pd.DataFrame) -> pd.DataFrame:
+        if entity_losses.empty:
             return pd.DataFrame()
-        pareto_data = self._calculate_entity_losses(df)
-        if pareto_data.empty:
-            return pareto_data
+        pareto_data = entity_losses.copy()
         pareto_data['cumulative_percentage'] = (pareto_data['value'].cumsum() / pareto_data['value'].sum() * 100).round(2)
         pareto_data['is_top_80'] = pareto_data['cumulative_percentage'] <= 80
         return pareto_data
@@ -123,10 +200,10 @@ class AnalyticsEngine:
         a_class = abc_xyz[abc_xyz['abc_class'] == 'A']
         return float(a_class['value'].sum()) if 'value' in a_class.columns else 0.0
 
-    def _calculate_peak_days_value(self, df: pd.DataFrame) -> float:
-        if 'date' not in df.columns or 'value' not in df.columns:
+    def _calculate_peak_days_value(self, cube: pd.DataFrame) -> float:
+        if 'date' not in cube.columns or 'value' not in cube.columns:
             return 0.0
-        daily = df.groupby('date')['value'].sum().reset_index()
+        daily = cube.groupby('date')['value'].sum().reset_index()
         daily = daily.sort_values('value', ascending=False)
         top_20_count = max(1, int(len(daily) * 0.2))
         return float(daily.head(top_20_count)['value'].sum())
@@ -0,0 +1,287 @@
+# core/anomaly_detector.py
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numba import njit
+from sklearn.ensemble import IsolationForest
+
+from config import config
+from core.rollups import weekday
+
+
+class AnomalyDetector:
+    """Детектор аномалий по колонке value.
+
+    Методы:
+        isolation_forest — IsolationForest по (value, value / медиана объекта, день недели)
+        mad              — робастный z-score: 0.6745 · |x − median| / MAD
+        seasonal         — остаток от медианы (объект × день недели) в единицах MAD остатков объекта
+        zscore, iqr, percentile — классические глобальные пороги
+
+    fit() обучается на выборке (до ANOMALY_FIT_SAMPLE строк), score() считает оценки
+    батчами по ANOMALY_BATCH_ROWS строк, так что память ограничена размером батча
+    плюс одним float32 на строку. Чем больше оценка, тем аномальнее строка.
+    """
+
+    METHODS = ("isolation_forest", "mad", "seasonal", "zscore", "iqr", "percentile")
+    MAD_SCALE = 0.6745
+
+    def __init__(
+        self,
+        method: str = "isolation_forest",
+        contamination: Optional[float] = None,
+        batch_rows: Optional[int] = None,
+        fit_sample: Optional[int] = None,
+        random_state: int = 42,
+    ):
+        if method not in self.METHODS:
+            raise ValueError(f"Неизвестный метод: {method}")
+        self.method = method
+        self.contamination = contamination or config.ANOMALY_CONTAMINATION
+        self.batch_rows = batch_rows or config.ANOMALY_BATCH_ROWS
+        self.fit_sample = fit_sample or config.ANOMALY_FIT_SAMPLE
+        self.random_state = random_state
+        self.train_scores_: Optional[np.ndarray] = None
+
+    # ====================== ОБУЧЕНИЕ ======================
+    def fit(self, df: pd.DataFrame) -> "AnomalyDetector":
+        if df.empty or 'value' not in df.columns:
+            raise ValueError("Для обучения нужна непустая колонка value")
+
+        sample = df
+        if len(df) > self.fit_sample:
+            sample = df.sample(n=self.fit_sample, random_state=self.random_state)
+
+        values = sample['value'].to_numpy(dtype=np.float64)
+        self.median_ = float(np.median(values))
+        self.mad_ = float(np.median(np.abs(values - self.median_))) or 1e-9
+        self.mean_ = float(values.mean())
+        self.std_ = float(values.std()) or 1e-9
+        self.q1_, self.q3_ = (float(q) for q in np.percentile(values, [25, 75]))
+
+        self.entity_categories_: Optional[pd.Index] = None
+        if 'entity' in df.columns:
+            self.entity_categories_ = self._categories(df['entity'])
+            self.entity_median_ = self._entity_medians(sample)
+
+        if self.method == "isolation_forest":
+            self.model_ = IsolationForest(
+                contamination=self.contamination,
+                random_state=self.random_state,
+                n_jobs=-1,
+            ).fit(self._features(sample))
+        elif self.method == "seasonal":
+            self._fit_seasonal(sample)
+
+        self.train_scores_ = np.sort(self._score_batch(sample))
+        return self
+
+    # ====================== ОЦЕНКА ======================
+    def score(self, df: pd.DataFrame) -> np.ndarray:
+        """Оценки аномальности для всех строк df, батчами"""
+        scores = np.empty(len(df), dtype=np.float32)
+        for start in range(0, len(df), self.batch_rows):
+            batch = df.iloc[start:start + self.batch_rows]
+            scores[start:start + len(batch)] = self._score_batch(batch)
+        return scores
+
+    def default_threshold(self) -> float:
+        """Порог по умолчанию: доля contamination самых аномальных строк обучающей выборки"""
+        return self.quantile_threshold(1 - self.contamination)
+
+    def quantile_threshold(self, q: float) -> float:
+        if self.train_scores_ is None:
+            raise ValueError("Сначала вызовите fit()")
+        return float(np.quantile(self.train_scores_, q))
+
+    @staticmethod
+    def flags(scores: np.ndarray, threshold: float) -> np.ndarray:
+        return scores > threshold
+
+    # ====================== ВНУТРЕННИЕ МЕТОДЫ ======================
+    def _score_batch(self, batch: pd.DataFrame) -> np.ndarray:
+        values = batch['value'].to_numpy(dtype=np.float64)
+
+        if self.method == "isolation_forest":
+            # score_samples: чем меньше, тем аномальнее — разворачиваем знак
+            return -self.model_.score_samples(self._features(batch))
+        if self.method == "mad":
+            return self.MAD_SCALE * np.abs(values - self.median_) / self.mad_
+        if self.method == "seasonal":
+            return self._score_seasonal(batch, values)
+        if self.method == "zscore":
+            return np.abs(values - self.mean_) / self.std_
+        if self.method == "iqr":
+            iqr = (self.q3_ - self.q1_) or 1e-9
+            # Расстояние за пределы [Q1, Q3] в единицах IQR: порог 1.5 = классический ус
+            return np.maximum(self.q1_ - values, values - self.q3_).clip(min=0) / iqr
+        return values  # percentile: порог задаётся квантилем самих значений
+
+    def _features(self, batch: pd.DataFrame) -> np.ndarray:
+        values = batch['value'].to_numpy(dtype=np.float64)
+        columns = [values]
+        if self.entity_categories_ is not None:
+            baseline = self.entity_median_[self._entity_codes(batch['entity'])]
+            columns.append(values / np.where(baseline > 0, baseline, 1.0))
+        if 'date' in batch.columns:
+            columns.append(weekday(batch).astype(np.float64))
+        return np.column_stack(columns).astype(np.float32)
+
+    def _fit_seasonal(self, sample: pd.DataFrame) -> None:
+        """Медиана value по (объект, день недели) и MAD остатков объекта — по обучающей выборке.
+        Дни недели объекта, не попавшие в выборку, берут медиану объекта"""
+        n_entities = len(self.entity_categories_) if self.entity_categories_ is not None else 0
+        entity_codes = self._entity_codes(sample['entity']) if n_entities else np.zeros(len(sample), dtype=np.int64)
+        dow = weekday(sample).astype(np.int64) if 'date' in sample.columns else np.zeros(len(sample), dtype=np.int64)
+        slot = entity_codes * 7 + dow
+        values = sample['value'].to_numpy(dtype=np.float64)
+
+        baseline = pd.Series(values).groupby(slot).median()
+        if n_entities:
+            self.seasonal_baseline_ = np.repeat(self.entity_median_, 7)
+        else:
+            self.seasonal_baseline_ = np.full(2 * 7, self.median_)
+        self.seasonal_baseline_[baseline.index.to_numpy()] = baseline.to_numpy()
+
+        residual = np.abs(values - self.seasonal_baseline_[slot])
+        spread = pd.Series(residual).groupby(entity_codes).median()
+        self.seasonal_spread_ = np.full(max(n_entities, 1) + 1, self.mad_)
+        self.seasonal_spread_[spread.index.to_numpy()] = np.where(spread.to_numpy() > 0, spread.to_numpy(), self.mad_)
+
+    def _score_seasonal(self, batch: pd.DataFrame, values: np.ndarray) -> np.ndarray:
+        if self.entity_categories_ is not None:
+            entity_codes = self._entity_codes(batch['entity'])
+        else:
+            entity_codes = np.zeros(len(batch), dtype=np.int64)
+        dow = weekday(batch).astype(np.int64) if 'date' in batch.columns else 0
+        residual = np.abs(values - self.seasonal_baseline_[entity_codes * 7 + dow])
+        return self.MAD_SCALE * residual / self.seasonal_spread_[entity_codes]
+
+    def _entity_medians(self, sample: pd.DataFrame) -> np.ndarray:
+        categories = self._entities()
+        codes = self._entity_codes(sample['entity'])
+        medians = pd.Series(sample['value'].to_numpy(dtype=np.float64)).groupby(codes).median()
+        # +1 слот — для неизвестных/пустых объектов (код -1 → последний элемент)
+        result = np.full(len(categories) + 1, self.median_)
+        result[medians.index.to_numpy()] = medians.to_numpy()
+        return result
+
+    @staticmethod
+    def _categories(series: pd.Series) -> pd.Index:
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series.cat.categories
+        return pd.Index(series.dropna().unique())
+
+    def _entities(self) -> pd.Index:
+        if self.entity_categories_ is None:
+            raise ValueError("Детектор обучен без колонки entity")
+        return self.entity_categories_
+
+    def _entity_codes(self, series: pd.Series) -> np.ndarray:
+        """Коды объектов в словаре обучения; неизвестные и NaN → -1 (последний слот таблиц)"""
+        categories = self._entities()
+        if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.equals(categories):
+            codes = series.cat.codes.to_numpy()
+        else:
+            codes = categories.get_indexer(series)
+        return codes.astype(np.int64)
+
+
+class SeriesAnomalyDetector:
+    """Аномалии по рядам (entity × category) относительно собственной истории ряда.
+
+    Строки агрегируются до дневных сумм, затем для всех рядов разом считается
+    скользящая медиана и MAD предыдущих window наблюдений (текущий день в базу
+    не входит). Отклонение в робастных z: 0.6745 · (x − median) / MAD, поэтому
+    маленький магазин с резким всплеском виден так же, как крупный.
+    Окно — по наблюдениям ряда, а не по календарю: пропущенные дни не заполняются.
+    """
+
+    SERIES_KEYS = ("entity", "category")
+
+    def __init__(self, window: Optional[int] = None, min_periods: Optional[int] = None):
+        self.window = window or config.SERIES_ANOMALY_WINDOW
+        self.min_periods = min(min_periods or config.SERIES_ANOMALY_MIN_PERIODS, self.window)
+
+    def score(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Дневной фрейм рядов с колонками baseline, mad и score (NaN — мало истории)"""
+        keys = [c for c in self.SERIES_KEYS if c in df.columns]
+        daily = (
+            df.groupby(keys + [df['date'].dt.normalize()], observed=True, sort=True)['value']
+            .sum()
+            .reset_index()
+        )
+        if daily.empty:
+            return daily.assign(baseline=np.nan, mad=np.nan, score=np.nan)
+
+        # Фрейм отсортирован по (ряд, дата) — ряды лежат подряд, границы из размеров групп
+        sizes = daily.groupby(keys, observed=True, sort=True).size().to_numpy() if keys else np.array([len(daily)])
+        starts = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+        values = daily['value'].to_numpy(dtype=np.float64)
+
+        baseline, mad = _rolling_median_mad(values, starts, self.window, self.min_periods)
+        deviation = values - baseline
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(mad > 0, AnomalyDetector.MAD_SCALE * deviation / mad,
+                             np.where(deviation == 0, 0.0, np.sign(deviation) * np.inf))
+
+        return daily.assign(baseline=baseline, mad=mad, score=score)
+
+    @staticmethod
+    def flags(scored: pd.DataFrame, threshold: float, both_sides: bool = False) -> np.ndarray:
+        """По умолчанию — только всплески вверх (потери выше обычного)"""
+        score = scored['score'].to_numpy()
+        return np.abs(score) > threshold if both_sides else score > threshold
+
+
+@njit(cache=True)
+def _rolling_median_mad(values: np.ndarray, starts: np.ndarray, window: int,
+                        min_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Медиана и MAD предыдущих window значений внутри каждого ряда.
+
+    Окно поддерживается отсортированным (вставка/удаление за O(window)),
+    поэтому медиана берётся за O(1), MAD — слиянием отклонений за O(window).
+    """
+    n = values.shape[0]
+    median = np.full(n, np.nan)
+    mad = np.full(n, np.nan)
+    buf = np.empty(window)
+
+    for g in range(starts.shape[0] - 1):
+        lo, hi = starts[g], starts[g + 1]
+        size = 0
+        for i in range(lo, hi):
+            if size >= min_periods:
+                half = size // 2
+                m = buf[half] if size % 2 == 1 else 0.5 * (buf[half - 1] + buf[half])
+                median[i] = m
+                # |buf − m| — две отсортированные последовательности по обе стороны от m;
+                # сливаем их до середины, не сортируя отклонения
+                left = np.searchsorted(buf[:size], m) - 1
+                right = left + 1
+                prev = cur = 0.0
+                for _ in range(half + 1):
+                    if left >= 0 and (right >= size or m - buf[left] <= buf[right] - m):
+                        val = m - buf[left]
+                        left -= 1
+                    else:
+                        val = buf[right] - m
+                        right += 1
+                    prev, cur = cur, val
+                mad[i] = cur if size % 2 == 1 else 0.5 * (prev + cur)
+
+            # Сдвигаем окно: убираем самое старое значение, вставляем текущее
+            if size == window:
+                pos = np.searchsorted(buf[:size], values[i - window])
+                for j in range(pos, size - 1):
+                    buf[j] = buf[j + 1]
+                size -= 1
+            x = values[i]
+            pos = np.searchsorted(buf[:size], x)
+            for j in range(size, pos, -1):
+                buf[j] = buf[j - 1]
+            buf[pos] = x
+            size += 1
+
+    return median, mad
@@ -0,0 +1,65 @@
+# core/data_index.py
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class DatasetIndex:
+    """Индекс нормализованного фрейма для фильтрации без полных масок и копий.
+
+    Фрейм отсортирован по date (это делает ColumnMapper.apply), поэтому диапазон
+    дат — это срез строк, границы которого ищутся бинарным поиском. Для измерений
+    хранятся целочисленные коды category: выбор значений превращается в таблицу
+    code → bool, а маска — в одну выборку по кодам внутри среза.
+    """
+
+    DIMENSION_COLS = ("entity", "category")
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        self._dates = df["date"] if "date" in df.columns else None
+        self.is_sorted = self._dates is not None and self._dates.is_monotonic_increasing
+        self._codes: Dict[str, np.ndarray] = {}
+        self._categories: Dict[str, pd.Index] = {}
+        self._has_missing: Dict[str, bool] = {}
+        for col in self.DIMENSION_COLS:
+            if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+                self._codes[col] = df[col].cat.codes.to_numpy()
+                self._categories[col] = df[col].cat.categories
+                self._has_missing[col] = bool((self._codes[col] < 0).any())
+
+    @property
+    def dates(self) -> pd.Series:
+        if self._dates is None:
+            raise KeyError("date")
+        return self._dates
+
+    def date_bounds(self) -> Tuple[Any, Any]:
+        """Мин./макс. дата без прохода по строкам"""
+        return self.dates.iloc[0], self.dates.iloc[-1]
+
+    def date_slice(self, start: Any, end: Any) -> slice:
+        """Строки с start <= date <= end (границы как у прежнего сравнения с pd.Timestamp)"""
+        lo = self.dates.searchsorted(pd.Timestamp(start), side="left")
+        hi = self.dates.searchsorted(pd.Timestamp(end), side="right")
+        return slice(int(lo), int(max(lo, hi)))
+
+    def has_codes(self, col: str) -> bool:
+        return col in self._codes
+
+    def selection_mask(self, col: str, values: Iterable[Any], rows: slice) -> np.ndarray:
+        """Маска строк среза, у которых значение col входит в values"""
+        categories = self._categories[col]
+        # Последний элемент — слот для кода -1 (NaN), он всегда False
+        lookup = np.zeros(len(categories) + 1, dtype=bool)
+        positions = categories.get_indexer(list(values))
+        lookup[positions[positions >= 0]] = True
+        return lookup[self._codes[col][rows]]
+
+    def is_full_selection(self, col: str, values: Optional[Iterable[Any]]) -> bool:
+        """Выбраны все значения словаря и пропусков нет — маска не нужна.
+        Строки с пустым значением в выбор не входят, как и в маске isin"""
+        if not values:
+            return True
+        return not self._has_missing[col] and set(self._categories[col]).issubset(values)
@@ -1,21 +1,55 @@
 # core/data_loader.py
+from functools import reduce
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
 import streamlit as st
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from config import config
+from core import schema_profiler
+from core.excel_reader import read_workbook
+from data.cache import DatasetCache
+from ui.components.column_mapper import ColumnMapper
 
 
 class DataLoader:
+    DEMO_DATASET_ID = "demo"
+
+    # Суффикс файла → формат и сжатие CSV (распаковка на лету через pyarrow)
+    FORMATS = {
+        ".csv": ("csv", None), ".csv.gz": ("csv", "gzip"), ".csv.zst": ("csv", "zstd"), ".csv.zstd": ("csv", "zstd"),
+        ".xlsx": ("excel", None), ".xls": ("excel", None),
+        ".parquet": ("parquet", None), ".feather": ("feather", None), ".arrow": ("feather", None),
+    }
+
+    def __init__(self) -> None:
+        self.cache = DatasetCache()
+
     @st.cache_data(ttl=3600, show_spinner="Загрузка данных...")
     def load(_self, uploaded_file=None, use_test_data=True) -> pd.DataFrame:
         # _self — это трюк для обхода ошибки хэширования self
 
         if uploaded_file is not None:
-            if uploaded_file.name.endswith(".csv"):
-                df = pd.read_csv(uploaded_file)
-            elif uploaded_file.name.endswith((".xlsx", ".xls")):
-                df = pd.read_excel(uploaded_file)
+            fmt = _self.file_format(uploaded_file.name)
+            if fmt == "csv":
+                if _self.is_streamable(uploaded_file):
+                    # Большой CSV: для сопоставления колонок хватает превью,
+                    # полный файл читается потоково в load_streaming
+                    df = pd.read_csv(_self._csv_stream(uploaded_file), nrows=config.CSV_PREVIEW_ROWS)
+                    uploaded_file.seek(0)
+                else:
+                    df = pd.read_csv(_self._csv_stream(uploaded_file))
+            elif fmt == "excel":
+                df = _self.load_excel(uploaded_file)
+            elif fmt in ("parquet", "feather"):
+                # Колоночный файл: для сопоставления — превью, после него читаются только нужные колонки
+                df = _self.read_columnar(uploaded_file, preview=True)
             else:
-                st.error("Поддерживаются только CSV и Excel")
+                st.error("Поддерживаются CSV (в том числе .csv.gz и .csv.zst), Excel, Parquet и Feather")
                 return pd.DataFrame()
             return df
 
@@ -23,15 +57,224 @@ class DataLoader:
             return _self._generate_test_data()
         return pd.DataFrame()
 
-    def _generate_test_data(self) -> pd.DataFrame:
-        np.random.seed(42)
-        dates = pd.date_range("2024-01-01", "2024-12-31", freq="D")
-        entities = [f"Entity_{i:03d}" for i in range(1, 21)]
-        categories = ["Электроника", "Одежда", "Продукты", "Бытовая техника", "Косметика"]
-        data = []
-        for date in dates:
-            for ent in entities:
-                for cat in categories:
-                    value = round(np.random.gamma(2, 100) * (1.5 if date.dayofweek >= 5 else 1), 2)
-                    data.append({"date": date, "entity": ent, "category": cat, "value": value})
-        return pd.DataFrame(data)
\ No newline at end of file
+    @classmethod
+    def file_format(cls, name: str) -> Optional[str]:
+        """csv / excel / parquet / feather по расширению; None — не поддерживается"""
+        name = name.lower()
+        for suffix, (fmt, _) in cls.FORMATS.items():
+            if name.endswith(suffix):
+                return fmt
+        return None
+
+    @classmethod
+    def read_columnar(cls, uploaded_file: Any, columns: Optional[List[str]] = None, preview: bool = False) -> pd.DataFrame:
+        """Parquet / Feather (Arrow IPC): только колонки columns или первые CSV_PREVIEW_ROWS строк"""
+        uploaded_file.seek(0)
+        if cls.file_format(uploaded_file.name) == "parquet":
+            if preview:
+                parquet = pq.ParquetFile(uploaded_file)
+                batch = next(parquet.iter_batches(batch_size=config.CSV_PREVIEW_ROWS), None)
+                table = pa.Table.from_batches([batch]) if batch is not None else parquet.schema_arrow.empty_table()
+            else:
+                table = pq.read_table(uploaded_file, columns=columns)
+        elif preview:
+            try:
+                reader = pa.ipc.open_file(uploaded_file)
+                batches = [reader.get_batch(0)] if reader.num_record_batches else []
+                table = pa.Table.from_batches(batches, schema=reader.schema).slice(0, config.CSV_PREVIEW_ROWS)
+            except pa.ArrowInvalid:
+                # Feather v1 — не IPC-файл, читается только целиком
+                uploaded_file.seek(0)
+                table = feather.read_table(uploaded_file).slice(0, config.CSV_PREVIEW_ROWS)
+        else:
+            table = feather.read_table(uploaded_file, columns=columns, memory_map=False)
+        uploaded_file.seek(0)
+        return table.to_pandas()
+
+    def load_excel(self, uploaded_file: Any) -> pd.DataFrame:
+        """Все листы книги с общей схемой; разобранная книга кэшируется на диске по хэшу файла"""
+        content_hash = DatasetCache.content_hash(uploaded_file)
+        df = self.cache.get_raw(content_hash)
+        if df is not None:
+            return df
+
+        df, skipped = read_workbook(uploaded_file)
+        if skipped:
+            st.info(f"Листы с другим набором колонок пропущены: {', '.join(skipped)}")
+        try:
+            self.cache.put_raw(content_hash, df)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OSError):
+            pass  # не удалось сохранить — в следующий раз книга просто разберётся заново
+        return df
+
+    def dataset_id(self, uploaded_file: Any) -> str:
+        """Идентификатор датасета — хэш содержимого загрузки (считается один раз на файл)"""
+        if uploaded_file is None:
+            return self.DEMO_DATASET_ID
+        memo_key = f"_content_hash_{getattr(uploaded_file, 'file_id', uploaded_file.name)}"
+        if memo_key not in st.session_state:
+            st.session_state[memo_key] = DatasetCache.content_hash(uploaded_file)
+        return st.session_state[memo_key]
+
+    def load_cached(self, uploaded_file: Any) -> Optional[Tuple[Dict[str, str], pd.DataFrame]]:
+        """Маппинг и нормализованный фрейм из дискового кэша — без парсинга исходного файла"""
+        if uploaded_file is None:
+            return None
+        content_hash = self.dataset_id(uploaded_file)
+        mapping = self.cache.last_mapping(content_hash)
+        if not mapping:
+            return None
+        df = self.cache.get(content_hash, mapping)
+        return (mapping, df) if df is not None else None
+
+    def load_mapped(self, uploaded_file: Any, mapping: Dict[str, str], raw_df: pd.DataFrame) -> pd.DataFrame:
+        """Возвращает нормализованный DataFrame: из кэша, потоково для больших CSV, иначе через ColumnMapper.apply"""
+        if uploaded_file is None:
+            return ColumnMapper.apply(raw_df, mapping)
+
+        content_hash = self.dataset_id(uploaded_file)
+        df = self.cache.get(content_hash, mapping)
+        if df is not None:
+            return df
+
+        # Из файла читаются только сопоставленные колонки и выбранные дополнительные фильтры
+        columns = ColumnMapper.source_columns(mapping)
+        if self.file_format(uploaded_file.name) in ("parquet", "feather"):
+            df = ColumnMapper.apply(self.read_columnar(uploaded_file, columns), mapping)
+        elif self.is_streamable(uploaded_file):
+            df = self.load_streaming(uploaded_file, mapping)
+        else:
+            df = ColumnMapper.apply(raw_df[[c for c in columns if c in raw_df.columns]], mapping)
+        self.cache.put(content_hash, mapping, df)
+        return df
+
+    @classmethod
+    def is_streamable(cls, uploaded_file: Any) -> bool:
+        """CSV крупнее порога читается чанками, а не целиком"""
+        if uploaded_file is None or cls.file_format(uploaded_file.name) != "csv":
+            return False
+        size = getattr(uploaded_file, "size", None)
+        if size is None:
+            return False
+        return size >= config.CSV_STREAMING_MIN_MB * 1024 * 1024
+
+    def load_streaming(self, source: Any, mapping: Dict[str, str], chunksize: Optional[int] = None) -> pd.DataFrame:
+        """Потоковое чтение CSV: нормализация и сужение типов (ColumnMapper.apply) на каждом чанке, затем одна склейка.
+
+        Пиковая память — итоговый (суженный) фрейм плюс один сырой чанк,
+        а не весь сырой файл в object-колонках.
+        """
+        chunks, formats = [], None
+        for chunk in self._iter_csv_chunks(source, chunksize or config.CSV_CHUNK_ROWS,
+                                           ColumnMapper.source_columns(mapping)):
+            # Форматы даты и чисел определяются по первому чанку — одинаковый разбор для всего файла
+            if formats is None:
+                formats = schema_profiler.sniff_formats(chunk, mapping)
+            chunks.append(ColumnMapper.apply(chunk, mapping, formats))
+        return self._concat_chunks(chunks)
+
+    @classmethod
+    def _csv_stream(cls, source: Any) -> Any:
+        """Источник для pd.read_csv с начала файла; .gz/.zst распаковываются потоково"""
+        if hasattr(source, "seek"):
+            source.seek(0)
+        name = source if isinstance(source, str) else getattr(source, "name", "")
+        compression = next((comp for suffix, (_, comp) in cls.FORMATS.items()
+                            if name.lower().endswith(suffix)), None)
+        if compression is None:
+            return source
+        # Поток pyarrow закрывает обёрнутый файл; загрузку читаем через её буфер без копии
+        if hasattr(source, "getbuffer"):
+            source = pa.py_buffer(source.getbuffer())
+        return pa.input_stream(source, compression=compression)
+
+    @classmethod
+    def _iter_csv_chunks(cls, source: Any, chunksize: int,
+                         usecols: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        with pd.read_csv(cls._csv_stream(source), chunksize=chunksize, usecols=usecols) as reader:
+            yield from reader
+
+    @staticmethod
+    def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+        if not chunks:
+            return pd.DataFrame()
+
+        # Категории разных чанков объединяются в общий словарь,
+        # иначе pd.concat откатит колонку обратно в object
+        cat_cols = {
+            col for ch in chunks for col in ch.columns
+            if isinstance(ch[col].dtype, pd.CategoricalDtype)
+        }
+        for col in cat_cols:
+            for ch in chunks:
+                if not isinstance(ch[col].dtype, pd.CategoricalDtype):
+                    ch[col] = ch[col].astype("category")
+            categories = reduce(lambda acc, idx: acc.union(idx), [ch[col].cat.categories for ch in chunks])
+            for ch in chunks:
+                ch[col] = ch[col].cat.set_categories(categories)
+
+        # Каждый чанк отсортирован по дате, но склейка — нет: общий порядок —
+        # стабильная сортировка одной колонки дат (то же, что sort_values по всему фрейму)
+        order = None
+        if "date" in chunks[0].columns:
+            dates = np.concatenate([ch["date"].to_numpy() for ch in chunks])
+            if len(dates) > 1 and not (dates[1:] >= dates[:-1]).all():
+                order = np.argsort(dates, kind="stable")
+            del dates
+
+        # Склейка по колонкам с освобождением чанков: пик памяти — итоговый фрейм
+        # плюс одна колонка, а не две полные копии (concat и затем sort_values)
+        columns = {}
+        for col in list(chunks[0].columns):
+            series = pd.concat([ch.pop(col) for ch in chunks], ignore_index=True)
+            columns[col] = series if order is None else series.iloc[order].reset_index(drop=True)
+        return pd.DataFrame(columns, copy=False)
+
+    def _generate_test_data(
+        self,
+        days: Optional[int] = None,
+        entity_count: Optional[int] = None,
+        categories: Optional[List[str]] = None,
+        n_rows: Optional[int] = None,
+        hourly: bool = False,
+        anomaly_rate: float = 0.0,
+        seed: int = 42,
+    ) -> pd.DataFrame:
+        """Синтетические данные без построчных циклов — годятся и для демо, и для нагрузочных тестов.
+
+        По умолчанию строится полная сетка период × объект × категория из AppConfig;
+        n_rows вместо сетки сэмплирует заданное число строк. Значения — gamma(2, 100)
+        с коэффициентом 1.5 в выходные; anomaly_rate доля строк умножается на 3–8.
+        """
+        days = days or config.DEFAULT_TEST_DATA_DAYS
+        entity_count = entity_count or config.DEFAULT_STORE_COUNT
+        categories = categories or config.DEFAULT_CATEGORIES
+        rng = np.random.default_rng(seed)
+
+        periods_per_day = 24 if hourly else 1
+        timestamps = pd.date_range("2024-01-01", periods=days * periods_per_day, freq="h" if hourly else "D")
+        entities = [f"Entity_{i:03d}" for i in range(1, entity_count + 1)]
+        n_ts, n_ent, n_cat = len(timestamps), len(entities), len(categories)
+
+        if n_rows is None:
+            ts_idx = np.repeat(np.arange(n_ts, dtype=np.int32), n_ent * n_cat)
+            ent_idx = np.tile(np.repeat(np.arange(n_ent, dtype=np.int32), n_cat), n_ts)
+            cat_idx = np.tile(np.arange(n_cat, dtype=np.int32), n_ts * n_ent)
+        else:
+            ts_idx = np.sort(rng.integers(0, n_ts, n_rows, dtype=np.int32))
+            ent_idx = rng.integers(0, n_ent, n_rows, dtype=np.int32)
+            cat_idx = rng.integers(0, n_cat, n_rows, dtype=np.int32)
+
+        weekend_factor = np.where(timestamps.dayofweek >= 5, 1.5, 1.0)
+        value = rng.gamma(2, 100, len(ts_idx)) * weekend_factor[ts_idx]
+
+        if anomaly_rate > 0:
+            is_anomaly = rng.random(len(value)) < anomaly_rate
+            value[is_anomaly] *= rng.uniform(3, 8, int(is_anomaly.sum()))
+
+        return pd.DataFrame({
+            "date": timestamps.take(ts_idx),
+            "entity": pd.Categorical.from_codes(ent_idx, categories=entities),
+            "category": pd.Categorical.from_codes(cat_idx, categories=categories),
+            "value": np.round(value, 2),
+        })
\ No newline at end of file
@@ -0,0 +1,125 @@
+# core/excel_reader.py
+"""Быстрое чтение Excel.
+
+Движок — python-calamine (Rust), если установлен; иначе openpyxl в режиме
+read_only с потоковым iter_rows(values_only=True) — без построчной конвертации
+ячеек, которую делает pd.read_excel. Листы книги разбираются параллельно
+в процессах; листы с той же схемой (набором колонок), что у первого, склеиваются.
+Результат кэширует DataLoader (DatasetCache.put_raw) по хэшу файла.
+"""
+import importlib.util
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config import config
+
+
+def excel_engine(filename: str) -> Optional[str]:
+    """calamine, openpyxl для .xlsx или None — .xls без calamine читает pandas (xlrd)"""
+    if config.EXCEL_ENGINE != 'auto':
+        return config.EXCEL_ENGINE
+    if importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    return 'openpyxl' if filename.lower().endswith('.xlsx') else None
+
+
+def sheet_names(source: Any, engine: Optional[str]) -> List[str]:
+    if engine == 'openpyxl':
+        import openpyxl
+        workbook = openpyxl.load_workbook(source, read_only=True, keep_links=False)
+        try:
+            return workbook.sheetnames
+        finally:
+            workbook.close()
+    with pd.ExcelFile(source, engine=engine) as book:
+        return [str(name) for name in book.sheet_names]
+
+
+def read_sheet(source: Any, sheet: str, engine: Optional[str]) -> pd.DataFrame:
+    """Один лист: первая строка — заголовок, полностью пустые строки отбрасываются"""
+    if engine == 'openpyxl':
+        import openpyxl
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True, keep_links=False)
+        try:
+            rows = workbook[sheet].iter_rows(values_only=True)
+            header = next(rows, ())
+            df = pd.DataFrame.from_records(list(rows), columns=_column_names(header))
+        finally:
+            workbook.close()
+        df = df.dropna(how='all').reset_index(drop=True)
+        # Объектные колонки из Python-значений: числа/даты → нативные типы, как у read_excel
+        df = df.infer_objects()
+    else:
+        df = pd.read_excel(source, sheet_name=sheet, engine=engine)
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+def read_workbook(uploaded_file: Any, max_workers: Optional[int] = None) -> Tuple[pd.DataFrame, List[str]]:
+    """Все листы книги; возвращает склеенный фрейм и имена пропущенных листов (другая схема)"""
+    engine = excel_engine(uploaded_file.name)
+    uploaded_file.seek(0)
+    sheets = sheet_names(uploaded_file, engine)
+    workers = min(len(sheets), max_workers or config.EXCEL_MAX_WORKERS or os.cpu_count() or 1)
+
+    if workers <= 1:
+        frames = []
+        for sheet in sheets:
+            uploaded_file.seek(0)
+            frames.append(read_sheet(uploaded_file, sheet, engine))
+    else:
+        # Процессам нужен путь, а не объект загрузки: книга пишется во временный файл один раз
+        suffix = os.path.splitext(uploaded_file.name)[1]
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            uploaded_file.seek(0)
+            shutil.copyfileobj(uploaded_file, tmp)
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                frames = list(pool.map(read_sheet, [tmp.name] * len(sheets), sheets, [engine] * len(sheets)))
+        finally:
+            os.remove(tmp.name)
+    uploaded_file.seek(0)
+    df, skipped = combine_sheets(dict(zip(sheets, frames, strict=True)))
+    return _arrow_safe(df), skipped
+
+
+def combine_sheets(frames: Dict[str, pd.DataFrame]) -> Tuple[pd.DataFrame, List[str]]:
+    """Склейка листов со схемой первого непустого листа; остальные — в списке пропущенных"""
+    filled = {name: df for name, df in frames.items() if not df.empty}
+    if not filled:
+        return pd.DataFrame(), []
+
+    schema = list(next(iter(filled.values())).columns)
+    matching = [df for df in filled.values() if list(df.columns) == schema]
+    skipped = [name for name, df in filled.items() if list(df.columns) != schema]
+    df = matching[0] if len(matching) == 1 else pd.concat(matching, ignore_index=True)
+    return df, skipped
+
+
+def _column_names(header: Tuple[Any, ...]) -> List[str]:
+    """Заголовки как у pd.read_excel: пустые → 'Unnamed: i', повторы → 'name.1'"""
+    names: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None or str(value).strip() == '' else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Колонки со смешанными типами (числа и строки в одном столбце) → строки: иначе книга не ляжет в Arrow"""
+    for col in df.select_dtypes(include='object').columns:
+        series = df[col]
+        if pd.api.types.infer_dtype(series, skipna=True).startswith('mixed'):
+            df[col] = series.astype(str).where(series.notna(), None)
+    return df
@@ -0,0 +1,277 @@
+# core/forecast_engine.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import config
+from data.cache import ForecastStateStore
+
+
+class ForecastEngine:
+    """Пакетный прогноз Holt-Winters (аддитивный тренд + недельная сезонность) для всех рядов уровня.
+
+    Вместо подбора параметров statsmodels по одному ряду (~0.1 с на ряд) рекурсия
+    той же модели считается векторно сразу для блока рядов и всей сетки (α, β, γ):
+    для каждого ряда берутся параметры с минимальной ошибкой одношагового прогноза.
+    Блоки рядов обрабатываются параллельно в пуле процессов.
+    """
+
+    ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.8)
+    BETAS = (0.0, 0.01, 0.05, 0.1)
+    GAMMAS = (0.0, 0.05, 0.1, 0.3)
+
+    def __init__(
+        self,
+        horizon: Optional[int] = None,
+        seasonal_periods: int = 7,
+        interval: float = 0.95,
+        max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        self.horizon = horizon or config.FORECAST_DAYS
+        self.seasonal_periods = seasonal_periods
+        self.interval = interval
+        self.max_workers = max_workers or config.FORECAST_MAX_WORKERS or os.cpu_count() or 1
+        self.chunk_size = chunk_size or config.FORECAST_CHUNK_SERIES
+        self.level_: Optional[str] = None
+        self.state_: Optional[pd.DataFrame] = None
+
+    # ====================== ОБУЧЕНИЕ ======================
+    def fit(self, df: pd.DataFrame, level: str = 'entity', store: Optional[ForecastStateStore] = None,
+            scope: Optional[str] = None) -> "ForecastEngine":
+        """Подбирает параметры и финальные состояния для каждого ряда уровня level.
+
+        Если передано хранилище состояний, ряды с сохранённым состоянием не переобучаются:
+        состояние дообновляется только по новым дням (полное переобучение — раз в
+        FORECAST_REFIT_EVERY_DAYS дней или если история изменилась).
+        """
+        matrix = self.daily_matrix(df, level)
+        self.level_ = level
+
+        prior = store.load(scope) if store is not None and scope else None
+        self.state_ = self._fit_matrix(matrix) if prior is None else self._fit_incremental(matrix, prior)
+
+        if store is not None and scope:
+            store.save(scope, self.state_)
+        return self
+
+    @staticmethod
+    def daily_matrix(df: pd.DataFrame, level: str) -> pd.DataFrame:
+        """Дневные суммы: строки — календарные дни без пропусков, колонки — ряды"""
+        keys = [level] if level in df.columns else []
+        daily = df.groupby(keys + [df['date'].dt.normalize()], observed=True)['value'].sum()
+        matrix = daily.unstack(level=0, fill_value=0.0) if keys else daily.to_frame('Итого')
+        calendar = pd.date_range(matrix.index.min(), matrix.index.max(), freq='D')
+        return matrix.reindex(calendar, fill_value=0.0).astype(np.float64)
+
+    def _fit_matrix(self, matrix: pd.DataFrame) -> pd.DataFrame:
+        values = matrix.to_numpy().T  # (ряды, дни)
+        grid = _param_grid(self.ALPHAS, self.BETAS, self.GAMMAS)
+        chunks = [values[i:i + self.chunk_size] for i in range(0, len(values), self.chunk_size)]
+
+        if len(chunks) > 1 and self.max_workers > 1:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+                results = list(pool.map(_fit_chunk, chunks, [grid] * len(chunks),
+                                        [self.seasonal_periods] * len(chunks)))
+        else:
+            results = [_fit_chunk(chunk, grid, self.seasonal_periods) for chunk in chunks]
+
+        state = pd.DataFrame({
+            key: np.concatenate([r[key] for r in results])
+            for key in ('alpha', 'beta', 'gamma', 'level', 'trend', 'sigma', 'n_fitted')
+        }, index=pd.Index(matrix.columns, name='series'))
+        state['season'] = list(np.concatenate([r['season'] for r in results]))
+        state['last_date'] = matrix.index[-1]
+        state['last_value'] = matrix.iloc[-1].to_numpy()
+        state['fitted_date'] = matrix.index[-1]
+        return state
+
+    def _fit_incremental(self, matrix: pd.DataFrame, prior: pd.DataFrame) -> pd.DataFrame:
+        """Дообучение сохранённых состояний на новых днях; остальные ряды — полное обучение"""
+        last_date = matrix.index[-1]
+        known = prior.loc[prior.index.intersection(matrix.columns)]
+
+        in_history = known['last_date'].isin(matrix.index) & (known['last_date'] <= last_date)
+        fresh = (last_date - known['fitted_date']).dt.days < config.FORECAST_REFIT_EVERY_DAYS
+        reusable = known[in_history & fresh]
+        # История до last_date не должна была измениться: сверяем последнее учтённое значение
+        if not reusable.empty:
+            observed = np.array([
+                matrix.at[d, sid] for sid, d in zip(reusable.index, reusable['last_date'], strict=True)
+            ])
+            reusable = reusable[np.isclose(observed, reusable['last_value'].to_numpy())]
+
+        parts = []
+        for prior_last, group in reusable.groupby('last_date'):
+            new_days = matrix.loc[matrix.index > prior_last, group.index]
+            parts.append(group if new_days.empty else _update_state(group, new_days, self.seasonal_periods))
+
+        refit = matrix.columns.difference(reusable.index, sort=False)
+        if len(refit):
+            parts.append(self._fit_matrix(matrix[refit]))
+
+        return pd.concat(parts).loc[matrix.columns]
+
+    # ====================== ПРОГНОЗ ======================
+    def predict(self, horizon: Optional[int] = None) -> pd.DataFrame:
+        """Tidy-прогноз: series, date, forecast, lower, upper"""
+        if self.state_ is None:
+            raise ValueError("Сначала вызовите fit()")
+        return forecast_from_state(self.state_, horizon or self.horizon, self.interval,
+                                   self.seasonal_periods).rename(columns={'series': self.level_ or 'series'})
+
+    def forecast(self, df: pd.DataFrame, level: str = 'entity', horizon: Optional[int] = None,
+                 store: Optional[ForecastStateStore] = None, scope: Optional[str] = None) -> pd.DataFrame:
+        return self.fit(df, level, store, scope).predict(horizon)
+
+
+# ====================== ПРОСТЫЕ МЕТОДЫ ======================
+# Чистые функции без Streamlit: используются вкладкой прогноза и бэктестом.
+def moving_average_forecast(series: pd.Series, days: int, window: int = 7) -> np.ndarray:
+    """Последнее значение скользящего среднего, продлённое на days дней"""
+    last_value = series.rolling(window=window, min_periods=1).mean().iloc[-1]
+    return np.full(days, last_value)
+
+
+def exponential_smoothing_forecast(series: pd.Series, days: int, alpha: float = 0.3) -> np.ndarray:
+    """Последний уровень простого экспоненциального сглаживания, продлённый на days дней"""
+    last_value = series.ewm(alpha=alpha, adjust=False).mean().iloc[-1]
+    return np.full(days, last_value)
+
+
+def simple_trend_forecast(series: pd.Series, days: int) -> np.ndarray:
+    """Линейный тренд по всей истории"""
+    x = np.arange(len(series))
+    coeffs = np.polyfit(x, series.to_numpy(), 1)
+    future_x = np.arange(len(series), len(series) + days)
+    return coeffs[0] * future_x + coeffs[1]
+
+
+SIMPLE_METHODS = {
+    'moving_average': moving_average_forecast,
+    'exponential_smoothing': exponential_smoothing_forecast,
+    'simple_trend': simple_trend_forecast,
+}
+
+
+def forecast_from_state(state: pd.DataFrame, horizon: int, interval: float = 0.95,
+                        seasonal_periods: int = 7) -> pd.DataFrame:
+    """Прогноз и интервалы по финальным состояниям Holt-Winters.
+
+    Дисперсия h-шагового прогноза аддитивной модели:
+    σ²·(1 + Σ_{j<h} (α(1 + jβ) + γ·[j mod m = 0])²).
+    """
+    h = np.arange(1, horizon + 1)
+    alpha, beta, gamma = (state[c].to_numpy()[:, None] for c in ('alpha', 'beta', 'gamma'))
+    season = np.stack(state['season'].to_numpy())
+    point = state['level'].to_numpy()[:, None] + h * state['trend'].to_numpy()[:, None] \
+        + season[:, (h - 1) % seasonal_periods]
+
+    j = np.arange(1, horizon)
+    c = alpha * (1 + j * beta) + gamma * (j % seasonal_periods == 0)
+    variance_factor = 1 + np.concatenate([np.zeros((len(state), 1)), np.cumsum(c ** 2, axis=1)], axis=1)
+    z = NormalDist().inv_cdf(0.5 + interval / 2)
+    half_width = z * state['sigma'].to_numpy()[:, None] * np.sqrt(variance_factor)
+
+    dates = pd.DatetimeIndex(state['last_date']).to_numpy()[:, None] + (h * np.timedelta64(1, 'D'))
+    return pd.DataFrame({
+        'series': np.repeat(state.index.to_numpy(), horizon),
+        'date': dates.ravel(),
+        'forecast': point.ravel(),
+        'lower': (point - half_width).ravel(),
+        'upper': (point + half_width).ravel(),
+    })
+
+
+def _update_state(state: pd.DataFrame, new_days: pd.DataFrame, m: int) -> pd.DataFrame:
+    """Прогон рекурсии Holt-Winters с зафиксированными параметрами только по новым дням"""
+    values = new_days.to_numpy().T  # (ряды, новые дни)
+    alpha, beta, gamma = (state[c].to_numpy() for c in ('alpha', 'beta', 'gamma'))
+    level, trend = state['level'].to_numpy(), state['trend'].to_numpy()
+    season = np.stack(state['season'].to_numpy())  # season[:, 0] — сезонность следующего дня
+    sse = state['sigma'].to_numpy() ** 2 * state['n_fitted'].to_numpy()
+
+    for t in range(values.shape[1]):
+        y = values[:, t]
+        error = y - (level + trend + season[:, 0])
+        sse += error ** 2
+        level, trend, new_season = _hw_step(y, level, trend, season[:, 0], alpha, beta, gamma)
+        # Новая сезонность понадобится через m дней — в конец окна
+        season = np.column_stack([season[:, 1:], new_season])
+
+    updated = state.copy()
+    updated['level'], updated['trend'] = level, trend
+    updated['season'] = list(season)
+    updated['n_fitted'] = state['n_fitted'].to_numpy() + values.shape[1]
+    updated['sigma'] = np.sqrt(sse / updated['n_fitted'].to_numpy())
+    updated['last_date'] = new_days.index[-1]
+    updated['last_value'] = values[:, -1]
+    return updated
+
+
+def _param_grid(alphas: Sequence[float], betas: Sequence[float], gammas: Sequence[float]) -> np.ndarray:
+    return np.array([(a, b, g) for a in alphas for b in betas for g in gammas], dtype=np.float64)
+
+
+def _initial_state(values: np.ndarray, m: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Эвристическая инициализация: уровень и сезонность по первому сезону, тренд — по первым двум"""
+    n_series, n_obs = values.shape
+    if n_obs >= 2 * m:
+        first, second = values[:, :m].mean(axis=1), values[:, m:2 * m].mean(axis=1)
+        return first, (second - first) / m, values[:, :m] - first[:, None]
+    level = values[:, :max(1, min(m, n_obs))].mean(axis=1)
+    return level, np.zeros(n_series), np.zeros((n_series, m))
+
+
+def _hw_step(y: np.ndarray, level: np.ndarray, trend: np.ndarray, season: np.ndarray,
+             alpha: np.ndarray, beta: np.ndarray, gamma: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Один шаг аддитивного Holt-Winters (формы как в statsmodels): новые level, trend, season"""
+    new_level = alpha * (y - season) + (1 - alpha) * (level + trend)
+    new_trend = beta * (new_level - level) + (1 - beta) * trend
+    new_season = gamma * (y - level - trend) + (1 - gamma) * season
+    return new_level, new_trend, new_season
+
+
+def _fit_chunk(values: np.ndarray, grid: np.ndarray, m: int) -> Dict[str, np.ndarray]:
+    """Векторная рекурсия Holt-Winters для блока рядов × всей сетки параметров.
+
+    Состояния имеют форму (параметры, ряды); сезонность — кольцевой буфер по t mod m.
+    Для каждого ряда выбираются параметры с минимальной SSE одношаговых прогнозов.
+    """
+    n_series, n_obs = values.shape
+    alpha, beta, gamma = (grid[:, k][:, None] for k in range(3))
+
+    level0, trend0, season0 = _initial_state(values, m)
+    level = np.broadcast_to(level0, (len(grid), n_series)).copy()
+    trend = np.broadcast_to(trend0, (len(grid), n_series)).copy()
+    season = np.broadcast_to(season0.T[:, None, :], (m, len(grid), n_series)).copy()
+    sse = np.zeros((len(grid), n_series))
+
+    warmup = m if n_obs >= 2 * m else 0
+    for t in range(n_obs):
+        y = values[:, t]
+        s = season[t % m]
+        error = y - (level + trend + s)
+        if t >= warmup:
+            sse += error ** 2
+        level, trend, season[t % m] = _hw_step(y, level, trend, s, alpha, beta, gamma)
+
+    best = np.argmin(sse, axis=0)
+    cols = np.arange(n_series)
+    # Сезонность поворачиваем так, чтобы season[k] относился к дню n_obs + k
+    order = (n_obs + np.arange(m)) % m
+    n_fitted = max(n_obs - warmup, 1)
+    return {
+        'alpha': grid[best, 0],
+        'beta': grid[best, 1],
+        'gamma': grid[best, 2],
+        'level': level[best, cols],
+        'trend': trend[best, cols],
+        'season': season[order][:, best, cols].T,
+        'sigma': np.sqrt(sse[best, cols] / n_fitted),
+        'n_fitted': np.full(n_series, n_fitted),
+    }
@@ -0,0 +1,294 @@
+# core/query_backend.py
+"""Внешние движки запросов поверх Arrow-кэша датасета (DatasetCache).
+
+Фильтры и группировка куба (date, entity, category) выполняются в Polars (lazy)
+или DuckDB прямо по файлу на диске: строки датасета остаются в движке, в процесс
+Streamlit материализуются только куб, часовые суммы для роллапов и выборка
+строк не больше QUERY_DETAIL_ROWS. Полный набор строк — только потоком пачек
+для экспорта. Семантика совпадает с FilterManager.apply и
+AnalyticsEngine._build_cube — сверка в tests/test_query_backend.py.
+"""
+import math
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from config import config
+
+CUBE_KEYS = ('date', 'entity', 'category')
+SELECTIONS = (('entity', 'selected_entities'), ('category', 'selected_categories'))
+
+
+def filter_spec(filter_state: Dict[str, Any], columns: List[str]) -> Tuple[Optional[Tuple[pd.Timestamp, pd.Timestamp]],
+                                                                         Dict[str, List[Any]]]:
+    """Диапазон дат (включительно) и выбранные значения измерений; пустой выбор — без фильтра"""
+    date_range = None
+    if 'date' in columns and 'date_range' in filter_state:
+        start, end = filter_state['date_range']
+        date_range = (pd.Timestamp(start), pd.Timestamp(end))
+    selections = {col: list(filter_state[key]) for col, key in SELECTIONS
+                  if col in columns and filter_state.get(key)}
+    return date_range, selections
+
+
+class QueryBackend(ABC):
+    """Базовый класс: куб, агрегаты и ограниченная выборка строк по файлу Arrow IPC.
+
+    Файл кэша неизменяем (ключ — содержимое и маппинг), поэтому словари измерений
+    и границы дат считаются один раз на экземпляр.
+    """
+
+    name = 'base'
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._dictionaries: Dict[str, List[Any]] = {}
+        self._date_bounds: Optional[Tuple[pd.Timestamp, pd.Timestamp]] = None
+
+    @property
+    @abstractmethod
+    def columns(self) -> List[str]:
+        """Колонки датасета по схеме файла"""
+
+    @abstractmethod
+    def count(self, filter_state: Dict[str, Any]) -> int:
+        """Число строк, прошедших фильтр"""
+
+    @abstractmethod
+    def sample(self, filter_state: Dict[str, Any], limit: int) -> pd.DataFrame:
+        """Не больше limit строк, прошедших фильтр, в порядке дат; все строки, если их не больше limit"""
+
+    @abstractmethod
+    def batches(self, filter_state: Dict[str, Any], size: int) -> Iterator[pd.DataFrame]:
+        """Все строки, прошедшие фильтр, пачками не больше size — для потоковой записи отчёта"""
+
+    @abstractmethod
+    def cube(self, filter_state: Dict[str, Any]) -> pd.DataFrame:
+        """Куб (date, entity, category) → value, count по отфильтрованным строкам"""
+
+    @abstractmethod
+    def hourly_totals(self) -> pd.DataFrame:
+        """Суммы value и start_value (строки ровно в 00:00) по (час, измерения) всего датасета — исходник TimeRollups"""
+
+    @abstractmethod
+    def _distinct(self, col: str) -> List[Any]:
+        """Непустые значения колонки без повторов"""
+
+    @abstractmethod
+    def _min_max_date(self) -> Tuple[Any, Any]:
+        """Минимальная и максимальная дата файла"""
+
+    def dimension_values(self, col: str) -> List[Any]:
+        """Словарь измерения: отсортированные непустые значения всего датасета"""
+        if col not in self._dictionaries:
+            self._dictionaries[col] = sorted(self._distinct(col))
+        return self._dictionaries[col]
+
+    def date_bounds(self) -> Tuple[pd.Timestamp, pd.Timestamp]:
+        """Мин./макс. дата для диапазона в сайдбаре"""
+        if self._date_bounds is None:
+            start, end = self._min_max_date()
+            self._date_bounds = (pd.Timestamp(start), pd.Timestamp(end))
+        return self._date_bounds
+
+    def _cube_keys(self) -> List[str]:
+        return [c for c in CUBE_KEYS if c in self.columns]
+
+    def _categorize(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Измерения — category со словарём всего датасета, как у DataLoader: DuckDB отдаёт их строками,
+        а выборка или пачка видит лишь часть значений"""
+        for col, _ in SELECTIONS:
+            if col in frame.columns:
+                frame[col] = pd.Categorical(frame[col].astype(object), categories=self.dimension_values(col))
+        return frame
+
+    def _finish_cube(self, cube: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+        """Тот же вид, что у AnalyticsEngine._build_cube: keys..., value (float64), count"""
+        cube = self._categorize(cube[keys + ['value', 'count']])
+        cube['value'] = cube['value'].astype('float64')
+        cube['count'] = cube['count'].astype('int64')
+        return cube
+
+    def _finish_hourly(self, hourly: pd.DataFrame) -> pd.DataFrame:
+        hourly = self._categorize(hourly)
+        for col in ('value', 'start_value'):
+            hourly[col] = hourly[col].astype('float64')
+        return hourly
+
+    def _dimensions(self) -> List[str]:
+        return [col for col, _ in SELECTIONS if col in self.columns]
+
+
+class PolarsBackend(QueryBackend):
+    name = 'polars'
+
+    def __init__(self, path: Path):
+        import polars as pl
+        super().__init__(path)
+        self._pl = pl
+        self._frame = pl.scan_ipc(self.path)
+
+    @property
+    def columns(self) -> List[str]:
+        return self._frame.collect_schema().names()
+
+    def _filtered(self, filter_state: Dict[str, Any]) -> Any:
+        pl = self._pl
+        date_range, selections = filter_spec(filter_state, self.columns)
+        frame = self._frame
+        if date_range is not None:
+            frame = frame.filter(pl.col('date').is_between(*date_range, closed='both'))
+        for col, values in selections.items():
+            frame = frame.filter(pl.col(col).cast(pl.String).is_in([str(v) for v in values]))
+        return frame
+
+    def count(self, filter_state: Dict[str, Any]) -> int:
+        return int(self._filtered(filter_state).select(self._pl.len()).collect().item())
+
+    def sample(self, filter_state: Dict[str, Any], limit: int) -> pd.DataFrame:
+        frame = self._filtered(filter_state)
+        n_rows = self.count(filter_state) if limit > 0 else 0
+        if n_rows > limit:
+            # Каждая step-я строка: равномерно по датам, порядок файла сохраняется
+            frame = frame.gather_every(math.ceil(n_rows / limit))
+        return self._categorize(frame.head(max(limit, 0)).collect().to_pandas())
+
+    def batches(self, filter_state: Dict[str, Any], size: int) -> Iterator[pd.DataFrame]:
+        empty = True
+        for batch in self._filtered(filter_state).collect_batches(chunk_size=size):
+            empty = False
+            yield self._categorize(batch.to_pandas())
+        if empty:
+            yield self.sample(filter_state, 0)
+
+    def cube(self, filter_state: Dict[str, Any]) -> pd.DataFrame:
+        pl = self._pl
+        keys = self._cube_keys()
+        frame = self._filtered(filter_state)
+        # Суммы — во float64, как SUM у DuckDB: value в файле может быть float32
+        aggs = [pl.col('value').cast(pl.Float64).sum().alias('value'), pl.len().alias('count')]
+        result = frame.group_by(keys).agg(aggs) if keys else frame.select(aggs)
+        return self._finish_cube(result.collect().to_pandas(), keys)
+
+    def hourly_totals(self) -> pd.DataFrame:
+        pl = self._pl
+        keys = [pl.col('date').dt.truncate('1h').alias('date')] + self._dimensions()
+        value = pl.col('value').cast(pl.Float64)
+        # start_value — строки ровно в полночь: последний день диапазона фильтр берёт только ими
+        at_start = pl.col('date') == pl.col('date').dt.truncate('1d')
+        result = self._frame.group_by(keys).agg(
+            value.sum(), pl.when(at_start.any()).then(value.filter(at_start).sum()).alias('start_value'))
+        return self._finish_hourly(result.collect().to_pandas())
+
+    def _distinct(self, col: str) -> List[Any]:
+        return self._frame.select(self._pl.col(col).drop_nulls().unique()).collect().to_series().to_list()
+
+    def _min_max_date(self) -> Tuple[Any, Any]:
+        pl = self._pl
+        bounds = self._frame.select(pl.col('date').min().alias('start'), pl.col('date').max().alias('end'))
+        return bounds.collect().row(0)
+
+
+class DuckDBBackend(QueryBackend):
+    name = 'duckdb'
+
+    def __init__(self, path: Path):
+        import duckdb
+        import pyarrow.dataset as ds
+        super().__init__(path)
+        self._con = duckdb.connect()
+        if config.QUERY_BACKEND_THREADS:
+            self._con.execute(f"SET threads TO {int(config.QUERY_BACKEND_THREADS)}")
+        # Arrow-датасет над IPC-файлом: DuckDB сканирует его потоково с проталкиванием фильтров
+        self._dataset = ds.dataset(str(self.path), format='ipc')
+
+    def _cursor(self) -> Any:
+        """Отдельный курсор на запрос: соединение не потокобезопасно, а сессии и экспорт идут из разных потоков.
+        Зарегистрированные объекты у курсора свои — датасет регистрируется заново"""
+        cursor = self._con.cursor()
+        cursor.register('dataset', self._dataset)
+        return cursor
+
+    @property
+    def columns(self) -> List[str]:
+        return self._dataset.schema.names
+
+    def _where(self, filter_state: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        date_range, selections = filter_spec(filter_state, self.columns)
+        clauses: List[str] = []
+        params: List[Any] = []
+        if date_range is not None:
+            clauses.append('"date" BETWEEN ? AND ?')
+            params.extend(ts.to_pydatetime() for ts in date_range)
+        for col, values in selections.items():
+            clauses.append(f'CAST("{col}" AS VARCHAR) IN ({", ".join("?" * len(values))})')
+            params.extend(str(v) for v in values)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def _query(self, query: str, params: Optional[List[Any]] = None) -> pd.DataFrame:
+        return self._cursor().execute(query, params or []).to_arrow_table().to_pandas()
+
+    def count(self, filter_state: Dict[str, Any]) -> int:
+        where, params = self._where(filter_state)
+        return int(self._cursor().execute(f'SELECT COUNT(*) FROM dataset{where}', params).fetchone()[0])
+
+    def sample(self, filter_state: Dict[str, Any], limit: int) -> pd.DataFrame:
+        where, params = self._where(filter_state)
+        query = f'SELECT * FROM dataset{where}'
+        if limit <= 0:
+            query += ' LIMIT 0'
+        elif self.count(filter_state) > limit:
+            # Случайная выборка фиксированного размера; сортируются только отобранные строки
+            query = f'SELECT * FROM ({query}) USING SAMPLE reservoir({int(limit)} ROWS) REPEATABLE (42)'
+            if 'date' in self.columns:
+                query += ' ORDER BY "date"'
+        return self._categorize(self._query(query, params))
+
+    def batches(self, filter_state: Dict[str, Any], size: int) -> Iterator[pd.DataFrame]:
+        where, params = self._where(filter_state)
+        reader = self._cursor().execute(f'SELECT * FROM dataset{where}', params).to_arrow_reader(size)
+        empty = True
+        for batch in reader:
+            empty = False
+            yield self._categorize(batch.to_pandas())
+        if empty:
+            yield self.sample(filter_state, 0)
+
+    def cube(self, filter_state: Dict[str, Any]) -> pd.DataFrame:
+        keys = self._cube_keys()
+        where, params = self._where(filter_state)
+        select = ', '.join(f'"{k}"' for k in keys)
+        query = f'SELECT {select + ", " if keys else ""}SUM("value") AS value, COUNT(*) AS count FROM dataset{where}'
+        if keys:
+            query += f' GROUP BY {select}'
+        return self._finish_cube(self._query(query, params), keys)
+
+    def hourly_totals(self) -> pd.DataFrame:
+        dims = ''.join(f', "{col}"' for col in self._dimensions())
+        query = (f'SELECT date_trunc(\'hour\', "date") AS "date"{dims}, SUM("value") AS value, '
+                 f'SUM(CASE WHEN "date" = date_trunc(\'day\', "date") THEN "value" END) AS start_value '
+                 f'FROM dataset GROUP BY ALL')
+        return self._finish_hourly(self._query(query))
+
+    def _distinct(self, col: str) -> List[Any]:
+        query = f'SELECT DISTINCT "{col}" FROM dataset WHERE "{col}" IS NOT NULL'
+        return [row[0] for row in self._cursor().execute(query).fetchall()]
+
+    def _min_max_date(self) -> Tuple[Any, Any]:
+        return self._cursor().execute('SELECT MIN("date"), MAX("date") FROM dataset').fetchone()
+
+
+BACKENDS = {'polars': PolarsBackend, 'duckdb': DuckDBBackend}
+
+
+def create_backend(name: Optional[str], path: Optional[Union[str, Path]]) -> Optional[QueryBackend]:
+    """Бэкенд по имени; None — считать в pandas (нет файла кэша, имя 'pandas' или движок не установлен)"""
+    name = name or config.QUERY_BACKEND
+    if name not in BACKENDS or path is None or not Path(path).exists():
+        return None
+    try:
+        return BACKENDS[name](Path(path))
+    except ImportError:
+        return None
@@ -0,0 +1,227 @@
+# core/rollups.py
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_EPOCH = pd.Timestamp('1970-01-01')
+# 1970-01-01 — четверг: сдвиг номера дня на 3 даёт недели с понедельника
+_WEEK_SHIFT = 3
+
+# Календарные коды строки: считаются один раз в ColumnMapper.apply и хранятся рядом с date
+CALENDAR_COLS = ('cal_day', 'cal_week', 'cal_month', 'cal_dow', 'cal_hour')
+
+
+def calendar_features(dates: pd.Series) -> pd.DataFrame:
+    """Номер дня от 1970-01-01 (int32), недели с понедельника (int32), месяца (int16),
+    день недели (int8, Пн = 0) и час суток (int8) — целочисленная арифметика над datetime64"""
+    stamps = dates.to_numpy().astype('datetime64[h]')
+    days = stamps.astype('datetime64[D]')
+    day = days.astype(np.int64)
+    return pd.DataFrame({
+        'cal_day': day.astype(np.int32),
+        'cal_week': TimeRollups.week_code(day).astype(np.int32),
+        'cal_month': days.astype('datetime64[M]').astype(np.int64).astype(np.int16),
+        'cal_dow': TimeRollups.weekday_code(day).astype(np.int8),
+        'cal_hour': (stamps - days).astype(np.int64).astype(np.int8),
+    }, index=dates.index)
+
+
+def calendar_codes(df: pd.DataFrame) -> pd.DataFrame:
+    """Календарные колонки фрейма; у датасетов из старого кэша их нет — считаются по date"""
+    if all(col in df.columns for col in CALENDAR_COLS):
+        return df[list(CALENDAR_COLS)]
+    return calendar_features(df['date'])
+
+
+def at_day_start(dates: pd.Series) -> np.ndarray:
+    """Строки ровно в 00:00 — только они попадают в фильтр от последнего дня диапазона (date <= end)"""
+    stamps = dates.to_numpy().astype('datetime64[ns]')
+    return stamps == stamps.astype('datetime64[D]')
+
+
+def weekday(df: pd.DataFrame) -> np.ndarray:
+    """День недели строк (Пн = 0) без datetime-аксессора, если коды уже посчитаны"""
+    if 'cal_dow' in df.columns:
+        return df['cal_dow'].to_numpy()
+    return df['date'].dt.dayofweek.to_numpy()
+
+
+class TimeRollups:
+    """Суммы value по времени × измерения, построенные один раз при загрузке датасета.
+
+    Уровни: час (день + час суток), день, ISO-неделя (с понедельника) и месяц —
+    каждый в разрезе entity × category. Графики берут отсюда ряды, дни недели
+    и часы с учётом фильтров: выбор объектов/категорий — маска по строкам
+    роллапа, диапазон дат — по номерам дней. Сырые строки не сканируются,
+    смена частоты — выборка из готового уровня.
+
+    Границы диапазона — как в FilterManager: start <= date <= end, где end —
+    полночь последнего дня. Первый день входит целиком, последний — только
+    строками ровно в 00:00; для этого рядом с value хранится start_value —
+    сумма строк, стоящих точно в начале суток (NaN, если таких строк нет).
+    """
+
+    FREQS = {'D': "Дни", 'W': "Недели", 'M': "Месяцы"}
+    DIMENSIONS = (('entity', 'selected_entities'), ('category', 'selected_categories'))
+    START_VALUE = 'start_value'
+
+    def __init__(self, df: pd.DataFrame):
+        """df — строки датасета или почасовые суммы движка с готовой колонкой start_value"""
+        self.dims = [col for col, _ in self.DIMENSIONS if col in df.columns]
+        codes = calendar_codes(df)
+        value = df['value'].to_numpy(dtype=np.float64)
+        if self.START_VALUE in df.columns:
+            start_value = df[self.START_VALUE].to_numpy(dtype=np.float64)
+        else:
+            start_value = np.where(at_day_start(df['date']), value, np.nan)
+
+        frame = pd.DataFrame({
+            'day': codes['cal_day'].to_numpy(),
+            'hour': codes['cal_hour'].to_numpy(),
+            **{col: df[col].array for col in self.dims},
+            'value': value,
+            self.START_VALUE: start_value,
+        })
+        self.hourly = self._group(frame, ['day', 'hour'])
+        self.daily = self._group(self.hourly, ['day'])
+        days = self.daily.drop(columns=self.START_VALUE)
+        self.levels: Dict[str, pd.DataFrame] = {
+            'D': days.rename(columns={'day': 'period'}),
+            'W': self._group(days.assign(period=self.week_code(days['day'].to_numpy())), ['period']),
+            'M': self._group(days.assign(period=self.month_code(days['day'].to_numpy())), ['period']),
+        }
+
+    @property
+    def nbytes(self) -> int:
+        frames = [self.hourly] + list(self.levels.values())
+        return int(sum(f.memory_usage(index=True, deep=False).sum() for f in frames))
+
+    # ====================== КОДЫ ПЕРИОДОВ ======================
+    @staticmethod
+    def week_code(day: np.ndarray) -> np.ndarray:
+        """Номер недели с понедельника по номеру дня от 1970-01-01 или по datetime64[D]"""
+        return (day.astype(np.int64) + _WEEK_SHIFT) // 7
+
+    @staticmethod
+    def weekday_code(day: np.ndarray) -> np.ndarray:
+        return (day.astype(np.int64) + _WEEK_SHIFT) % 7
+
+    @staticmethod
+    def month_code(day: np.ndarray) -> np.ndarray:
+        return day.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+    @staticmethod
+    def period_start(freq: str, code: np.ndarray) -> pd.DatetimeIndex:
+        code = np.asarray(code, dtype=np.int64)
+        if freq == 'W':
+            code = code * 7 - _WEEK_SHIFT
+        elif freq == 'M':
+            return pd.DatetimeIndex(code.astype('datetime64[M]').astype('datetime64[ns]'))
+        return pd.DatetimeIndex(code.astype('datetime64[D]').astype('datetime64[ns]'))
+
+    def _period_of_day(self, freq: str, day: np.ndarray) -> np.ndarray:
+        if freq == 'W':
+            return self.week_code(day)
+        if freq == 'M':
+            return self.month_code(day)
+        return day.astype(np.int64)
+
+    # ====================== ЗАПРОСЫ ======================
+    def series(self, freq: str, filter_state: Dict[str, Any]) -> pd.Series:
+        """Сумма value по периодам (индекс — начало периода) с учётом фильтров"""
+        level = self.levels[freq]
+        mask = self._dimension_mask(level, filter_state)
+        day_range = self._day_range(filter_state)
+
+        if day_range is None:
+            parts = [level[mask]]
+        else:
+            lo, hi = day_range
+            period = level['period'].to_numpy()
+            if freq == 'D':
+                parts = [self._day_filter(filter_state, lo, hi).rename(columns={'day': 'period'})]
+            else:
+                # Периоды целиком внутри диапазона — из готового уровня,
+                # крайние (частично попавшие) — из дневного по дням диапазона
+                first, last = self._period_of_day(freq, np.array([lo, hi]))
+                inner = (period > first) & (period < last)
+                edge = self._day_filter(filter_state, lo, hi)
+                edge = edge.assign(period=self._period_of_day(freq, edge['day'].to_numpy()))
+                edge = edge[edge['period'].isin([first, last])]
+                parts = [level[mask & inner], edge]
+
+        rows = pd.concat([p[['period', 'value']] for p in parts], ignore_index=True)
+        totals = rows.groupby('period')['value'].sum()
+        return pd.Series(totals.to_numpy(), index=self.period_start(freq, totals.index.to_numpy()), name='value')
+
+    def daily_rows(self, filter_state: Dict[str, Any]) -> pd.DataFrame:
+        """Дневные суммы (date, измерения, value) с учётом фильтров — вход прогноза и рядов аномалий"""
+        day_range = self._day_range(filter_state)
+        if day_range is None:
+            rows = self.daily[self._dimension_mask(self.daily, filter_state)]
+        else:
+            rows = self._day_filter(filter_state, *day_range)
+        return pd.DataFrame({
+            'date': self.period_start('D', rows['day'].to_numpy()),
+            **{col: rows[col].array for col in self.dims},
+            'value': rows['value'].to_numpy(),
+        })
+
+    def weekday_hour(self, filter_state: Dict[str, Any]) -> np.ndarray:
+        """Матрица 7 × 24: день недели (Пн = 0) × час суток"""
+        rows = self.hourly[self._dimension_mask(self.hourly, filter_state)]
+        day_range = self._day_range(filter_state)
+        value = rows['value'].to_numpy()
+        if day_range is not None:
+            day = rows['day'].to_numpy()
+            inside = (day >= day_range[0]) & (day <= day_range[1])
+            rows = rows[inside]
+            value = np.nan_to_num(self._range_value(rows, day_range[1]))
+        cell = self.weekday_code(rows['day'].to_numpy()) * 24 + rows['hour'].to_numpy().astype(np.int64)
+        return np.bincount(cell, weights=value, minlength=7 * 24).reshape(7, 24)
+
+    def by_weekday(self, filter_state: Dict[str, Any]) -> np.ndarray:
+        return self.weekday_hour(filter_state).sum(axis=1)
+
+    def by_hour(self, filter_state: Dict[str, Any]) -> np.ndarray:
+        return self.weekday_hour(filter_state).sum(axis=0)
+
+    # ====================== ВНУТРЕННИЕ МЕТОДЫ ======================
+    def _group(self, frame: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+        # dropna=False: строки с пустым измерением остаются в суммах, как в кубе движка
+        groups = frame.groupby(keys + self.dims, observed=True, dropna=False, sort=False)
+        result = groups['value'].sum().reset_index()
+        if self.START_VALUE in frame.columns:
+            # min_count=1: группа без строк в полночь остаётся NaN, а не нулём
+            result[self.START_VALUE] = groups[self.START_VALUE].sum(min_count=1).to_numpy()
+        return result
+
+    def _dimension_mask(self, level: pd.DataFrame, filter_state: Dict[str, Any]) -> np.ndarray:
+        """Выбор объектов/категорий как в FilterManager: пустой выбор — без фильтра"""
+        mask = np.ones(len(level), dtype=bool)
+        for col, key in self.DIMENSIONS:
+            selected = filter_state.get(key)
+            if col in self.dims and selected:
+                mask &= level[col].isin(selected).to_numpy()
+        return mask
+
+    def _day_filter(self, filter_state: Dict[str, Any], lo: int, hi: int) -> pd.DataFrame:
+        """Дневные строки диапазона; у последнего дня — только сумма строк ровно в полночь"""
+        day = self.daily['day'].to_numpy()
+        rows = self.daily[self._dimension_mask(self.daily, filter_state) & (day >= lo) & (day <= hi)]
+        value = self._range_value(rows, hi)
+        inside = ~np.isnan(value)
+        return rows[inside].drop(columns=self.START_VALUE).assign(value=value[inside])
+
+    def _range_value(self, rows: pd.DataFrame, hi: int) -> np.ndarray:
+        """value строк диапазона; у последнего дня — start_value (NaN — строк в полночь не было)"""
+        return np.where(rows['day'].to_numpy() < hi, rows['value'].to_numpy(), rows[self.START_VALUE].to_numpy())
+
+    @staticmethod
+    def _day_range(filter_state: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        if 'date_range' not in filter_state:
+            return None
+        start, end = filter_state['date_range']
+        return ((pd.Timestamp(start).normalize() - _EPOCH).days,
+                (pd.Timestamp(end).normalize() - _EPOCH).days)
@@ -0,0 +1,229 @@
+# core/schema_profiler.py
+"""Профилирование колонок по выборке строк.
+
+По PROFILE_SAMPLE_ROWS строкам угадываются роли колонок (по имени, типу и
+статистике значений), точный формат дат и разделители дробной части и тысяч.
+Полная колонка затем разбирается одним векторным проходом с явным форматом
+(pyarrow.compute.strptime) вместо поэлементного угадывания в pd.to_datetime.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from config import config
+
+# Порядок важен при равной доле совпадений: для дат через '/' месяц-день раньше день-месяца —
+# неоднозначные 01/02/2024 разбираются как прежде в pd.to_datetime (2 января)
+DATE_FORMATS = (
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M',
+    '%d.%m.%Y', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%y',
+    '%m/%d/%Y', '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%d/%m/%Y', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M',
+    '%d-%m-%Y', '%Y/%m/%d', '%Y/%m/%d %H:%M:%S', '%Y%m%d',
+)
+
+NAME_PATTERNS = {
+    'date': ['date', 'time', 'day', 'order_date', 'transaction_date', 'дата'],
+    'value': ['amount', 'value', 'loss', 'revenue', 'sales', 'cost', 'qty', 'quantity', 'сумма', 'потери'],
+    'entity': ['store', 'shop', 'region', 'client', 'customer', 'id', 'sku', 'магазин'],
+    'category': ['category', 'group', 'product', 'type', 'item', 'категория', 'товар'],
+}
+
+# Число с разделителями: 1 234,56 / 1.234,56 / 1,234.56 / -12,5
+_NUMBER_RE = re.compile(r'^[-+]?[\d\s .,\']*\d$')
+_GROUPED_RE = {sep: re.compile(rf'^[-+]?\d{{1,3}}(?:{re.escape(sep)}\d{{3}})+$') for sep in (',', '.')}
+
+
+def sample(series: pd.Series, n: Optional[int] = None) -> pd.Series:
+    """Непустые значения из начала колонки — этого хватает для формата и статистики"""
+    return series.dropna().head(n or config.PROFILE_SAMPLE_ROWS)
+
+
+def _is_text(series: pd.Series) -> bool:
+    return pd.api.types.is_string_dtype(series.dtype) or pd.api.types.is_object_dtype(series.dtype)
+
+
+def _to_arrow_text(series: pd.Series) -> Optional[pa.Array]:
+    """Строки колонки в Arrow без пробелов по краям; None — в колонке не только строки"""
+    try:
+        arrow = pa.array(series, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    return pc.utf8_trim_whitespace(arrow)
+
+
+# ====================== ДАТЫ ======================
+def sniff_date_format(series: pd.Series) -> Optional[str]:
+    """Формат strptime, под который подходит наибольшая доля выборки (не меньше DATE_FORMAT_MIN_MATCH);
+    'ISO8601' — для ISO со смещением или долями секунды; None — колонка не похожа на даты"""
+    if not _is_text(series):
+        return None
+    values = sample(series)
+    arrow = _to_arrow_text(values)
+    if arrow is None or len(arrow) == 0:
+        return None
+
+    best, best_share = None, 0.0
+    for fmt in DATE_FORMATS:
+        parsed = pc.strptime(arrow, format=fmt, unit='s', error_is_null=True)
+        share = 1 - parsed.null_count / len(arrow)
+        if share > best_share:
+            best, best_share = fmt, share
+        if share == 1:
+            break
+    if best_share < config.DATE_FORMAT_MIN_MATCH:
+        iso_share = pd.to_datetime(values, format='ISO8601', errors='coerce').notna().mean()
+        if iso_share >= config.DATE_FORMAT_MIN_MATCH:
+            return 'ISO8601'
+        return None
+    return best
+
+
+def parse_dates(series: pd.Series, fmt: Optional[str] = None) -> pd.Series:
+    """Векторный разбор дат с явным форматом; несовпавшие строки — поэлементным pd.to_datetime"""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series
+    if fmt is None or not _is_text(series):
+        return pd.to_datetime(series, errors='coerce')
+    if fmt == 'ISO8601':
+        return pd.to_datetime(series, format='ISO8601', errors='coerce')
+
+    arrow = _to_arrow_text(series)
+    if arrow is None:
+        return pd.to_datetime(series, errors='coerce')
+    parsed = pc.cast(pc.strptime(arrow, format=fmt, unit='s', error_is_null=True), pa.timestamp('us'))
+    result = pd.Series(parsed.to_numpy(zero_copy_only=False), index=series.index, name=series.name)
+
+    # Редкие строки другого вида (например, дата без времени среди дат со временем)
+    missed = result.isna() & series.notna()
+    if missed.any():
+        result[missed] = pd.to_datetime(series[missed], errors='coerce')
+    return result
+
+
+# ====================== ЧИСЛА ======================
+def sniff_number_format(series: pd.Series) -> Optional[Tuple[str, str]]:
+    """(десятичный разделитель, разделитель тысяч) для текстовой числовой колонки; None — не текст/не число"""
+    if not _is_text(series):
+        return None
+    values = sample(series).astype(str).str.strip()
+    values = values[values.str.match(_NUMBER_RE)]
+    if values.empty:
+        return None
+
+    spaced = values.str.contains(r"[\s ']", regex=True).any()
+    both = values[values.str.contains(',', regex=False) & values.str.contains('.', regex=False)]
+    if not both.empty:
+        # Оба знака в одном числе: десятичный — тот, что правее
+        decimal = ',' if (both.str.rfind(',') > both.str.rfind('.')).mean() > 0.5 else '.'
+        return decimal, '.' if decimal == ',' else ','
+
+    for sep in (',', '.'):
+        with_sep = values[values.str.contains(sep, regex=False)]
+        if with_sep.empty:
+            continue
+        # Только группы по три цифры (1,234 / 1.234.567) — разделитель тысяч, иначе дробная часть.
+        # Одна точка с тремя цифрами (1.250) — обычная дробь, как у pd.to_numeric: точка считается
+        # разделителем тысяч, только если в каком-то числе групп несколько
+        grouped = with_sep.str.match(_GROUPED_RE[sep]).all() and not spaced
+        if grouped and (sep == ',' or (with_sep.str.count(r'\.') > 1).any()):
+            return ('.' if sep == ',' else ','), sep
+        return sep, ' ' if spaced else ''
+    return '.', ' ' if spaced else ''
+
+
+def parse_numbers(series: pd.Series, number_format: Optional[Tuple[str, str]] = None) -> pd.Series:
+    """pd.to_numeric после векторного удаления разделителя тысяч и замены десятичного на точку"""
+    if number_format is None or not _is_text(series):
+        return pd.to_numeric(series, errors='coerce')
+    decimal, thousands = number_format
+    text = series.astype(str).str.replace(r"[\s ']", '', regex=True)
+    if thousands in (',', '.'):
+        text = text.str.replace(thousands, '', regex=False)
+    if decimal != '.':
+        text = text.str.replace(decimal, '.', regex=False)
+    return pd.to_numeric(text, errors='coerce')
+
+
+# ====================== РОЛИ ======================
+def sniff_formats(df: pd.DataFrame, mapping: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Форматы разбора ролей: {'date': формат даты, 'value': разделители}.
+
+    mapping — роль → колонка исходного фрейма; без него колонки уже названы по ролям.
+    """
+    mapping = mapping or {}
+    formats: Dict[str, Any] = {}
+    for role, sniff in (('date', sniff_date_format), ('value', sniff_number_format)):
+        col = mapping.get(role, role)
+        if col in df.columns:
+            formats[role] = sniff(df[col])
+    return formats
+
+
+def infer_roles(df: pd.DataFrame) -> Dict[str, str]:
+    """Роли колонок: сначала по имени, недостающие — по типу и статистике выборки"""
+    head = df.head(config.PROFILE_SAMPLE_ROWS)
+    lower_cols = {str(col).lower().strip(): col for col in df.columns}
+    detected: Dict[str, str] = {}
+
+    # Точное совпадение имени, затем вхождение шаблона (order_date_utc, total_amount, ...)
+    for role, patterns in NAME_PATTERNS.items():
+        for pattern in patterns:
+            if pattern in lower_cols and lower_cols[pattern] not in detected.values():
+                detected[role] = lower_cols[pattern]
+                break
+    for role, patterns in NAME_PATTERNS.items():
+        if role in detected:
+            continue
+        for name, col in lower_cols.items():
+            if col not in detected.values() and any(p in name for p in patterns if len(p) > 2):
+                detected[role] = col
+                break
+
+    free = [c for c in df.columns if c not in detected.values()]
+
+    if 'date' not in detected:
+        for col in free:
+            if pd.api.types.is_datetime64_any_dtype(head[col].dtype) or sniff_date_format(head[col]) is not None:
+                detected['date'] = col
+                free.remove(col)
+                break
+
+    if 'value' not in detected:
+        candidates = []
+        for col in free:
+            values = head[col]
+            if not pd.api.types.is_numeric_dtype(values.dtype):
+                if sniff_number_format(values) is None:
+                    continue
+                values = parse_numbers(values, sniff_number_format(values))
+            values = values.dropna()
+            if values.empty or pd.api.types.is_bool_dtype(values.dtype):
+                continue
+            # Счётчики и идентификаторы (целые, почти все разные, монотонные) — не метрика
+            if values.is_monotonic_increasing and values.is_unique:
+                continue
+            fractional = float((np.asarray(values, dtype=np.float64) % 1 != 0).mean())
+            candidates.append((fractional, values.nunique() / len(values), col))
+        if candidates:
+            col = max(candidates)[2]
+            detected['value'] = col
+            free.remove(col)
+
+    # Измерения — текстовые колонки с повторами: больше уникальных — entity, меньше — category
+    dims: List[Tuple[int, str]] = []
+    for col in free:
+        values = head[col].dropna()
+        if values.empty or not (_is_text(values) or isinstance(values.dtype, pd.CategoricalDtype)):
+            continue
+        nunique = values.nunique()
+        if 1 < nunique <= max(len(values) // 2, 2):
+            dims.append((nunique, col))
+    dims.sort(reverse=True)
+    for role in ('entity', 'category'):
+        if role not in detected and dims:
+            detected[role] = dims.pop(0)[1]
+    return detected
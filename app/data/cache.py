@@ -0,0 +1,315 @@
+# data/cache.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from plotly.basedatatypes import BaseFigure
+
+from config import config
+
+
+def _atomic_write(path: Path, write: Callable[[Any], Any]) -> None:
+    """Запись во временный файл + rename: параллельные воркеры не увидят недописанный файл"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(fh)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _touch(path: Path) -> None:
+    """Отметка использования файла: вытеснение идёт по mtime"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _evict_lru_files(files: Iterable[Path], max_bytes: int, keep: Optional[Path] = None) -> None:
+    """Удаляет давно не использованные файлы (по mtime), пока их суммарный размер больше max_bytes"""
+    entries = []
+    for path in files:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            # Файл занят другим процессом (на Windows — открытый memory map) — удалим в следующий раз
+            continue
+        total -= size
+
+
+class DatasetCache:
+    """Персистентный кэш нормализованных датасетов в формате Arrow IPC.
+
+    Ключ — хэш содержимого загруженного файла плюс сопоставление колонок.
+    Повторное открытие (в том числе после рестарта или из другой сессии/воркера)
+    не парсит исходник заново. Файлы сверх DATASET_CACHE_MAX_MB удаляются
+    при записи, начиная с давно не открывавшихся.
+    """
+
+    HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, cache_dir: Optional[str] = None, max_mb: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or config.DATASET_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = (max_mb or config.DATASET_CACHE_MAX_MB) * 1024 * 1024
+
+    @staticmethod
+    def content_hash(uploaded_file: Any) -> str:
+        """SHA-256 содержимого файла, читается блоками"""
+        digest = hashlib.sha256()
+        uploaded_file.seek(0)
+        for block in iter(lambda: uploaded_file.read(DatasetCache.HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+        uploaded_file.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(content_hash: str, mapping: Dict[str, str]) -> str:
+        mapping_json = json.dumps(mapping, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(f"{content_hash}:{mapping_json}".encode()).hexdigest()[:32]
+
+    def get(self, content_hash: str, mapping: Dict[str, str]) -> Optional[pd.DataFrame]:
+        return self._read(self._dataset_path(content_hash, mapping))
+
+    def get_raw(self, content_hash: str) -> Optional[pd.DataFrame]:
+        """Результат парсинга исходного файла до сопоставления колонок (Excel разбирается один раз)"""
+        return self._read(self._raw_path(content_hash))
+
+    def put_raw(self, content_hash: str, df: pd.DataFrame) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        path = self._raw_path(content_hash)
+        _atomic_write(path, lambda fh: self._write_ipc(fh, table))
+        self._evict(keep=path)
+
+    def _read(self, path: Path) -> Optional[pd.DataFrame]:
+        """Файл открывается через memory map, но to_pandas копирует колонки в память процесса:
+        возвращаемый фрейм — обычный pandas. Без копии файл читают внешние движки (см. path)"""
+        if not path.exists():
+            return None
+        try:
+            with pa.memory_map(str(path), "r") as source:
+                table = pa.ipc.open_file(source).read_all()
+            df = table.to_pandas(split_blocks=True)
+        except (pa.ArrowInvalid, OSError):
+            # Битый файл (например, оборванная запись) — считаем промахом
+            return None
+        _touch(path)
+        return df
+
+    def path(self, content_hash: str, mapping: Dict[str, str]) -> Optional[Path]:
+        """Файл Arrow IPC с датасетом — для внешних движков запросов; None, если не закэширован"""
+        path = self._dataset_path(content_hash, mapping)
+        if not path.exists():
+            return None
+        _touch(path)
+        return path
+
+    def put(self, content_hash: str, mapping: Dict[str, str], df: pd.DataFrame) -> None:
+        table = self._to_arrow(df)
+        path = self._dataset_path(content_hash, mapping)
+        _atomic_write(path, lambda fh: self._write_ipc(fh, table))
+        _atomic_write(
+            self._mapping_path(content_hash),
+            lambda fh: fh.write(json.dumps(mapping, ensure_ascii=False).encode("utf-8"))
+        )
+        self._evict(keep=path)
+
+    def last_mapping(self, content_hash: str) -> Optional[Dict[str, str]]:
+        """Последнее сопоставление колонок, с которым файл был закэширован"""
+        path = self._mapping_path(content_hash)
+        if not path.exists():
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    # ====================== ВНУТРЕННИЕ МЕТОДЫ ======================
+    def _dataset_path(self, content_hash: str, mapping: Dict[str, str]) -> Path:
+        return self.cache_dir / f"{self.make_key(content_hash, mapping)}.arrow"
+
+    def _raw_path(self, content_hash: str) -> Path:
+        return self.cache_dir / f"{content_hash}.raw.arrow"
+
+    def _mapping_path(self, content_hash: str) -> Path:
+        return self.cache_dir / f"{content_hash}.mapping.json"
+
+    def _evict(self, keep: Path) -> None:
+        # Только что записанный файл не удаляется, даже если один превышает лимит
+        _evict_lru_files(self.cache_dir.glob("*.arrow"), self.max_bytes, keep=keep)
+
+    @staticmethod
+    def _to_arrow(df: pd.DataFrame) -> pa.Table:
+        """pandas → Arrow; у категорий с пропусками коды -1 под маской заменяются на 0:
+        pyarrow так пишет валидный файл, но Polars отвергает отрицательные ключи словаря"""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        for i, name in enumerate(table.column_names):
+            series = df[name]
+            if not isinstance(series.dtype, pd.CategoricalDtype) or not series.hasnans:
+                continue
+            field = table.field(i)
+            codes = series.cat.codes.to_numpy()
+            missing = codes < 0
+            column = pa.DictionaryArray.from_arrays(
+                pa.array(np.where(missing, 0, codes), type=field.type.index_type, mask=missing),
+                pa.array(series.cat.categories, type=field.type.value_type),
+                ordered=series.cat.ordered,
+            )
+            table = table.set_column(i, field, column)
+        return table
+
+    @staticmethod
+    def _write_ipc(fh: Any, table: pa.Table) -> None:
+        with pa.ipc.new_file(fh, table.schema) as writer:
+            writer.write_table(table)
+
+
+class ForecastStateStore:
+    """Персистентные состояния прогнозных моделей (параметры + финальные level/trend/season).
+
+    Одна запись на scope — уровень рядов плюс всё, что меняет сами ряды
+    (маппинг колонок, выбранные объекты/категории). Внутри — строка на ряд
+    с датой последнего учтённого наблюдения, по которой движок решает,
+    дообучать ли состояние на новых днях или переобучать заново.
+    Файлы сверх FORECAST_CACHE_MAX_MB удаляются при записи, начиная с давно не читавшихся.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_mb: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or config.FORECAST_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = (max_mb or config.FORECAST_CACHE_MAX_MB) * 1024 * 1024
+
+    @staticmethod
+    def make_scope(*parts: Any) -> str:
+        payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def load(self, scope: str) -> Optional[pd.DataFrame]:
+        path = self._path(scope)
+        if not path.exists():
+            return None
+        try:
+            state = pd.read_pickle(path)
+        except Exception:
+            # Несовместимый или битый файл — просто обучаемся заново
+            return None
+        _touch(path)
+        return state
+
+    def save(self, scope: str, state: pd.DataFrame) -> None:
+        path = self._path(scope)
+        _atomic_write(path, lambda fh: state.to_pickle(fh))
+        _evict_lru_files(self.cache_dir.glob("*.pkl"), self.max_bytes, keep=path)
+
+    def _path(self, scope: str) -> Path:
+        return self.cache_dir / f"{scope}.pkl"
+
+
+class FilterResultCache:
+    """In-memory LRU-кэш результатов фильтрации и базовых метрик.
+
+    Ключ — хэш датасета и фильтрующей части filter_state. Вытеснение по LRU
+    с ограничением числа записей и суммарного объёма (FILTER_CACHE_MAX_*).
+    Один экземпляр на процесс (st.cache_resource), поэтому доступ под локом.
+    """
+
+    def __init__(self, max_mb: Optional[int] = None, max_entries: Optional[int] = None):
+        self.max_bytes = (max_mb or config.FILTER_CACHE_MAX_MB) * 1024 * 1024
+        self.max_entries = max_entries or config.FILTER_CACHE_MAX_ENTRIES
+        self._entries: OrderedDict[str, Tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(dataset_key: str, filter_key: str) -> str:
+        return hashlib.sha1(f"{dataset_key}:{filter_key}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any) -> None:
+        size = self._estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "size_mb": round(self._bytes / 1024 / 1024, 1),
+            }
+
+    @classmethod
+    def _estimate_size(cls, value: Any) -> int:
+        # deep=True: словари category и строки object/str тоже занимают память записи
+        if isinstance(value, pd.DataFrame):
+            return int(value.memory_usage(index=True, deep=True).sum())
+        if isinstance(value, pd.Series):
+            return int(value.memory_usage(index=True, deep=True))
+        if hasattr(value, 'nbytes'):  # np.ndarray и объекты с собственной оценкой (ABCClassifier)
+            return int(value.nbytes)
+        if isinstance(value, (str, bytes)):
+            return len(value)
+        if isinstance(value, BaseFigure):
+            return cls._estimate_size(value.to_plotly_json())
+        if isinstance(value, dict):
+            return sum(cls._estimate_size(v) for v in value.values())
+        if isinstance(value, (list, tuple)):
+            return sum(cls._estimate_size(v) for v in value)
+        return 64
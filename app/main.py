@@ -1,11 +1,31 @@
 import streamlit as st
 import pandas as pd
+from typing import Any, Dict, Optional, Tuple
+
+from config import config
 from core.data_loader import DataLoader
 from core.analytics_engine import AnalyticsEngine
+from core.data_index import DatasetIndex
+from core.rollups import TimeRollups
+from core.query_backend import QueryBackend, create_backend
+from data.cache import FilterResultCache
 from ui.components.column_mapper import ColumnMapper
 from ui.components.filter_manager import FilterManager
 from ui.tabs.tab_manager import TabManager
 
+
+@st.cache_resource
+def get_filter_cache() -> FilterResultCache:
+    """Один LRU-кэш фильтров на процесс — общий для всех сессий"""
+    return FilterResultCache()
+
+
+@st.cache_resource(max_entries=4)
+def get_query_backend(path: str, name: str) -> Optional[QueryBackend]:
+    """Движок запросов над Arrow-файлом датасета; None — считаем в pandas"""
+    return create_backend(name, path)
+
+
 # === DARK MODE ===
 if "theme" not in st.session_state:
     st.session_state.theme = "light"
@@ -26,32 +46,108 @@ st.markdown(f"""
 st.title("📊 Universal Analytics Dashboard 2026")
 st.caption("Загружай любые данные — дашборд сам всё разберёт")
 
-uploaded = st.sidebar.file_uploader("CSV / Excel", type=["csv", "xlsx", "xls"])
+uploaded = st.sidebar.file_uploader("CSV / Excel / Parquet / Feather", type=config.SUPPORTED_FILE_TYPES)
 
 loader = DataLoader()
-raw_df = loader.load(uploaded, use_test_data=uploaded is None)
-
-if not raw_df.empty:
-    if "column_mapping" not in st.session_state or st.sidebar.button("🔄 Пересопоставить колонки"):
-        mapping = ColumnMapper.render(raw_df)
-        if mapping:
-            st.session_state.column_mapping = mapping
-            st.session_state.df = ColumnMapper.apply(raw_df, mapping)
-            st.success("✅ Колонки сопоставлены!")
-            st.rerun()
-
-    if "df" in st.session_state:
-        df = st.session_state.df
-        filter_manager = FilterManager()
-        filter_state = filter_manager.render_sidebar(df)
-        filtered_df = filter_manager.apply(df, filter_state)
+dataset_id = loader.dataset_id(uploaded)
+
+
+def dataset_backend(mapping: Optional[Dict[str, str]]) -> Optional[QueryBackend]:
+    """Внешний движок над Arrow-файлом датасета, если файл есть в дисковом кэше и движок выбран"""
+    path = loader.cache.path(dataset_id, mapping) if mapping else None
+    return get_query_backend(str(path), config.QUERY_BACKEND) if path is not None else None
 
-        engine = AnalyticsEngine()
-        metrics = engine.calculate_all_metrics(filtered_df, filter_state)
 
-        tab_manager = TabManager()
-        tab_manager.render_all(filtered_df, metrics, filter_state)
+# Новый файл — сбрасываем маппинг; если файл уже встречался, берём готовый фрейм из дискового кэша.
+# При внешнем движке строки остаются в файле — в сессию кладётся только маппинг
+if st.session_state.get("dataset_id") != dataset_id:
+    for key in ("column_mapping", "df", "data_index", "time_rollups", "query_backend"):
+        st.session_state.pop(key, None)
+    st.session_state.dataset_id = dataset_id
+    last_mapping = loader.cache.last_mapping(dataset_id) if uploaded is not None else None
+    if last_mapping and dataset_backend(last_mapping) is not None:
+        st.session_state.column_mapping = last_mapping
     else:
-        st.info("Назначь роли колонкам в сайдбаре ↑")
+        cached = loader.load_cached(uploaded)
+        if cached is not None:
+            st.session_state.column_mapping, st.session_state.df = cached
+
+if "column_mapping" not in st.session_state or st.sidebar.button("🔄 Пересопоставить колонки"):
+    raw_df = loader.load(uploaded, use_test_data=uploaded is None)
+    if raw_df.empty:
+        st.warning("Загрузи файл или используй демо-данные")
+        st.stop()
+
+    mapping = ColumnMapper.render(raw_df)
+    if mapping:
+        st.session_state.column_mapping = mapping
+        st.session_state.df = loader.load_mapped(uploaded, mapping, raw_df)
+        for key in ("data_index", "time_rollups", "query_backend"):
+            st.session_state.pop(key, None)
+        # Фрейм уже записан в дисковый кэш — дальше с ним работает движок, полная копия в сессии не нужна
+        if dataset_backend(mapping) is not None:
+            st.session_state.pop("df")
+        st.success("✅ Колонки сопоставлены!")
+        st.rerun()
+
+backend = dataset_backend(st.session_state.get("column_mapping"))
+
+if backend is not None or "df" in st.session_state:
+    if backend is not None:
+        # Строки в движке: в pandas — пустая схема со словарями измерений для сайдбара,
+        # часовые суммы для роллапов, куб и выборка строк по фильтру
+        st.session_state.query_backend = backend
+        df = backend.sample({}, 0)
+        data_index = None
+        if "time_rollups" not in st.session_state and {"date", "value"} <= set(backend.columns):
+            st.session_state.time_rollups = TimeRollups(backend.hourly_totals())
+    else:
+        st.session_state.pop("query_backend", None)
+        df = st.session_state.df
+        # Индекс (границы дат, коды измерений) строится один раз на датасет
+        if "data_index" not in st.session_state:
+            st.session_state.data_index = DatasetIndex(df)
+        data_index = st.session_state.data_index
+        # Суммы по часам/дням/неделям/месяцам × измерения — для графиков, тоже один раз на датасет
+        if "time_rollups" not in st.session_state and {"date", "value"} <= set(df.columns):
+            st.session_state.time_rollups = TimeRollups(df)
+
+    filter_manager = FilterManager()
+    date_bounds = backend.date_bounds() if backend is not None and "date" in backend.columns else None
+    filter_state = filter_manager.render_sidebar(df, data_index, date_bounds)
+
+    # Фильтрация и агрегаты берутся из LRU-кэша по (датасет, фильтры);
+    # слайдеры сценариев дают лишь дешёвый apply_scenarios поверх готовой базы
+    engine = AnalyticsEngine()
+    filter_cache = get_filter_cache()
+    cache_key = FilterManager.result_key(filter_state)
+
+    def compute_base() -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        if backend is not None:
+            # Метрики — по кубу движка; вкладкам со строками достаётся выборка не больше QUERY_DETAIL_ROWS
+            detail = backend.sample(filter_state, config.QUERY_DETAIL_ROWS)
+            return detail, engine.calculate_base_metrics(detail, filter_state, backend.cube(filter_state))
+        filtered = filter_manager.apply(df, filter_state, data_index)
+        # Подмножество строк копируется: срез, положенный в общий кэш, держал бы живым
+        # весь исходный фрейм и после вытеснения датасета, а его объём в бюджет не попадал бы
+        if len(filtered) < len(df):
+            filtered = filtered.copy()
+        return filtered, engine.calculate_base_metrics(filtered, filter_state)
+
+    filtered_df, base_metrics = filter_cache.get_or_compute(cache_key, compute_base)
+    metrics = engine.apply_scenarios(base_metrics, filter_state)
+
+    cache_stats = filter_cache.stats()
+    st.sidebar.caption(
+        f"Кэш фильтров: {cache_stats['hits']} попаданий / {cache_stats['misses']} промахов, "
+        f"{cache_stats['entries']} записей, {cache_stats['size_mb']} MB"
+    )
+    if backend is not None and len(filtered_df) < metrics.get('n_rows', 0):
+        st.caption(f"Метрики и графики — по всем {metrics['n_rows']:,} строкам; таблицы и построчные "
+                   f"аномалии — по выборке из {len(filtered_df):,} строк ({backend.name})")
+
+    tab_manager = TabManager()
+    # Поверхностная копия: вкладки дописывают колонки, а фрейм из кэша общий для сессий
+    tab_manager.render_all(filtered_df.copy(deep=False), metrics, filter_state)
 else:
-    st.warning("Загрузи файл или используй демо-данные")
\ No newline at end of file
+    st.info("Назначь роли колонкам в сайдбаре ↑")
\ No newline at end of file
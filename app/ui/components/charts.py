@@ -0,0 +1,209 @@
+# app/ui/components/charts.py
+"""Прореживание данных на сервере перед отправкой в Plotly.
+
+Браузер получает не больше CHART_POINT_BUDGET точек на трассу: линии
+прореживаются LTTB или min-max по корзинам (сохраняют форму и пики),
+облака точек — биннингом плотности. Отмеченные точки (аномалии) не прореживаются.
+Детализация при приближении — через range_control: выбранный диапазон
+заново прореживается из полных данных. Трассы крупнее CHART_WEBGL_THRESHOLD
+рисуются через Scattergl, готовые фигуры кэшируются (cached_figure).
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+
+import numpy as np
+import numpy.typing as npt
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from numba import njit
+
+from config import config
+from data.cache import FilterResultCache
+
+
+@st.cache_resource
+def get_figure_cache() -> FilterResultCache:
+    """Кэш готовых фигур на процесс — общий для всех сессий"""
+    return FilterResultCache(max_mb=config.FIGURE_CACHE_MAX_MB, max_entries=config.FIGURE_CACHE_MAX_ENTRIES)
+
+
+def cached_figure(result_key: str, chart: str, params: Dict[str, Any], build: Callable[[], go.Figure]) -> go.Figure:
+    """Фигура из кэша по (датасет + фильтры, имя графика, параметры); build вызывается только при промахе.
+
+    result_key — FilterManager.result_key(filter_state): он уже включает id датасета и хэш фильтров.
+    """
+    params_key = json.dumps(params, sort_keys=True, default=str, ensure_ascii=False)
+    key = FilterResultCache.make_key(result_key, f"{chart}:{params_key}")
+    return get_figure_cache().get_or_compute(key, build)
+
+
+def scatter_type(n_points: int) -> Union[Type[go.Scatter], Type[go.Scattergl]]:
+    """go.Scattergl для крупных трасс (WebGL), go.Scatter (SVG) — для мелких"""
+    return go.Scattergl if n_points > config.CHART_WEBGL_THRESHOLD else go.Scatter
+
+
+def _as_float(x: npt.ArrayLike) -> np.ndarray:
+    """Ось X в числах: даты → наносекунды"""
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    if not np.issubdtype(x.dtype, np.number):
+        return np.arange(len(x), dtype=np.float64)  # категориальная ось — по позициям
+    return x.astype(np.float64)
+
+
+@njit(cache=True)
+def _lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: индексы n_out точек, сохраняющих форму ряда"""
+    n = len(x)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[n_out - 1] = n - 1
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        # Среднее следующей корзины — третья вершина треугольника
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = 0.0
+        avg_y = 0.0
+        for j in range(next_start, next_end):
+            avg_x += x[j]
+            avg_y += y[j]
+        count = max(next_end - next_start, 1)
+        avg_x /= count
+        avg_y /= count
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best_area = area
+                best = j
+        out[i + 1] = best
+        a = best
+    return out
+
+
+@njit(cache=True)
+def _minmax(y: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Индексы минимума и максимума в каждой из n_buckets равных корзин"""
+    n = len(y)
+    out = np.empty(2 * n_buckets, dtype=np.int64)
+    k = 0
+    for b in range(n_buckets):
+        start = b * n // n_buckets
+        end = (b + 1) * n // n_buckets
+        if end <= start:
+            continue
+        lo = start
+        hi = start
+        for j in range(start + 1, end):
+            if y[j] < y[lo]:
+                lo = j
+            if y[j] > y[hi]:
+                hi = j
+        out[k] = min(lo, hi)
+        k += 1
+        if hi != lo:
+            out[k] = max(lo, hi)
+            k += 1
+    return out[:k]
+
+
+def downsample_line(x: npt.ArrayLike, y: npt.ArrayLike, budget: Optional[int] = None, method: str = 'lttb') -> np.ndarray:
+    """Индексы точек линии в пределах бюджета (x отсортирован по возрастанию).
+
+    method='lttb' — визуально точная форма, 'minmax' — гарантированно сохраняет экстремумы.
+    """
+    budget = budget or config.CHART_POINT_BUDGET
+    values: np.ndarray = np.asarray(y, dtype=np.float64)
+    if len(values) <= budget or budget < 3:
+        return np.arange(len(values))
+    values = np.nan_to_num(values)
+    if method == 'minmax':
+        return _minmax(values, budget // 2)
+    return _lttb(_as_float(x), values, budget)
+
+
+def density_bins(x: npt.ArrayLike, y: npt.ArrayLike, budget: Optional[int] = None) -> pd.DataFrame:
+    """Облако точек → центры непустых ячеек сетки ~budget ячеек с числом точек в каждой"""
+    budget = budget or config.CHART_POINT_BUDGET
+    xf, yf = _as_float(x), np.asarray(y, dtype=np.float64)
+    side = max(int(np.sqrt(budget)), 1)
+
+    x_edges = np.linspace(np.nanmin(xf), np.nanmax(xf), side + 1)
+    y_edges = np.linspace(np.nanmin(yf), np.nanmax(yf), side + 1)
+    xi = np.clip(np.searchsorted(x_edges, xf, side='right') - 1, 0, side - 1)
+    yi = np.clip(np.searchsorted(y_edges, yf, side='right') - 1, 0, side - 1)
+
+    cell = xi * side + yi
+    counts = np.bincount(cell, minlength=side * side)
+    # Координата ячейки — среднее попавших точек, а не геометрический центр
+    sum_x = np.bincount(cell, weights=xf, minlength=side * side)
+    sum_y = np.bincount(cell, weights=yf, minlength=side * side)
+    filled = counts > 0
+
+    bins = pd.DataFrame({
+        'x': sum_x[filled] / counts[filled],
+        'y': sum_y[filled] / counts[filled],
+        'count': counts[filled],
+    })
+    if np.issubdtype(np.asarray(x).dtype, np.datetime64):
+        bins['x'] = pd.to_datetime(bins['x'].round().astype(np.int64))
+    return bins
+
+
+def line_trace(x: npt.ArrayLike, y: npt.ArrayLike, budget: Optional[int] = None, method: str = 'lttb',
+               **kwargs: Any) -> go.Scatter:
+    """Линия по прореженным точкам (Scattergl, если точек много)"""
+    x, y = np.asarray(x), np.asarray(y)
+    idx = downsample_line(x, y, budget, method)
+    return scatter_type(len(idx))(x=x[idx], y=y[idx], **kwargs)
+
+
+def scatter_traces(x: npt.ArrayLike, y: npt.ArrayLike, flags: Optional[np.ndarray] = None, budget: Optional[int] = None,
+                   name: str = 'Точки', flagged_name: str = 'Аномалии') -> List[go.Scatter]:
+    """Облако точек: обычные — биннингом плотности, отмеченные flags — как есть.
+
+    Если отмеченных больше бюджета, они тоже биннингуются, но отдельной трассой.
+    """
+    budget = budget or config.CHART_POINT_BUDGET
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    flags = np.zeros(len(y), dtype=bool) if flags is None else np.asarray(flags, dtype=bool)
+
+    traces = []
+    normal_x, normal_y = x[~flags], y[~flags]
+    if len(normal_y) > budget:
+        bins = density_bins(normal_x, normal_y, budget)
+        traces.append(scatter_type(len(bins))(
+            x=bins['x'], y=bins['y'], mode='markers', name=f"{name} (плотность)",
+            customdata=bins['count'], hovertemplate='%{x}<br>%{y:,.0f}<br>точек: %{customdata}<extra></extra>',
+            marker=dict(color=np.log1p(bins['count']), colorscale='Blues', size=6, showscale=False),
+        ))
+    elif len(normal_y):
+        traces.append(scatter_type(len(normal_y))(x=normal_x, y=normal_y, mode='markers', name=name,
+                                                  marker=dict(color='blue', size=6)))
+
+    flag_x, flag_y = x[flags], y[flags]
+    if len(flag_y) > budget:
+        bins = density_bins(flag_x, flag_y, budget)
+        flag_x, flag_y = bins['x'], bins['y']
+    if len(flag_y):
+        traces.append(scatter_type(len(flag_y))(x=flag_x, y=flag_y, mode='markers', name=flagged_name,
+                                                marker=dict(color='red', size=10, symbol='x')))
+    return traces
+
+
+def range_control(dates: pd.Series, key: str) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """Диапазон дат для детализации: при сужении точки берутся из полных данных заново"""
+    start, end = dates.min(), dates.max()
+    if pd.isna(start) or start == end:
+        return start, end
+    lo, hi = st.slider("Диапазон графика", min_value=start.to_pydatetime(), max_value=end.to_pydatetime(),
+                       value=(start.to_pydatetime(), end.to_pydatetime()), format="DD.MM.YYYY", key=key)
+    return pd.Timestamp(lo), pd.Timestamp(hi)
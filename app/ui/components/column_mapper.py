@@ -1,6 +1,11 @@
 import streamlit as st
 import pandas as pd
-from typing import Dict, Optional
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from config import config
+from core import schema_profiler
+from core.rollups import CALENDAR_COLS, calendar_features
 
 class ColumnMapper:
     """Универсальный маппер колонок — работает с ЛЮБЫМИ данными"""
@@ -12,6 +17,8 @@ class ColumnMapper:
         "category": "📦 Уровень 2 (категория / товар / тип…)",
     }
 
+    DIMENSION_COLS = ("entity", "category")
+
     @staticmethod
     def render(df: pd.DataFrame) -> Optional[Dict[str, str]]:
         if df.empty:
@@ -54,67 +61,139 @@ class ColumnMapper:
             st.sidebar.error("Обязательно выберите **Дата** и **Основная метрика**")
             return None
 
+        date_format = schema_profiler.sniff_date_format(df[mapping["date"]])
+        if date_format:
+            st.sidebar.caption(f"Формат даты: `{date_format}`")
+
         # Дополнительные фильтры (опционально)
         used_cols = set(mapping.values())
         extra_cols = [c for c in df.columns if c not in used_cols]
         if extra_cols:
-            st.sidebar.multiselect(
+            extra = st.sidebar.multiselect(
                 "Дополнительные фильтры",
                 extra_cols,
                 default=extra_cols[:min(4, len(extra_cols))],
                 key="extra_filters"
             )
+            # Дополнительные колонки входят в маппинг: загрузчик читает из файла только колонки маппинга
+            mapping.update(ColumnMapper.extra_mapping(extra))
 
         return mapping
 
     @staticmethod
-    def apply(df: pd.DataFrame, mapping: Dict[str, str]) -> pd.DataFrame:
+    def extra_mapping(extra_cols: List[str]) -> Dict[str, str]:
+        """Имя после переименования → исходная колонка для дополнительных фильтров.
+
+        Колонка, названная как роль или календарный код ('value', 'cal_day'…),
+        получает суффикс '_доп', чтобы не заменить роль и не дать дубль после rename.
+        """
+        reserved = set(ColumnMapper.ROLES) | set(CALENDAR_COLS)
+        taken = reserved | set(extra_cols)
+        result = {}
+        for col in extra_cols:
+            name = col
+            if col in reserved:
+                name, n = f"{col}_доп", 2
+                while name in taken:
+                    name, n = f"{col}_доп{n}", n + 1
+                taken.add(name)
+            result[name] = col
+        return result
+
+    @staticmethod
+    def source_columns(mapping: Dict[str, str]) -> List[str]:
+        """Колонки исходного файла, которые нужно прочитать при данном маппинге"""
+        return list(dict.fromkeys(mapping.values()))
+
+    @staticmethod
+    def apply(df: pd.DataFrame, mapping: Dict[str, str], formats: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """formats — форматы даты и чисел (schema_profiler.sniff_formats); без них угадываются по выборке df"""
         df = df.copy()
         rename_map = {v: k for k, v in mapping.items()}
         df = df.rename(columns=rename_map)
+        if formats is None:
+            formats = schema_profiler.sniff_formats(df)
 
+        # Явный формат — векторный разбор вместо поэлементного угадывания
         if "date" in df.columns:
-            df["date"] = pd.to_datetime(df["date"], errors="coerce")
+            df["date"] = schema_profiler.parse_dates(df["date"], formats.get("date"))
 
         if "value" in df.columns:
-            df["value"] = pd.to_numeric(df["value"], errors="coerce").fillna(0)
+            df["value"] = schema_profiler.parse_numbers(df["value"], formats.get("value")).fillna(0)
 
         # Убираем строки без ключевых колонок
         key_cols = [c for c in ["date", "value"] if c in df.columns]
         if key_cols:
             df = df.dropna(subset=key_cols)
 
-        return df.reset_index(drop=True)
+        # Компактные типы: измерения — category со стабильным словарём, value — float32, если точность позволяет
+        for col in ColumnMapper.DIMENSION_COLS:
+            if col in df.columns:
+                df[col] = ColumnMapper._encode_dimension(df[col])
+
+        if "value" in df.columns:
+            df["value"] = ColumnMapper._narrow_value(df["value"])
+
+        # Дополнительные колонки сужаются здесь же — одинаково при загрузке целиком и по чанкам
+        for col in df.columns:
+            if col not in ColumnMapper.ROLES:
+                df[col] = ColumnMapper._narrow_extra(df[col])
+
+        # Сортировка по дате: фильтр по диапазону становится срезом (см. DatasetIndex)
+        if "date" in df.columns:
+            df = df.sort_values("date", kind="stable")
+        df = df.reset_index(drop=True)
+
+        # Календарные коды (день, неделя, месяц, день недели, час) — один раз здесь,
+        # вкладки группируют по ним без .dt-аксессоров на каждом перезапуске
+        if "date" in df.columns:
+            for name, codes in calendar_features(df["date"]).items():
+                df[name] = codes
+        return df
+
+    @staticmethod
+    def _encode_dimension(series: pd.Series) -> pd.Series:
+        """Строковое измерение → category с отсортированным словарём без неиспользуемых значений"""
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype("category")
+        series = series.cat.remove_unused_categories()
+        try:
+            categories = series.cat.categories.sort_values()
+        except TypeError:
+            # Смешанные типы в колонке не сортируются — оставляем порядок появления
+            return series
+        return series.cat.reorder_categories(categories)
+
+    @staticmethod
+    def _narrow_value(series: pd.Series) -> pd.Series:
+        """float64 → float32, если погрешность не превышает VALUE_FLOAT32_ATOL (полкопейки)"""
+        if series.dtype != np.float64:
+            return series
+        values = series.to_numpy()
+        narrowed = values.astype(np.float32)
+        if np.allclose(narrowed, values, rtol=0, atol=config.VALUE_FLOAT32_ATOL):
+            return pd.Series(narrowed, index=series.index, name=series.name)
+        return series
+
+    @staticmethod
+    def _narrow_extra(series: pd.Series) -> pd.Series:
+        """Дополнительная колонка: целые — меньшей разрядности, дробные — float32 без потери значений,
+        строки — category со стабильным словарём"""
+        if pd.api.types.is_bool_dtype(series.dtype):
+            return series
+        if pd.api.types.is_integer_dtype(series.dtype):
+            return pd.to_numeric(series, downcast="integer")
+        if pd.api.types.is_float_dtype(series.dtype):
+            values = series.to_numpy(dtype=np.float64)
+            narrowed = values.astype(np.float32)
+            if np.array_equal(narrowed, values, equal_nan=True):
+                return pd.Series(narrowed, index=series.index, name=series.name)
+            return series
+        if pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+            return ColumnMapper._encode_dimension(series)
+        return series
 
     @staticmethod
     def _auto_detect(df: pd.DataFrame) -> Dict[str, str]:
-        """Автоматически угадывает колонки по типичным именам"""
-        lower_cols = {col.lower().strip(): col for col in df.columns}
-        detected = {}
-
-        date_patterns = ['date', 'time', 'day', 'order_date', 'transaction_date', 'дата']
-        value_patterns = ['amount', 'value', 'loss', 'revenue', 'sales', 'cost', 'qty', 'quantity', 'сумма', 'потери']
-        entity_patterns = ['store', 'shop', 'region', 'client', 'customer', 'id', 'sku', 'магазин']
-        cat_patterns = ['category', 'group', 'product', 'type', 'item', 'категория', 'товар']
-
-        for pattern in date_patterns:
-            if pattern in lower_cols:
-                detected["date"] = lower_cols[pattern]
-                break
-
-        for pattern in value_patterns:
-            if pattern in lower_cols:
-                detected["value"] = lower_cols[pattern]
-                break
-
-        for pattern in entity_patterns:
-            if pattern in lower_cols:
-                detected["entity"] = lower_cols[pattern]
-                break
-
-        for pattern in cat_patterns:
-            if pattern in lower_cols:
-                detected["category"] = lower_cols[pattern]
-                break
-
-        return detected
\ No newline at end of file
+        """Угадывает роли по именам колонок, а недостающие — по типам и статистике выборки"""
+        return schema_profiler.infer_roles(df)
\ No newline at end of file
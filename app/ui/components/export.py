@@ -1,53 +1,261 @@
 # app/ui/components/export.py
+import gzip
+import os
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
 import pandas as pd
-import io
+import pyarrow as pa
+import pyarrow.parquet as pq
 import streamlit as st
-from datetime import datetime
+import xlsxwriter
+
+from config import config
+from core.abc_xyz import PeriodAggregates
+from core.rollups import CALENDAR_COLS
+
+# Строки отчёта: фрейм в памяти или функция size → пачки строк внешнего движка
+RowSource = Union[pd.DataFrame, Callable[[int], Iterable[pd.DataFrame]]]
+
+
+@st.cache_resource
+def get_export_executor() -> ThreadPoolExecutor:
+    """Фоновые сборки отчётов — общий пул на процесс"""
+    return ThreadPoolExecutor(max_workers=config.EXPORT_MAX_WORKERS, thread_name_prefix="export")
+
 
 class ExportManager:
+    """Экспорт отчёта: сборка во временный файл в фоне, поток строк без копии всего отчёта в памяти"""
+
+    EXCEL_MAX_ROWS = 1_048_576  # предел строк листа Excel, включая заголовок
+    TMP_PREFIX = 'retailloss_report_'
+
+    FORMATS = {
+        'xlsx': ("Excel (.xlsx)", 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+        'csv.gz': ("CSV, gzip (.csv.gz)", 'application/gzip'),
+        'parquet': ("Parquet (.parquet)", 'application/vnd.apache.parquet'),
+    }
+
+    @staticmethod
+    def metric_tables(metrics: Dict[str, Any]) -> Dict[str, pd.DataFrame]:
+        """Листы с метриками для Excel-отчёта"""
+        tables = {}
+        for key, sheet in (('category_losses', 'По категориям'), ('entity_losses', 'По объектам'),
+                           ('abc_xyz', 'ABC-XYZ')):
+            table = metrics.get(key, pd.DataFrame())
+            if 'cv' in table.columns:
+                # CV не определён (нулевое среднее) — подпись вместо пустой ячейки
+                table = table.assign(cv=table['cv'].astype(object).where(table['cv'].notna(), PeriodAggregates.NO_DATA))
+            if not table.empty:
+                tables[sheet] = table
+
+        scenarios = metrics.get('scenarios', {})
+        tables['What-if'] = pd.DataFrame({
+            'Сценарий': ['A-класс', 'Пиковые дни', 'Топ-объекты (80%)', 'Итого'],
+            'Снижение %': [scenarios.get('reduce_a', 0), scenarios.get('reduce_peak', 0),
+                           scenarios.get('reduce_top_entity', 0), None],
+            'Экономия ₽': [metrics.get('savings_a', 0), metrics.get('savings_peak', 0),
+                           metrics.get('savings_entity', 0), metrics.get('total_savings', 0)],
+        })
+        return tables
+
+    # ====================== ЗАПИСЬ ФАЙЛОВ ======================
+    @staticmethod
+    def _chunks(rows: RowSource) -> Iterator[pd.DataFrame]:
+        """Пачки строк отчёта без служебных календарных кодов; хотя бы одна, пусть пустая, — для заголовка.
+        rows — фрейм или функция size → пачки внешнего движка (QueryBackend.batches)"""
+        parts: Iterable[pd.DataFrame]
+        if isinstance(rows, pd.DataFrame):
+            parts = (rows.iloc[start:start + config.EXPORT_CHUNK_ROWS]
+                     for start in range(0, max(len(rows), 1), config.EXPORT_CHUNK_ROWS))
+        else:
+            parts = rows(config.EXPORT_CHUNK_ROWS)
+        for part in parts:
+            yield part.drop(columns=list(CALENDAR_COLS), errors='ignore')
+
+    @classmethod
+    def write_excel(cls, chunks: Iterable[pd.DataFrame], metrics: Dict[str, Any], path: str) -> None:
+        """xlsxwriter в режиме constant_memory: строки сбрасываются на диск по мере записи.
+        Данные крупнее листа Excel делятся на листы «Исходные данные», «Исходные данные (2)», ..."""
+        # nan_inf_to_errors — страховка для object-колонок; числовые NaN/inf _write_rows пишет пустыми
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True,
+                                              'tmpdir': config.EXPORT_TMP_DIR or None})
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm'})
+
+        worksheet, date_cols, row, n_sheets = None, [], 0, 0
+        for chunk in chunks:
+            start = 0
+            while worksheet is None or start < len(chunk):
+                # Новый лист — для первой пачки и когда текущий заполнен до предела Excel
+                if worksheet is None or row == cls.EXCEL_MAX_ROWS:
+                    n_sheets += 1
+                    name = 'Исходные данные' if n_sheets == 1 else f'Исходные данные ({n_sheets})'
+                    worksheet = workbook.add_worksheet(name)
+                    date_cols = cls._write_header(worksheet, chunk, date_format)
+                    row = 1
+                end = start + cls.EXCEL_MAX_ROWS - row
+                row = cls._write_rows(worksheet, chunk.iloc[start:end], date_cols, row)
+                start = end
+
+        for name, table in cls.metric_tables(metrics).items():
+            worksheet = workbook.add_worksheet(name)
+            cls._write_rows(worksheet, table, cls._write_header(worksheet, table, date_format), 1)
+        workbook.close()
+
     @staticmethod
-    def generate_excel_report(df, metrics):
-        """Генерирует Excel-отчёт из DataFrame и рассчитанных метрик."""
-        buffer = io.BytesIO()
-        
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            # Основные данные
-            df.to_excel(writer, sheet_name='Исходные данные', index=False)
-            
-            # Метрики
-            if not metrics.get('category_losses', pd.DataFrame()).empty:
-                metrics['category_losses'].to_excel(writer, sheet_name='По категориям', index=False)
-            
-            if not metrics.get('store_losses', pd.DataFrame()).empty:
-                metrics['store_losses'].to_excel(writer, sheet_name='По магазинам', index=False)
-            
-            if not metrics.get('abc_xyz', pd.DataFrame()).empty:
-                metrics['abc_xyz'].to_excel(writer, sheet_name='ABC-XYZ', index=False)
-            
-            # Сценарии What-if
-            scenarios_df = pd.DataFrame({
-                'Сценарий': ['A-класс', 'Пиковые дни', 'Топ-магазины (80%)', 'Итого'],
-                'Снижение %': [
-                    metrics.get('scenarios', {}).get('reduce_a', 0),
-                    metrics.get('scenarios', {}).get('reduce_peak', 0),
-                    metrics.get('scenarios', {}).get('reduce_top_store', 0),
-                    '-'
-                ],
-                'Экономия ₽': [
-                    metrics.get('savings_a', 0),
-                    metrics.get('savings_peak', 0),
-                    metrics.get('savings_store', 0),
-                    metrics.get('total_savings', 0)
-                ]
-            })
-            scenarios_df.to_excel(writer, sheet_name='What-if', index=False)
-        
-        buffer.seek(0)
-        
-        # Кнопка скачивания в Streamlit
+    def _write_header(worksheet: Any, df: pd.DataFrame, date_format: Any) -> List[int]:
+        """Заголовок листа; возвращает номера колонок с датами"""
+        worksheet.write_row(0, 0, [str(c) for c in df.columns])
+        date_cols = [i for i, c in enumerate(df.columns) if pd.api.types.is_datetime64_any_dtype(df[c])]
+        for i in date_cols:
+            worksheet.set_column(i, i, 18, date_format)
+        return date_cols
+
+    @staticmethod
+    def _write_rows(worksheet: Any, df: pd.DataFrame, date_cols: List[int], row: int) -> int:
+        """Строки df начиная со строки листа row; возвращает следующую свободную строку"""
+        for start in range(0, len(df), config.EXPORT_CHUNK_ROWS):
+            chunk = df.iloc[start:start + config.EXPORT_CHUNK_ROWS]
+            columns = []
+            for i, col in enumerate(chunk.columns):
+                values = chunk[col]
+                if i in date_cols:
+                    # Excel не знает часовых поясов: дата с поясом (ISO «…Z») пишется по местному времени
+                    if values.dt.tz is not None:
+                        values = values.dt.tz_localize(None)
+                    # Дата Excel — число дней от 1899-12-30; формат берётся из колонки
+                    values = (values - pd.Timestamp('1899-12-30')) / pd.Timedelta(days=1)
+                # NaN/NaT и ±inf → None (пустая ячейка): xlsxwriter не пишет их как число
+                if pd.api.types.is_float_dtype(values.dtype):
+                    keep = np.isfinite(values.to_numpy(dtype=np.float64))
+                else:
+                    keep = values.notna().to_numpy()
+                columns.append(values.astype(object).where(keep, None).tolist())
+            for values in zip(*columns, strict=True):
+                worksheet.write_row(row, 0, values)
+                row += 1
+        return row
+
+    @staticmethod
+    def write_csv_gz(chunks: Iterable[pd.DataFrame], path: str) -> None:
+        with gzip.open(path, 'wt', encoding='utf-8-sig', newline='', compresslevel=5) as fh:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(fh, index=False, header=i == 0)
+
+    @staticmethod
+    def write_parquet(chunks: Iterable[pd.DataFrame], path: str) -> None:
+        writer, schema = None, None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    schema = pa.Schema.from_pandas(chunk.iloc[:0], preserve_index=False)
+                    writer = pq.ParquetWriter(path, schema, compression='zstd')
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        finally:
+            if writer is not None:
+                writer.close()
+
+    @classmethod
+    def build(cls, rows: RowSource, metrics: Dict[str, Any], fmt: str) -> str:
+        """Собирает отчёт во временный файл и возвращает путь к нему"""
+        cls.sweep_tmp()
+        fd, path = tempfile.mkstemp(suffix=f'.{fmt}', prefix=cls.TMP_PREFIX, dir=config.EXPORT_TMP_DIR or None)
+        os.close(fd)
+        # Служебные календарные коды в отчёт не попадают — только исходные колонки
+        chunks = cls._chunks(rows)
+        try:
+            if fmt == 'xlsx':
+                cls.write_excel(chunks, metrics, path)
+            elif fmt == 'csv.gz':
+                cls.write_csv_gz(chunks, path)
+            else:
+                cls.write_parquet(chunks, path)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    @classmethod
+    def sweep_tmp(cls, max_age_min: Optional[float] = None) -> None:
+        """Удаляет отчёты старше EXPORT_TMP_MAX_AGE_MIN: файлы завершившихся сессий иначе копятся"""
+        max_age = (config.EXPORT_TMP_MAX_AGE_MIN if max_age_min is None else max_age_min) * 60
+        now = time.time()
+        for path in Path(config.EXPORT_TMP_DIR or tempfile.gettempdir()).glob(f'{cls.TMP_PREFIX}*'):
+            try:
+                if now - path.stat().st_mtime > max_age:
+                    path.unlink()
+            except OSError:
+                continue
+
+    # ====================== UI ======================
+    @classmethod
+    def render_download(cls, rows: RowSource, metrics: Dict[str, Any], result_key: str) -> None:
+        """Выбор формата, фоновая сборка и кнопка скачивания готового файла"""
+        fmt = st.radio("Формат отчёта", list(cls.FORMATS), format_func=lambda f: cls.FORMATS[f][0],
+                       horizontal=True, key='export_format')
+        if fmt != 'xlsx':
+            st.caption("CSV и Parquet содержат только исходные строки, без листов с метриками")
+        elif metrics.get('n_rows', 0) > cls.EXCEL_MAX_ROWS - 1:
+            st.caption(f"{metrics['n_rows']:,} строк — данные будут разбиты на несколько листов")
+
+        # Отчёт привязан к датасету, фильтрам и формату; сменились — собираем заново
+        job_key = f"{result_key}:{fmt}"
+        job = st.session_state.get('export_job')
+        if job is not None and job['key'] != job_key:
+            cls._discard(job)
+            job = st.session_state['export_job'] = None
+
+        if job is None:
+            if st.button("📤 Подготовить отчёт", key='export_build'):
+                st.session_state['export_job'] = {
+                    'key': job_key, 'future': get_export_executor().submit(cls.build, rows, metrics, fmt), 'fmt': fmt,
+                }
+                st.rerun()
+            return
+
+        future: Future[str] = job['future']
+        if not future.done():
+            cls._wait_for_job(future)
+            return
+        if future.exception() is not None:
+            st.error(f"Не удалось собрать отчёт: {str(future.exception())[:200]}")
+            return
+
+        path = future.result()
+        if not os.path.exists(path):
+            # Файл удалён по возрасту (sweep_tmp) — отчёт нужно собрать заново
+            st.session_state['export_job'] = None
+            st.info("Отчёт устарел — подготовьте его заново")
+            return
+        size_mb = Path(path).stat().st_size / 1024 / 1024
         st.download_button(
-            '📥 Скачать полный отчёт Excel',
-            data=buffer,
-            file_name=f'RetailLoss_Report_{datetime.now().strftime("%Y-%m-%d")}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
\ No newline at end of file
+            f'📥 Скачать отчёт ({size_mb:.1f} MB)',
+            # Файл читается только при нажатии, а не при каждом перезапуске скрипта
+            data=lambda: Path(path).read_bytes(),
+            file_name=f'RetailLoss_Report_{datetime.now().strftime("%Y-%m-%d")}.{job["fmt"]}',
+            mime=cls.FORMATS[job['fmt']][1],
+            on_click='ignore',
+            key='export_download',
+        )
+
+    @staticmethod
+    @st.fragment(run_every=1.0)
+    def _wait_for_job(future: Future[str]) -> None:
+        """Опрос фоновой сборки без перезапуска всей страницы; по готовности — полный перезапуск"""
+        if future.done():
+            st.rerun()
+        st.info("⏳ Отчёт собирается в фоне — можно продолжать работу")
+
+    @staticmethod
+    def _discard(job: Dict[str, Any]) -> None:
+        """Удаляет файл заменённого отчёта; если сборка ещё идёт — по её завершении"""
+        def remove(future: Future[str]) -> None:
+            if future.exception() is None and os.path.exists(future.result()):
+                os.remove(future.result())
+
+        job['future'].add_done_callback(remove)
\ No newline at end of file
@@ -1,12 +1,21 @@
 # app/ui/components/filter_manager.py
 
+import hashlib
+import json
+
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
+from core.data_index import DatasetIndex
+from data.cache import DatasetCache, FilterResultCache
 
 class FilterManager:
-    def __init__(self):
+    # Ключи filter_state, от которых зависит набор строк (слайдеры сценариев сюда не входят)
+    FILTER_KEYS = ('selected_entities', 'selected_categories', 'date_range')
+
+    def __init__(self) -> None:
         self.default_scenarios = {
             'reduce_a': 10.0,
             'reduce_peak': 15.0,
@@ -14,13 +23,15 @@ class FilterManager:
             'investments': 50000.0
         }
 
-    def render_sidebar(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def render_sidebar(self, df: pd.DataFrame, index: Optional[DatasetIndex] = None,
+                       date_bounds: Optional[Tuple[Any, Any]] = None) -> Dict[str, Any]:
+        """date_bounds — границы дат от внешнего движка, когда df лишь пустая схема без строк"""
         filter_state = {}
 
         st.sidebar.header("🔗 Фильтры")
 
         if 'entity' in df.columns:
-            entities = sorted(df['entity'].dropna().unique().tolist())
+            entities = self._options(df['entity'])
             selected = st.sidebar.multiselect(
                 "🏪 Уровень 1 (магазин / регион / клиент)",
                 entities,
@@ -29,7 +40,7 @@ class FilterManager:
             filter_state['selected_entities'] = selected
 
         if 'category' in df.columns:
-            cats = sorted(df['category'].dropna().unique().tolist())
+            cats = self._options(df['category'])
             selected = st.sidebar.multiselect(
                 "📦 Уровень 2 (категория / товар)",
                 cats,
@@ -38,7 +49,12 @@ class FilterManager:
             filter_state['selected_categories'] = selected
 
         if 'date' in df.columns:
-            min_d, max_d = df['date'].min(), df['date'].max()
+            if date_bounds is not None:
+                min_d, max_d = date_bounds
+            elif index is not None and index.is_sorted:
+                min_d, max_d = index.date_bounds()
+            else:
+                min_d, max_d = df['date'].min(), df['date'].max()
             date_range = st.sidebar.date_input(
                 "📅 Диапазон дат",
                 value=(min_d, max_d),
@@ -71,8 +87,38 @@ class FilterManager:
 
         return filter_state
 
-    def apply(self, df: pd.DataFrame, filter_state: Dict[str, Any]) -> pd.DataFrame:
-        filtered = df.copy()
+    def apply(self, df: pd.DataFrame, filter_state: Dict[str, Any], index: Optional[DatasetIndex] = None) -> pd.DataFrame:
+        if index is None or not index.is_sorted or index.n_rows != len(df):
+            return self._apply_masks(df, filter_state)
+
+        # Диапазон дат — срез по отсортированному фрейму, без копии и полных масок
+        rows = slice(0, len(df))
+        if 'date_range' in filter_state:
+            rows = index.date_slice(*filter_state['date_range'])
+
+        mask = None
+        for col, key in (('entity', 'selected_entities'), ('category', 'selected_categories')):
+            selected = filter_state.get(key)
+            if col not in df.columns or not selected:
+                continue
+            # Без кодов category (колонка не категориальная) — прежний путь с масками
+            if not index.has_codes(col):
+                return self._apply_masks(df, filter_state)
+            if index.is_full_selection(col, selected):
+                continue
+            col_mask = index.selection_mask(col, selected, rows)
+            mask = col_mask if mask is None else mask & col_mask
+
+        # Индекс строк не сбрасывается: reset_index копировал бы результат, а вызывающий код
+        # опирается на позиции, не на метки
+        filtered = df.iloc[rows]
+        if mask is not None:
+            filtered = filtered[mask]
+        return filtered
+
+    def _apply_masks(self, df: pd.DataFrame, filter_state: Dict[str, Any]) -> pd.DataFrame:
+        """Фильтрация полными масками — для фреймов без DatasetIndex"""
+        filtered = df
 
         if filter_state.get('selected_entities') and 'entity' in filtered.columns:
             filtered = filtered[filtered['entity'].isin(filter_state['selected_entities'])]
@@ -85,4 +131,31 @@ class FilterManager:
             mask = (filtered['date'] >= pd.Timestamp(start)) & (filtered['date'] <= pd.Timestamp(end))
             filtered = filtered[mask]
 
-        return filtered.reset_index(drop=True)
\ No newline at end of file
+        return filtered.reset_index(drop=True)
+
+    @staticmethod
+    def _options(series: pd.Series) -> List[Any]:
+        """Значения для multiselect: у category берём словарь, не сканируя строки"""
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series.cat.categories.tolist()
+        return sorted(series.dropna().unique().tolist())
+
+    @classmethod
+    def filter_key(cls, filter_state: Dict[str, Any]) -> str:
+        """Канонический хэш фильтрующей части состояния: одинаковый выбор → одинаковый ключ.
+        Выбор в multiselect — множество: порядок клика на ключ не влияет"""
+        relevant = {k: filter_state.get(k) for k in cls.FILTER_KEYS}
+        for key in ('selected_entities', 'selected_categories'):
+            values = relevant[key]
+            if values is not None:
+                relevant[key] = sorted(values, key=str)
+        payload = json.dumps(relevant, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def result_key(cls, filter_state: Dict[str, Any]) -> str:
+        """Ключ отфильтрованного набора строк текущей сессии: датасет + маппинг + фильтры"""
+        dataset_key = DatasetCache.make_key(
+            st.session_state.get('dataset_id', ''), st.session_state.get('column_mapping', {})
+        )
+        return FilterResultCache.make_key(dataset_key, cls.filter_key(filter_state))
\ No newline at end of file
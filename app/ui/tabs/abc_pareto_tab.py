@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 from typing import Dict, Any
 
+from config import config
+from core.abc_xyz import PeriodAggregates
+from ui.components.charts import cached_figure, line_trace
+from ui.components.filter_manager import FilterManager
+
 
 class ABCTab:
     """Вкладка с ABC/XYZ анализом и правилом Парето."""
@@ -18,73 +22,88 @@ class ABCTab:
             "📉 Правило Парето"
         ])
 
+        result_key = FilterManager.result_key(filter_state)
         with tab1:
-            self._render_abc_analysis(df, metrics)
+            self._render_abc_analysis(df, metrics, result_key)
         with tab2:
-            self._render_xyz_analysis(df)
+            self._render_xyz_analysis(df, metrics, result_key)
         with tab3:
-            self._render_pareto_analysis(metrics)
+            self._render_pareto_analysis(metrics, result_key)
+
+    LEVELS = {
+        ('category',): "📦 Категории",
+        ('entity',): "🏪 Объекты",
+        ('entity', 'category'): "🏪 × 📦 Объект × категория",
+    }
 
-    def _render_abc_analysis(self, df: pd.DataFrame, metrics: Dict[str, Any]):
+    def _render_abc_analysis(self, df: pd.DataFrame, metrics: Dict[str, Any], result_key: str) -> None:
         st.subheader("ABC Классификация")
 
-        abc_data = metrics.get('abc_xyz', pd.DataFrame())
-        if abc_data.empty:
+        classifier = metrics.get('abc_classifier')
+        if classifier is None:
             st.warning("Нет данных для ABC-анализа")
             return
 
         # Настройки классификации
-        col1, col2, _ = st.columns(3)
+        col1, col2, col3 = st.columns(3)
         with col1:
-            a_threshold = st.slider("Порог для класса A (%)", 70, 90, 80, 1)
+            a_threshold = st.slider("Порог для класса A (%)", 70, 90, int(config.ABC_A_THRESHOLD), 1)
         with col2:
-            b_threshold = st.slider("Порог для класса B (%)", 85, 98, 95, 1)
-
-        # Пересчёт классификации
-        abc_data = abc_data.sort_values('value', ascending=False)
-        abc_data['cumulative_percentage'] = (
-            abc_data['value'].cumsum() / abc_data['value'].sum() * 100
-        )
-
-        def assign_class(row):
-            if row['cumulative_percentage'] <= a_threshold:
-                return 'A'
-            elif row['cumulative_percentage'] <= b_threshold:
-                return 'B'
-            return 'C'
-
-        abc_data['abc_class'] = abc_data.apply(assign_class, axis=1)
-
-        # Визуализация
-        fig = go.Figure()
-
-        colors = {'A': 'red', 'B': 'orange', 'C': 'green'}
-
-        for cls in ['A', 'B', 'C']:
-            cls_data = abc_data[abc_data['abc_class'] == cls]
-            fig.add_trace(go.Bar(
-                x=cls_data.get('category', cls_data.get('entity', cls_data.index)),
-                y=cls_data['value'],
-                name=f'Класс {cls}',
-                marker_color=colors[cls],
-                text=cls_data['abc_class'],
-                textposition='auto'
-            ))
-
-        fig.update_layout(
-            title='ABC Анализ: Распределение',
-            xaxis_title='Категория / Объект',
-            yaxis_title='Значение',
-            barmode='stack',
-            height=500
-        )
-
+            b_threshold = st.slider("Порог для класса B (%)", 85, 98, int(config.ABC_B_THRESHOLD), 1)
+        with col3:
+            levels = [lvl for lvl in self.LEVELS if all(c in df.columns for c in lvl)]
+            level = st.selectbox("Уровень", levels, format_func=self.LEVELS.__getitem__) if levels else None
+
+        # Уровень движка уже посчитан в метриках; другие — из общих сумм по периодам
+        periods = metrics.get('period_aggregates')
+        if level is not None and list(level) != list(classifier.index.names) and periods is not None:
+            classifier = periods.abc(level)
+
+        # Пересчёт классификации: searchsorted по готовому накопленному проценту
+        abc_data = classifier.frame(a_threshold, b_threshold)
+        keys = list(classifier.index.names)
+
+        # Визуализация (фигура — из кэша, пока не поменялись данные, фильтры или пороги)
+        def build() -> go.Figure:
+            fig = go.Figure()
+
+            colors = {'A': 'red', 'B': 'orange', 'C': 'green'}
+            # Столбцов не больше бюджета графика: хвост класса C на диаграмме неразличим
+            shown = abc_data.head(config.CHART_POINT_BUDGET)
+            labels = shown[keys[0]].astype(str)
+            for key in keys[1:]:
+                labels = labels + ' / ' + shown[key].astype(str)
+
+            for cls in ['A', 'B', 'C']:
+                cls_data = shown[shown['abc_class'] == cls]
+                fig.add_trace(go.Bar(
+                    x=labels.loc[cls_data.index],
+                    y=cls_data['value'],
+                    name=f'Класс {cls}',
+                    marker_color=colors[cls],
+                    text=cls_data['abc_class'],
+                    textposition='auto'
+                ))
+
+            fig.update_layout(
+                title='ABC Анализ: Распределение',
+                xaxis_title=' / '.join(keys),
+                yaxis_title='Значение',
+                barmode='stack',
+                height=500
+            )
+            return fig
+
+        params = {'a': a_threshold, 'b': b_threshold, 'level': keys}
+        fig = cached_figure(result_key, 'abc', params, build)
         st.plotly_chart(fig, use_container_width=True)
+        if len(abc_data) > config.CHART_POINT_BUDGET:
+            st.caption(f"На графике первые {config.CHART_POINT_BUDGET:,} из {len(abc_data):,} позиций")
 
         # Статистика по классам
         st.subheader("Статистика по классам ABC")
 
-        first_col = abc_data.columns[0]  # обычно category или entity
+        first_col = keys[0]
         summary = abc_data.groupby('abc_class').agg({
             first_col: 'count',
             'value': ['sum', 'mean']
@@ -93,37 +112,53 @@ class ABCTab:
         summary.columns = ['Количество', 'Сумма', 'Среднее']
         st.dataframe(summary, use_container_width=True)
 
-    def _render_xyz_analysis(self, df: pd.DataFrame):
+    def _render_xyz_analysis(self, df: pd.DataFrame, metrics: Dict[str, Any], result_key: str) -> None:
         st.subheader("XYZ Анализ стабильности")
 
-        if 'date' not in df.columns or 'category' not in df.columns:
-            st.warning("Для XYZ анализа нужны колонки 'date' и 'category'")
+        periods = metrics.get('period_aggregates')
+        levels = [lvl for lvl in self.LEVELS if all(c in df.columns for c in lvl)]
+        if periods is None or 'date' not in df.columns or not levels:
+            st.warning("Для XYZ анализа нужны колонки 'date' и 'category' или 'entity'")
             return
 
-        st.info("Простая демонстрация XYZ-анализа (в продакшене — реальные расчёты)")
-
-        categories = ['Электроника', 'Одежда', 'Продукты', 'Бытовая техника', 'Косметика']
-        stability = ['Высокая', 'Средняя', 'Низкая', 'Средняя', 'Высокая']
-        cv = [8.2, 15.5, 30.1, 18.3, 9.7]
-
-        xyz_data = pd.DataFrame({
-            'category': categories,
-            'стабильность': stability,
-            'коэффициент_вариации': cv
-        })
-
-        fig = px.bar(
-            xyz_data,
-            x='category',
-            y='коэффициент_вариации',
-            color='стабильность',
-            title='Коэффициент вариации по категориям',
-            labels={'коэффициент_вариации': 'Коэффициент вариации, %'}
-        )
-
-        st.plotly_chart(fig, use_container_width=True)
-
-    def _render_pareto_analysis(self, metrics: Dict[str, Any]):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            freq = st.radio("Период", list(PeriodAggregates.FREQS), format_func=PeriodAggregates.FREQS.__getitem__,
+                            horizontal=True, key='xyz_freq')
+        with col2:
+            level = st.selectbox("Уровень", levels, format_func=self.LEVELS.__getitem__, key='xyz_level')
+        with col3:
+            x_threshold = st.slider("Порог X (CV, %)", 5, 30, int(config.XYZ_X_THRESHOLD), 1)
+        with col4:
+            y_threshold = st.slider("Порог Y (CV, %)", 15, 60, int(config.XYZ_Y_THRESHOLD), 1)
+
+        # Суммы по периодам и итоги ABC берутся из общих агрегатов (кэш фильтров)
+        abc_xyz = periods.abc_xyz(level, freq, x_threshold=x_threshold, y_threshold=y_threshold)
+        matrix = PeriodAggregates.matrix(abc_xyz)
+        st.caption(f"CV сумм по полным периодам ({PeriodAggregates.FREQS[freq].lower()}), пустые периоды — нули: "
+                   f"X ≤ {x_threshold}%, Y ≤ {y_threshold}%, Z — выше или без значений")
+
+        def build() -> go.Figure:
+            counts = matrix['count'].unstack()
+            sums = matrix['sum'].unstack()
+            text = [[f"{counts.loc[a, x]:,} поз.<br>{sums.loc[a, x]:,.0f} ₽" for x in counts.columns]
+                    for a in counts.index]
+            fig = go.Figure(go.Heatmap(z=sums.to_numpy(), x=list(counts.columns), y=list(counts.index),
+                                       text=text, texttemplate='%{text}', colorscale='Reds'))
+            fig.update_layout(title='Матрица ABC × XYZ (сумма значений)', xaxis_title='XYZ',
+                              yaxis_title='ABC', yaxis_autorange='reversed', height=450)
+            return fig
+
+        params = {'freq': freq, 'level': level, 'x': x_threshold, 'y': y_threshold}
+        st.plotly_chart(cached_figure(result_key, 'abc_xyz_matrix', params, build), use_container_width=True)
+
+        with st.expander("Позиции с коэффициентами вариации"):
+            # CV = NaN (нулевое среднее, нет полных периодов) показывается подписью, а не пустой ячейкой
+            formats = {'value': '{:,.0f}', 'cumulative_percentage': '{:.2f}', 'cv': '{:.1f}'}
+            st.dataframe(abc_xyz.head(config.CHART_POINT_BUDGET).style.format(formats, na_rep=PeriodAggregates.NO_DATA),
+                         use_container_width=True)
+
+    def _render_pareto_analysis(self, metrics: Dict[str, Any], result_key: str) -> None:
         st.subheader("Правило Парето (80/20)")
 
         pareto_data = metrics.get('pareto_entity', pd.DataFrame())
@@ -137,34 +172,40 @@ class ABCTab:
         )
         pareto_data['is_top_80'] = pareto_data['cumulative_percentage'] <= 80
 
-        fig = go.Figure()
-
-        fig.add_trace(go.Bar(
-            x=pareto_data.get('entity', pareto_data.index),
-            y=pareto_data['value'],
-            name='Значение',
-            marker_color='lightblue'
-        ))
-
-        fig.add_trace(go.Scatter(
-            x=pareto_data.get('entity', pareto_data.index),
-            y=pareto_data['cumulative_percentage'],
-            name='Кумулятивный %',
-            yaxis='y2',
-            line=dict(color='red', width=3)
-        ))
-
-        fig.add_hline(y=80, line_dash="dash", line_color="green", annotation_text="80%")
-
-        fig.update_layout(
-            title='Кривая Парето',
-            xaxis_title='Объект',
-            yaxis_title='Значение',
-            yaxis2=dict(title='Кумулятивный %', overlaying='y', side='right', range=[0, 100]),
-            height=500
-        )
+        def build() -> go.Figure:
+            fig = go.Figure()
 
-        st.plotly_chart(fig, use_container_width=True)
+            # Как и в ABC: столбцов не больше бюджета графика, накопленный % — по всем объектам
+            shown = pareto_data.head(config.CHART_POINT_BUDGET)
+            fig.add_trace(go.Bar(
+                x=shown.get('entity', shown.index),
+                y=shown['value'],
+                name='Значение',
+                marker_color='lightblue'
+            ))
+
+            fig.add_trace(line_trace(
+                shown.get('entity', shown.index),
+                shown['cumulative_percentage'],
+                name='Кумулятивный %',
+                yaxis='y2',
+                line=dict(color='red', width=3)
+            ))
+
+            fig.add_hline(y=80, line_dash="dash", line_color="green", annotation_text="80%")
+
+            fig.update_layout(
+                title='Кривая Парето',
+                xaxis_title='Объект',
+                yaxis_title='Значение',
+                yaxis2=dict(title='Кумулятивный %', overlaying='y', side='right', range=[0, 100]),
+                height=500
+            )
+            return fig
+
+        st.plotly_chart(cached_figure(result_key, 'pareto', {}, build), use_container_width=True)
+        if len(pareto_data) > config.CHART_POINT_BUDGET:
+            st.caption(f"На графике первые {config.CHART_POINT_BUDGET:,} из {len(pareto_data):,} объектов")
 
         top_80 = pareto_data[pareto_data['is_top_80']]
         st.info(f"**{len(top_80)} из {len(pareto_data)}** объектов дают **80%** всего значения")
\ No newline at end of file
@@ -2,72 +2,161 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+
+from config import config
+from core.anomaly_detector import AnomalyDetector, SeriesAnomalyDetector
+from core.rollups import CALENDAR_COLS
+from ui.components.charts import cached_figure, range_control, scatter_traces
+from ui.components.filter_manager import FilterManager
+
+
+@st.cache_resource(max_entries=8, show_spinner="Обучение детектора аномалий...")
+def _fit_detector(result_key: str, method: str, _df: pd.DataFrame) -> Tuple[AnomalyDetector, np.ndarray]:
+    """Обученный детектор и оценки всех строк — переиспользуются между перезапусками скрипта"""
+    detector = AnomalyDetector(method).fit(_df)
+    return detector, detector.score(_df)
+
+
+@st.cache_resource(max_entries=8, show_spinner="Оценка рядов...")
+def _score_series(result_key: str, window: int, _df: pd.DataFrame) -> pd.DataFrame:
+    return SeriesAnomalyDetector(window=window).score(_df)
+
 
 class AnomaliesTab:
     """Вкладка аномалий — универсальная (value вместо loss_amount)"""
 
+    METHODS = {
+        "Isolation Forest": "isolation_forest",
+        "Робастный MAD-z": "mad",
+        "Сезонные остатки по объектам": "seasonal",
+        "Z-Score": "zscore",
+        "IQR": "iqr",
+        "Процентный порог": "percentile",
+    }
+
     def render(self, df: pd.DataFrame, metrics: Dict[str, Any], filter_state: Dict[str, Any]):
         st.header("🔍 Детектор аномалий & Кластеризация")
 
-        tab1, tab2 = st.tabs(["📊 Статистические аномалии", "🔬 Кластерный анализ"])
+        tab1, tab2, tab3 = st.tabs(["📊 Статистические аномалии", "📈 Аномалии по рядам", "🔬 Кластерный анализ"])
 
         with tab1:
-            self._render_statistical_anomalies(df)
+            self._render_statistical_anomalies(df, filter_state)
         with tab2:
-            self._render_cluster_analysis(df)
+            self._render_series_anomalies(df, filter_state)
+        with tab3:
+            self._render_cluster_analysis(metrics)
 
-    def _render_statistical_anomalies(self, df: pd.DataFrame):
+    def _render_statistical_anomalies(self, df: pd.DataFrame, filter_state: Dict[str, Any]) -> None:
         st.subheader("Методы обнаружения аномалий")
 
         if df.empty or 'value' not in df.columns:
             st.warning("Недостаточно данных")
             return
 
-        method = st.selectbox("Метод", ["Isolation Forest (имитация)", "Z-Score", "IQR", "Процентный порог"])
-
-        # Подготовка
-        values = df['value'].values.reshape(-1, 1)
+        label = st.selectbox("Метод", list(self.METHODS))
+        method = self.METHODS[label]
 
-        if method == "Z-Score":
-            threshold = st.slider("Z-Score порог", 2.0, 5.0, 3.0, 0.1)
-            z = np.abs((df['value'] - df['value'].mean()) / df['value'].std())
-            df['is_anomaly'] = z > threshold
-        elif method == "IQR":
-            mult = st.slider("IQR множитель", 1.0, 3.0, 1.5, 0.1)
-            Q1, Q3 = np.percentile(df['value'], [25, 75])
-            IQR = Q3 - Q1
-            df['is_anomaly'] = (df['value'] < Q1 - mult * IQR) | (df['value'] > Q3 + mult * IQR)
-        else:  # Процентный порог или имитация
-            perc = st.slider("Перцентиль", 90, 99, 95, 1)
-            thresh = np.percentile(df['value'], perc)
-            df['is_anomaly'] = df['value'] > thresh
+        # Обучение и оценка — в кэше; здесь только порог и отрисовка
+        detector, scores = _fit_detector(FilterManager.result_key(filter_state), method, df)
+        threshold = self._threshold_control(method, detector)
+        is_anomaly = detector.flags(scores, threshold)
 
-        anomalies = df[df['is_anomaly']]
+        anomalies = df[is_anomaly].assign(score=scores[is_anomaly])
 
         col1, col2, col3 = st.columns(3)
         col1.metric("Всего записей", len(df))
         col2.metric("Аномалий", len(anomalies))
         col3.metric("Доля", f"{len(anomalies)/len(df)*100:.1f}%" if len(df) else "0%")
 
-        # График
-        fig = go.Figure()
-        normal = df[~df['is_anomaly']]
-        fig.add_trace(go.Scatter(x=normal.index, y=normal['value'], mode='markers', name='Нормальные', marker=dict(color='blue', size=6)))
-        fig.add_trace(go.Scatter(x=anomalies.index, y=anomalies['value'], mode='markers', name='Аномалии', marker=dict(color='red', size=10, symbol='x')))
-        fig.update_layout(title=f"Аномалии ({method})", xaxis_title="Индекс / Дата", yaxis_title="Значение, ₽", height=500)
+        # График: обычные точки прореживаются, аномалии остаются все
+        start, end = range_control(df['date'], key='anomaly_chart_range') if 'date' in df.columns else (None, None)
+
+        def build() -> go.Figure:
+            if start is not None:
+                in_range = ((df['date'] >= start) & (df['date'] <= end)).to_numpy()
+                x = df['date'].to_numpy()[in_range]
+            else:
+                in_range = np.ones(len(df), dtype=bool)
+                x = np.arange(len(df))
+            fig = go.Figure(scatter_traces(x, df['value'].to_numpy()[in_range], is_anomaly[in_range], name='Нормальные'))
+            fig.update_layout(title=f"Аномалии ({label})", xaxis_title="Дата / Номер записи", yaxis_title="Значение, ₽", height=500)
+            return fig
+
+        params = {'method': method, 'threshold': threshold, 'range': (start, end)}
+        fig = cached_figure(FilterManager.result_key(filter_state), 'anomaly_scatter', params, build)
         st.plotly_chart(fig, use_container_width=True)
 
         with st.expander("Детализация аномалий"):
-            st.dataframe(anomalies.sort_values('value', ascending=False).head(50), use_container_width=True)
+            top = anomalies.sort_values('score', ascending=False).head(50)
+            st.dataframe(top.drop(columns=list(CALENDAR_COLS), errors='ignore'), use_container_width=True)
+
+    def _threshold_control(self, method: str, detector: AnomalyDetector) -> float:
+        """Слайдер порога в шкале метода → порог на оценку детектора"""
+        if method == "isolation_forest":
+            contamination = st.slider("Доля аномалий (contamination)", 0.01, 0.3, float(detector.contamination), 0.01)
+            return detector.quantile_threshold(1 - contamination)
+        if method in ("mad", "seasonal"):
+            return st.slider("Порог робастного z", 2.0, 8.0, 3.5, 0.1)
+        if method == "zscore":
+            return st.slider("Z-Score порог", 2.0, 5.0, 3.0, 0.1)
+        if method == "iqr":
+            return st.slider("IQR множитель", 1.0, 3.0, 1.5, 0.1)
+        perc = st.slider("Перцентиль", 90, 99, 95, 1)
+        return detector.quantile_threshold(perc / 100)
+
+    def _render_series_anomalies(self, df: pd.DataFrame, filter_state: Dict[str, Any]) -> None:
+        st.subheader("Отклонения от собственной истории ряда (объект × категория, по дням)")
+
+        if df.empty or 'date' not in df.columns or 'value' not in df.columns:
+            st.warning("Нужны колонки date и value")
+            return
+
+        col1, col2 = st.columns(2)
+        with col1:
+            window = st.slider("Окно истории (дней)", 7, 90, config.SERIES_ANOMALY_WINDOW, 1)
+        with col2:
+            threshold = st.slider("Порог робастного z ряда", 2.0, 10.0, 5.0, 0.5)
+
+        # Ряды считаются по дням: дневные суммы роллапов дают тот же результат без сырых строк
+        # (при внешнем движке df — лишь выборка строк)
+        rollups = st.session_state.get('time_rollups')
+        source = rollups.daily_rows(filter_state) if rollups is not None else df
+        scored = _score_series(FilterManager.result_key(filter_state), window, source)
+        is_anomaly = SeriesAnomalyDetector.flags(scored, threshold)
+        anomalies = scored[is_anomaly]
+
+        keys = [c for c in SeriesAnomalyDetector.SERIES_KEYS if c in scored.columns]
+        n_series = len(scored.groupby(keys, observed=True).size()) if keys else 1
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Рядов", n_series)
+        col2.metric("Аномальных дней", len(anomalies))
+        col3.metric("Рядов с аномалиями", anomalies[keys].drop_duplicates().shape[0] if keys else int(len(anomalies) > 0))
+
+        if anomalies.empty:
+            st.info("Аномалий при текущем пороге нет")
+            return
+
+        top = anomalies.sort_values('score', ascending=False).head(50)
+        st.dataframe(top, use_container_width=True)
+
+        if 'entity' in anomalies.columns:
+            by_entity = anomalies.groupby('entity', observed=True).size().sort_values(ascending=False).head(20)
+            fig = go.Figure(go.Bar(x=by_entity.index.astype(str), y=by_entity.values, marker_color='#EF4444'))
+            fig.update_layout(title="Аномальные дни по объектам (топ-20)", xaxis_title="Объект",
+                              yaxis_title="Дней", height=400)
+            st.plotly_chart(fig, use_container_width=True)
 
-    def _render_cluster_analysis(self, df: pd.DataFrame):
+    def _render_cluster_analysis(self, metrics: Dict[str, Any]) -> None:
         st.subheader("Кластеризация объектов")
-        if 'entity' not in df.columns:
+        # Сумма, среднее и число строк по объектам — из куба движка, строки не группируются
+        stats = metrics.get('entity_stats', pd.DataFrame())
+        if stats.empty:
             st.warning("Нужна колонка entity")
             return
 
-        stats = df.groupby('entity')['value'].agg(['sum', 'mean', 'count']).round(0)
+        stats = stats.round(0)
         stats.columns = ['Сумма', 'Среднее', 'Количество']
         stats = stats.sort_values('Сумма', ascending=False)
         st.dataframe(stats.head(20), use_container_width=True)
\ No newline at end of file
@@ -1,105 +1,119 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from typing import Dict, Any
 
+from core.rollups import TimeRollups
+from ui.components.charts import cached_figure, line_trace, range_control
+from ui.components.filter_manager import FilterManager
+
+
 class ChartsTab:
     """Вкладка с графиками и трендами — универсальная"""
 
     def render(self, df: pd.DataFrame, metrics: Dict[str, Any], filter_state: Dict[str, Any]):
         st.header("📈 Расширенная аналитика: графики и тренды")
+        if 'date' not in df.columns or 'value' not in df.columns:
+            return
 
-        self._render_time_series(df)
-        self._render_comparative_analysis(df)
-        self._render_heatmap(df)
-
-    def _render_time_series(self, df: pd.DataFrame):
-        if 'date' not in df.columns or df.empty:
+        # Ряды, дни недели и часы — из роллапов датасета с теми же фильтрами, строки df не группируются
+        rollups = st.session_state.get('time_rollups') or TimeRollups(df)
+        # Фигуры кэшируются по датасету, фильтрам и параметрам графика
+        result_key = FilterManager.result_key(filter_state)
+        self._render_time_series(df, rollups, filter_state, result_key)
+        self._render_comparative_analysis(rollups, filter_state, result_key)
+        self._render_heatmap(rollups, filter_state, result_key)
+
+    def _render_time_series(self, df: pd.DataFrame, rollups: TimeRollups, filter_state: Dict[str, Any],
+                            result_key: str) -> None:
+        if df.empty:
             return
 
         st.subheader("📅 Динамика во времени")
 
-        freq = st.radio("Частота агрегации", ["Дни", "Недели", "Месяцы"], horizontal=True)
-
-        if freq == "Дни":
-            period_df = df.groupby('date')['value'].sum().reset_index()
-        elif freq == "Недели":
-            df['week'] = df['date'].dt.to_period('W').dt.start_time
-            period_df = df.groupby('week')['value'].sum().reset_index().rename(columns={'week': 'date'})
-        else:
-            df['month'] = df['date'].dt.to_period('M').dt.start_time
-            period_df = df.groupby('month')['value'].sum().reset_index().rename(columns={'month': 'date'})
-
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=period_df['date'], y=period_df['value'],
-                                 mode='lines+markers', name='Фактические значения',
-                                 line=dict(color='#EF4444', width=3)))
-
-        if len(period_df) > 7:
-            period_df['ma_7'] = period_df['value'].rolling(7, min_periods=1).mean()
-            fig.add_trace(go.Scatter(x=period_df['date'], y=period_df['ma_7'],
-                                     mode='lines', name='Скользящее среднее (7)',
-                                     line=dict(color='#3B82F6', width=3, dash='dash')))
-
-        fig.update_layout(
-            title=f"Динамика ({freq.lower()})",
-            xaxis_title="Дата",
-            yaxis_title="Значение, ₽",
-            hovermode='x unified',
-            height=500
-        )
+        freq = st.radio("Частота агрегации", list(TimeRollups.FREQS), format_func=TimeRollups.FREQS.get,
+                        horizontal=True)
+        # В браузер уходит не больше CHART_POINT_BUDGET точек; детали — сужением диапазона
+        start, end = range_control(df['date'], key='time_series_range')
+
+        def build() -> go.Figure:
+            period_df = rollups.series(freq, filter_state).rename_axis('date').reset_index()
+
+            if len(period_df) > 7:
+                period_df['ma_7'] = period_df['value'].rolling(7, min_periods=1).mean()
+
+            # Период, в который попадает начало диапазона, остаётся на графике
+            first = period_df['date'][period_df['date'] <= start].max()
+            period_df = period_df[(period_df['date'] >= (start if pd.isna(first) else first))
+                                  & (period_df['date'] <= end)]
+
+            fig = go.Figure()
+            fig.add_trace(line_trace(period_df['date'], period_df['value'], method='minmax',
+                                     mode='lines+markers', name='Фактические значения',
+                                     line=dict(color='#EF4444', width=3)))
+
+            if 'ma_7' in period_df.columns:
+                fig.add_trace(line_trace(period_df['date'], period_df['ma_7'],
+                                         mode='lines', name='Скользящее среднее (7)',
+                                         line=dict(color='#3B82F6', width=3, dash='dash')))
+
+            fig.update_layout(
+                title=f"Динамика ({TimeRollups.FREQS[freq].lower()})",
+                xaxis_title="Дата",
+                yaxis_title="Значение, ₽",
+                hovermode='x unified',
+                height=500
+            )
+            return fig
+
+        fig = cached_figure(result_key, 'time_series', {'freq': freq, 'range': (start, end)}, build)
         st.plotly_chart(fig, use_container_width=True)
 
-    def _render_comparative_analysis(self, df: pd.DataFrame):
+    def _render_comparative_analysis(self, rollups: TimeRollups, filter_state: Dict[str, Any], result_key: str) -> None:
         st.subheader("🔄 Сравнительный анализ")
         col1, col2 = st.columns(2)
 
         with col1:
-            if 'date' in df.columns:
-                df['day_of_week'] = df['date'].dt.day_name()
+            def build_weekday() -> go.Figure:
                 weekday_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                weekday_loss = df.groupby('day_of_week')['value'].sum().reindex(weekday_order)
+                weekday_loss = rollups.by_weekday(filter_state)
 
-                fig = px.bar(x=weekday_loss.index, y=weekday_loss.values,
-                             title='По дням недели',
-                             labels={'x': 'День недели', 'y': 'Значение, ₽'},
-                             color=weekday_loss.values,
-                             color_continuous_scale='reds')
-                st.plotly_chart(fig, use_container_width=True)
+                return px.bar(x=weekday_order, y=weekday_loss,
+                              title='По дням недели',
+                              labels={'x': 'День недели', 'y': 'Значение, ₽'},
+                              color=weekday_loss,
+                              color_continuous_scale='reds')
 
-        with col2:
-            if 'date' in df.columns:
-                df['hour'] = df['date'].dt.hour
-                hour_loss = df.groupby('hour')['value'].sum()
-                fig = px.line(x=hour_loss.index, y=hour_loss.values,
-                              title='По часам',
-                              labels={'x': 'Час', 'y': 'Значение, ₽'})
-                st.plotly_chart(fig, use_container_width=True)
-
-    def _render_heatmap(self, df: pd.DataFrame):
-        if 'date' not in df.columns:
-            return
+            st.plotly_chart(cached_figure(result_key, 'weekday', {}, build_weekday), use_container_width=True)
 
-        st.subheader("🌡️ Heatmap интенсивности")
+        with col2:
+            def build_hourly() -> go.Figure:
+                hour_loss = rollups.by_hour(filter_state)
+                hours = np.flatnonzero(hour_loss)  # только часы, в которые есть данные
+                return px.line(x=hours, y=hour_loss[hours],
+                               title='По часам',
+                               labels={'x': 'Час', 'y': 'Значение, ₽'})
 
-        try:
-            df['day_of_week_num'] = df['date'].dt.dayofweek
-            df['hour'] = df['date'].dt.hour
+            st.plotly_chart(cached_figure(result_key, 'hourly', {}, build_hourly), use_container_width=True)
 
-            heatmap_data = df.groupby(['day_of_week_num', 'hour'])['value'].sum().unstack(fill_value=0)
-            heatmap_data = heatmap_data.reindex(columns=range(24), fill_value=0)
-            heatmap_data = heatmap_data.reindex(index=range(7), fill_value=0)
+    def _render_heatmap(self, rollups: TimeRollups, filter_state: Dict[str, Any], result_key: str) -> None:
+        st.subheader("🌡️ Heatmap интенсивности")
 
+        def build() -> go.Figure:
+            heatmap_data = rollups.weekday_hour(filter_state)
             day_names = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
 
-            fig = px.imshow(heatmap_data.values,
-                            title='Интенсивность: День недели × Час',
-                            labels=dict(x="Час", y="День недели", color="Значение"),
-                            x=list(range(24)),
-                            y=day_names,
-                            color_continuous_scale='reds',
-                            aspect='auto')
-            st.plotly_chart(fig, use_container_width=True)
+            return px.imshow(heatmap_data,
+                             title='Интенсивность: День недели × Час',
+                             labels=dict(x="Час", y="День недели", color="Значение"),
+                             x=list(range(24)),
+                             y=day_names,
+                             color_continuous_scale='reds',
+                             aspect='auto')
+
+        try:
+            st.plotly_chart(cached_figure(result_key, 'heatmap', {}, build), use_container_width=True)
         except Exception as e:
             st.warning(f"Не удалось построить heatmap: {str(e)[:80]}")
\ No newline at end of file
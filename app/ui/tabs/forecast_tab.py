@@ -1,10 +1,35 @@
 # app/ui/tabs/forecast_tab.py
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go   # ← обязательно для go.Figure()
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from core.forecast_engine import (
+    ForecastEngine, exponential_smoothing_forecast, moving_average_forecast, simple_trend_forecast,
+)
+from data.cache import ForecastStateStore
+from ui.components.charts import line_trace
+from ui.components.filter_manager import FilterManager
+
+
+@st.cache_resource(max_entries=8, show_spinner="Прогноз по всем рядам...")
+def _batch_forecast(result_key: str, scope: str, level: str, horizon: int, _df: pd.DataFrame) -> pd.DataFrame:
+    return ForecastEngine(horizon=horizon).forecast(_df, level, store=ForecastStateStore(), scope=scope)
+
+
+def forecast_scope(mapping: Optional[Dict[str, str]], level: str, filter_state: Dict[str, Any]) -> str:
+    """Ключ сохранённых состояний: разметка, уровень и срез рядов (выбранные объекты/категории).
+
+    Хэша датасета и диапазона дат в ключе нет: загрузка с новыми днями дообновляет
+    прежние состояния, а не обучает заново. Изменённую историю ряда движок
+    распознаёт сам — по last_date и last_value состояния.
+    """
+    return ForecastStateStore.make_scope(
+        mapping, level,
+        sorted(filter_state.get('selected_entities') or [], key=str),
+        sorted(filter_state.get('selected_categories') or [], key=str),
+    )
 
 
 class ForecastTab:
@@ -23,8 +48,11 @@ class ForecastTab:
         )
         forecast_days = st.slider("Прогноз на дней вперёд", 7, 90, 30)
 
-        # Подготовка ежедневных данных
-        daily = df.groupby('date')['value'].sum().reset_index()
+        # Подготовка ежедневных данных: дневные суммы роллапов с теми же фильтрами
+        # (при внешнем движке df — лишь выборка строк, ряд по ней был бы неполным)
+        rollups = st.session_state.get('time_rollups')
+        source = rollups.daily_rows(filter_state) if rollups is not None else df
+        daily = source.groupby('date')['value'].sum().reset_index()
         daily_series = daily.set_index('date')['value']
 
         if len(daily_series) < 14:
@@ -32,12 +60,8 @@ class ForecastTab:
             return
 
         st.subheader("Исходный временной ряд")
-        fig_actual = px.line(
-            daily,
-            x='date',
-            y='value',
-            title='Фактические значения'
-        )
+        fig_actual = go.Figure(line_trace(daily['date'], daily['value'], mode='lines', name='Факт'))
+        fig_actual.update_layout(title='Фактические значения', xaxis_title='date', yaxis_title='value')
         st.plotly_chart(fig_actual, use_container_width=True)
 
         # Вычисление прогноза
@@ -50,23 +74,18 @@ class ForecastTab:
 
         self._visualize_forecast(daily_series, forecast, method, forecast_days)
 
+        self._render_batch_forecast(source, filter_state, forecast_days)
+
     def _moving_average_forecast(self, series: pd.Series, days: int) -> np.ndarray:
         window = st.slider("Окно среднего (дней)", 3, 30, 7)
-        ma = series.rolling(window=window, min_periods=1).mean()
-        last_value = ma.iloc[-1]
-        return np.full(days, last_value)
+        return moving_average_forecast(series, days, window)
 
     def _exponential_smoothing_forecast(self, series: pd.Series, days: int) -> np.ndarray:
         alpha = st.slider("Alpha (0.1–1.0)", 0.1, 1.0, 0.3, 0.05)
-        smoothed = series.ewm(alpha=alpha, adjust=False).mean()
-        last_value = smoothed.iloc[-1]
-        return np.full(days, last_value)
+        return exponential_smoothing_forecast(series, days, alpha)
 
     def _simple_trend_forecast(self, series: pd.Series, days: int) -> np.ndarray:
-        x = np.arange(len(series))
-        coeffs = np.polyfit(x, series.values, 1)
-        future_x = np.arange(len(series), len(series) + days)
-        return coeffs[0] * future_x + coeffs[1]
+        return simple_trend_forecast(series, days)
 
     def _visualize_forecast(self, series: pd.Series, forecast: np.ndarray, method: str, days: int):
         last_date = series.index[-1]
@@ -74,9 +93,9 @@ class ForecastTab:
 
         fig = go.Figure()
 
-        fig.add_trace(go.Scatter(
-            x=series.index,
-            y=series.values,
+        fig.add_trace(line_trace(
+            series.index,
+            series.to_numpy(),
             mode='lines',
             name='Факт',
             line=dict(color='#EF4444')
@@ -98,4 +117,38 @@ class ForecastTab:
             hovermode='x unified'
         )
 
+        st.plotly_chart(fig, use_container_width=True)
+
+    def _render_batch_forecast(self, df: pd.DataFrame, filter_state: Dict[str, Any], days: int) -> None:
+        levels = {'entity': "🏪 Объекты", 'category': "📦 Категории"}
+        available = [lvl for lvl in levels if lvl in df.columns]
+        if not available:
+            return
+
+        st.subheader("Прогноз Holt-Winters по всем рядам")
+        level = st.radio("Уровень", available, format_func=levels.get, horizontal=True)
+
+        scope = forecast_scope(st.session_state.get('column_mapping'), level, filter_state)
+        forecast_df = _batch_forecast(FilterManager.result_key(filter_state), scope, level, days, df)
+
+        totals = (forecast_df.groupby(level, observed=True)[['forecast', 'lower', 'upper']].sum()
+                  .sort_values('forecast', ascending=False))
+        st.dataframe(totals.round(0), use_container_width=True)
+
+        series_id = st.selectbox("Ряд", totals.index.tolist())
+        history = df[df[level] == series_id].groupby(df['date'].dt.normalize())['value'].sum()
+        series_fc = forecast_df[forecast_df[level] == series_id]
+
+        fig = go.Figure()
+        fig.add_trace(line_trace(history.index, history.values, mode='lines', name='Факт',
+                                 line=dict(color='#EF4444')))
+        fig.add_trace(go.Scatter(x=series_fc['date'], y=series_fc['upper'], mode='lines',
+                                 line=dict(width=0), showlegend=False, hoverinfo='skip'))
+        fig.add_trace(go.Scatter(x=series_fc['date'], y=series_fc['lower'], mode='lines',
+                                 line=dict(width=0), fill='tonexty', fillcolor='rgba(16,185,129,0.2)',
+                                 name='95% интервал'))
+        fig.add_trace(go.Scatter(x=series_fc['date'], y=series_fc['forecast'], mode='lines',
+                                 name='Прогноз', line=dict(color='#10B981', dash='dash')))
+        fig.update_layout(title=f"{series_id}: прогноз на {days} дней", xaxis_title="Дата",
+                          yaxis_title="Значение", height=450, hovermode='x unified')
         st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
@@ -1,7 +1,11 @@
 import streamlit as st
+from functools import partial
 from typing import Dict, Any
 import pandas as pd
 
+from ui.components.export import ExportManager
+from ui.components.filter_manager import FilterManager
+
 
 class RecommendationsTab:
     """Рекомендации и бизнес-инсайты"""
@@ -46,7 +50,9 @@ class RecommendationsTab:
         5. Загрузить новые данные → следить за динамикой
         """)
 
-        # Кнопка экспорта
-        if st.button("📤 Скачать полный отчёт Excel"):
-            # Здесь можно вызвать ExportManager, если он у тебя есть
-            st.success("Отчёт скачан (в реальном проекте — вызов ExportManager)")
\ No newline at end of file
+        # Экспорт отчёта
+        st.subheader("📤 Экспорт отчёта")
+        # При внешнем движке df — выборка: строки отчёта читаются из него пачками
+        backend = st.session_state.get('query_backend')
+        rows = partial(backend.batches, filter_state) if backend is not None else df
+        ExportManager.render_download(rows, metrics, FilterManager.result_key(filter_state))
\ No newline at end of file
@@ -1,7 +1,10 @@
+import time
 import streamlit as st
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import pandas as pd
 
+from config import config
+
 # Импортируем все вкладки (все уже обновлены)
 from .overview_tab import OverviewTab
 from .charts_tab import ChartsTab
@@ -14,8 +17,8 @@ from .recommendations_tab import RecommendationsTab
 class TabManager:
     """Фасад для управления всеми вкладками — универсальный"""
 
-    def __init__(self):
-        self.tabs = {
+    def __init__(self) -> None:
+        self.tabs: Dict[str, Any] = {
             'overview': OverviewTab(),
             'charts': ChartsTab(),
             'anomalies': AnomaliesTab(),
@@ -24,27 +27,33 @@ class TabManager:
             'recommendations': RecommendationsTab()
         }
 
-    def render_all(self, df: pd.DataFrame, metrics: Dict[str, Any], filter_state: Dict[str, Any]):
-        tab_names = [
-            "📊 Обзор",
-            "📈 Графики",
-            "🔍 Аномалии",
-            "📊 ABC / Pareto",
-            "🔮 Прогноз",
-            "💡 Рекомендации"
-        ]
-
-        created_tabs = st.tabs(tab_names)
-
-        with created_tabs[0]:
-            self.tabs['overview'].render(df, metrics, filter_state)
-        with created_tabs[1]:
-            self.tabs['charts'].render(df, metrics, filter_state)
-        with created_tabs[2]:
-            self.tabs['anomalies'].render(df, metrics, filter_state)
-        with created_tabs[3]:
-            self.tabs['abc'].render(df, metrics, filter_state)
-        with created_tabs[4]:
-            self.tabs['forecast'].render(df, metrics, filter_state)
-        with created_tabs[5]:
-            self.tabs['recommendations'].render(df, metrics, filter_state)
\ No newline at end of file
+    TAB_NAMES = {
+        'overview': "📊 Обзор",
+        'charts': "📈 Графики",
+        'anomalies': "🔍 Аномалии",
+        'abc': "📊 ABC / Pareto",
+        'forecast': "🔮 Прогноз",
+        'recommendations': "💡 Рекомендации",
+    }
+
+    def render_all(self, df: pd.DataFrame, metrics: Dict[str, Any], filter_state: Dict[str, Any],
+                   lazy: Optional[bool] = None) -> None:
+        """Рендер вкладок. В ленивом режиме выполняется только открытая вкладка:
+        переключение вкладки вызывает перезапуск, а тяжёлые расчёты и фигуры
+        уже посещённых вкладок берутся из кэшей (cache_resource, кэш фигур)."""
+        lazy = config.LAZY_TABS if lazy is None else lazy
+        created_tabs = st.tabs(list(self.TAB_NAMES.values()), key='active_tab',
+                               on_change='rerun' if lazy else 'ignore')
+
+        timings = {}
+        for (name, label), container in zip(self.TAB_NAMES.items(), created_tabs, strict=True):
+            # open is None без отслеживания состояния (on_change='ignore') — тогда рендерим всё
+            if container.open is False:
+                continue
+            with container:
+                start = time.perf_counter()
+                self.tabs[name].render(df, metrics, filter_state)
+                timings[label] = (time.perf_counter() - start) * 1000
+
+        st.session_state['tab_timings'] = timings
+        st.sidebar.caption("Отрисовка вкладок: " + ", ".join(f"{label} {ms:.0f} мс" for label, ms in timings.items()))
\ No newline at end of file
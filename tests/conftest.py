@@ -0,0 +1,21 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import pytest
+
+# Модули приложения импортируются от каталога app/ — как при запуске `streamlit run main.py` из app/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+
+
+@pytest.fixture
+def sales_df():
+    """Нормализованный датасет: почасовые строки, 12 объектов × 4 категории, пропуски в entity"""
+    from core.data_loader import DataLoader
+    from ui.components.column_mapper import ColumnMapper
+
+    raw = DataLoader()._generate_test_data(days=120, entity_count=12, n_rows=20_000, hourly=True, seed=7)
+    raw["entity"] = raw["entity"].astype(object)
+    raw.loc[raw.index[::251], "entity"] = None
+    mapping = {role: role for role in ("date", "value", "entity", "category")}
+    return ColumnMapper.apply(raw, mapping)
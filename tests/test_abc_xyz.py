@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.abc_xyz import ABCClassifier, PeriodAggregates
+from core.analytics_engine import AnalyticsEngine
+
+
+def legacy_abc(df: pd.DataFrame, group_col: str, a: float = 80, b: float = 95) -> pd.DataFrame:
+    """Прежний расчёт: сортировка, cumsum и построчный apply"""
+    abc_data = df.groupby(group_col, observed=True)['value'].sum().reset_index()
+    abc_data = abc_data.sort_values('value', ascending=False, kind='stable')
+    abc_data['cumulative_percentage'] = (abc_data['value'].cumsum() / abc_data['value'].sum() * 100).round(2)
+
+    def assign_abc(row):
+        if row['cumulative_percentage'] <= a:
+            return 'A'
+        elif row['cumulative_percentage'] <= b:
+            return 'B'
+        return 'C'
+
+    abc_data['abc_class'] = abc_data.apply(assign_abc, axis=1)
+    return abc_data.reset_index(drop=True)
+
+
+def sku_frame(n_rows=5_000, n_sku=300, seed=0, negative=False):
+    rng = np.random.default_rng(seed)
+    value = rng.pareto(1.5, n_rows) * 100
+    if negative:
+        value[::7] *= -3  # возвраты
+    return pd.DataFrame({'sku': rng.integers(0, n_sku, n_rows).astype(str), 'value': value})
+
+
+@pytest.mark.parametrize('thresholds', [(80, 95), (50, 90), (70, 70), (0, 100)])
+@pytest.mark.parametrize('negative', [False, True])
+def test_classifier_matches_legacy_loop(thresholds, negative):
+    df = sku_frame(negative=negative)
+    expected = legacy_abc(df, 'sku', *thresholds)
+    actual = ABCClassifier.from_frame(df, 'sku').frame(*thresholds)
+    pd.testing.assert_frame_equal(actual[expected.columns], expected, check_dtype=False)
+
+
+def test_class_value_and_boundaries():
+    df = sku_frame()
+    classifier = ABCClassifier.from_frame(df, 'sku')
+    frame = classifier.frame()
+    n_a, n_b = classifier.boundaries()
+    assert (frame['abc_class'].iloc[:n_a] == 'A').all()
+    assert (frame['abc_class'].iloc[n_a:n_b] == 'B').all()
+    assert classifier.class_value('A') == pytest.approx(frame.loc[frame['abc_class'] == 'A', 'value'].sum())
+
+
+def test_period_aggregates_abc_matches_rows(sales_df):
+    cube = AnalyticsEngine()._build_cube(sales_df)
+    periods = PeriodAggregates(cube)
+    expected = legacy_abc(sales_df, 'category')
+    actual = periods.abc(['category']).frame()
+    pd.testing.assert_frame_equal(actual[expected.columns], expected, check_dtype=False, check_categorical=False)
+
+
+def daily_cube(start: str, days: int, value: float = 10.0) -> pd.DataFrame:
+    dates = pd.date_range(start, periods=days, freq='D')
+    return pd.DataFrame({'category': 'a', 'date': dates, 'value': value})
+
+
+@pytest.mark.parametrize('days', [30, 364, 366])
+def test_stable_series_is_x_regardless_of_partial_weeks(days):
+    # 2024-01-03 — среда: первая и последняя недели диапазона неполные
+    periods = PeriodAggregates(daily_cube('2024-01-03', days))
+    xyz = periods.xyz(['category'], 'W')
+    assert xyz.loc['a', 'cv'] == 0
+    assert xyz.loc['a', 'xyz_class'] == 'X'
+
+
+def test_full_periods_follow_calendar():
+    periods = PeriodAggregates(daily_cube('2024-01-03', 366))  # 2024-01-03 .. 2025-01-02
+    first, last = periods.full_periods('W')
+    assert PeriodAggregates._period_ids(np.array(['2024-01-08'], dtype='datetime64[D]'), 'W')[0] == first
+    assert PeriodAggregates._period_ids(np.array(['2024-12-29'], dtype='datetime64[D]'), 'W')[0] == last
+    first, last = periods.full_periods('M')
+    assert (first, last) == (pd.Period('2024-02').ordinal, pd.Period('2024-12').ordinal)
+    assert periods.xyz(['category'], 'M').loc['a', 'xyz_class'] == 'X'
+
+
+def test_period_bounds_come_from_date_range():
+    cube = daily_cube('2024-01-01', 28)  # продажи только в январе
+    assert PeriodAggregates(cube).xyz(['category'], 'W').loc['a', 'xyz_class'] == 'X'
+    # Фильтр шире продаж: недели февраля–марта без значений — нули, ряд нестабилен
+    periods = PeriodAggregates(cube, (pd.Timestamp('2024-01-01').date(), pd.Timestamp('2024-03-31').date()))
+    assert periods.full_periods('W')[1] - periods.full_periods('W')[0] + 1 == 13
+    assert periods.xyz(['category'], 'W').loc['a', 'xyz_class'] == 'Z'
+
+
+def test_abc_totals_keep_partial_periods():
+    cube = daily_cube('2024-01-03', 30)
+    periods = PeriodAggregates(cube)
+    assert periods.totals(['category']).loc['a'] == pytest.approx(cube['value'].sum())
+
+
+def test_zero_mean_gives_nan_cv_and_z_class():
+    cube = pd.concat([daily_cube('2024-01-01', 28), daily_cube('2024-01-01', 28, value=0.0).assign(category='b')])
+    xyz = PeriodAggregates(cube).xyz(['category'], 'W')
+    assert np.isfinite(xyz['cv']).loc['a']
+    assert np.isnan(xyz.loc['b', 'cv'])
+    assert xyz.loc['b', 'xyz_class'] == 'Z'
+
+
+def test_no_full_periods_gives_nan_cv():
+    # 2024-01-03 .. 2024-02-01: ни одного полного месяца
+    xyz = PeriodAggregates(daily_cube('2024-01-03', 30)).xyz(['category'], 'M')
+    assert np.isnan(xyz.loc['a', 'cv'])
+    assert xyz.loc['a', 'xyz_class'] == 'Z'
+
+
+def test_period_frames_exist_before_caching(sales_df):
+    periods = PeriodAggregates(AnalyticsEngine()._build_cube(sales_df))
+    size = periods.nbytes
+    # Запросы по уже посчитанным частотам не растят объект после того, как кэш оценил его размер
+    for freq in PeriodAggregates.FREQS:
+        periods.xyz(['entity'], freq)
+    assert periods.nbytes == size
+    # Итоги по уровню запоминаются и входят в оценку
+    periods.abc(['entity', 'category'])
+    assert periods.nbytes > size
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.anomaly_detector import AnomalyDetector, SeriesAnomalyDetector
+from core.data_loader import DataLoader
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return DataLoader()._generate_test_data(days=60, entity_count=10, n_rows=20_000,
+                                            anomaly_rate=0.01, seed=3)
+
+
+@pytest.mark.parametrize('method', AnomalyDetector.METHODS)
+def test_scores_do_not_depend_on_batch_size(rows, method):
+    detector = AnomalyDetector(method, fit_sample=5_000, batch_rows=50_000).fit(rows)
+    whole = detector.score(rows)
+    detector.batch_rows = 777
+    np.testing.assert_allclose(detector.score(rows), whole, rtol=1e-6)
+    assert whole.shape == (len(rows),)
+
+
+@pytest.mark.parametrize('method', ['mad', 'seasonal', 'zscore', 'iqr', 'isolation_forest'])
+def test_extreme_values_are_flagged(rows, method):
+    df = rows.copy()
+    spikes = np.arange(0, len(df), 1000)
+    df.loc[spikes, 'value'] = df['value'].median() * 50
+    detector = AnomalyDetector(method).fit(df)
+    flags = detector.flags(detector.score(df), detector.default_threshold())
+    assert flags[spikes].mean() > 0.9
+    assert flags.mean() <= detector.contamination + 0.01
+
+
+def test_mad_score_formula(rows):
+    detector = AnomalyDetector('mad').fit(rows)
+    values = rows['value'].to_numpy(dtype=np.float64)
+    median = np.median(values)
+    mad = np.median(np.abs(values - median))
+    np.testing.assert_allclose(detector.score(rows), 0.6745 * np.abs(values - median) / mad, rtol=1e-5)
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError):
+        AnomalyDetector('unknown')
+    with pytest.raises(ValueError):
+        AnomalyDetector('mad').fit(pd.DataFrame({'value': []}))
+
+
+def reference_rolling(values, window, min_periods):
+    """Медиана и MAD предыдущих window значений — прямым перебором"""
+    median, mad = np.full(len(values), np.nan), np.full(len(values), np.nan)
+    for i in range(len(values)):
+        history = values[max(0, i - window):i]
+        if len(history) >= min_periods:
+            median[i] = np.median(history)
+            mad[i] = np.median(np.abs(history - median[i]))
+    return median, mad
+
+
+def test_series_baseline_matches_reference(rows):
+    detector = SeriesAnomalyDetector(window=14, min_periods=5)
+    scored = detector.score(rows)
+    for _, series in scored.groupby(['entity', 'category'], observed=True):
+        median, mad = reference_rolling(series['value'].to_numpy(), 14, 5)
+        np.testing.assert_allclose(series['baseline'].to_numpy(), median, rtol=1e-9)
+        np.testing.assert_allclose(series['mad'].to_numpy(), mad, rtol=1e-9)
+
+
+def test_series_spike_is_found_in_small_series():
+    days = pd.date_range('2024-01-01', periods=60, freq='D')
+    rng = np.random.default_rng(0)
+    big = pd.DataFrame({'date': days, 'entity': 'big', 'category': 'x', 'value': 10_000 + rng.normal(0, 300, 60)})
+    small = pd.DataFrame({'date': days, 'entity': 'small', 'category': 'x', 'value': 10 + rng.normal(0, 1, 60)})
+    small.loc[45, 'value'] = 40  # для большого ряда — шум, для маленького — всплеск
+    scored = SeriesAnomalyDetector(window=28).score(pd.concat([big, small], ignore_index=True))
+
+    flagged = scored[SeriesAnomalyDetector.flags(scored, 5.0)]
+    assert list(flagged['entity']) == ['small']
+    assert flagged['date'].iloc[0] == days[45]
+
+
+def test_seasonal_baseline_is_fitted_on_the_sample(rows):
+    detector = AnomalyDetector('seasonal', fit_sample=2_000).fit(rows)
+    reference = AnomalyDetector('seasonal', fit_sample=len(rows)).fit(rows.sample(n=2_000, random_state=42))
+    np.testing.assert_array_equal(detector.seasonal_baseline_, reference.seasonal_baseline_)
+    np.testing.assert_array_equal(detector.seasonal_spread_, reference.seasonal_spread_)
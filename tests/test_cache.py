@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from data.cache import DatasetCache
+
+MAPPING = {"date": "date", "value": "value", "entity": "entity", "category": "category"}
+
+
+def test_dataset_round_trip(tmp_path, sales_df):
+    cache = DatasetCache(str(tmp_path))
+    assert cache.get("abc", MAPPING) is None
+    assert cache.path("abc", MAPPING) is None
+
+    cache.put("abc", MAPPING, sales_df)
+
+    restored = cache.get("abc", MAPPING)
+    pd.testing.assert_frame_equal(restored, sales_df)
+    assert cache.path("abc", MAPPING).exists()
+    assert cache.last_mapping("abc") == MAPPING
+    # Другое сопоставление колонок — другой ключ
+    assert cache.get("abc", {**MAPPING, "category": "entity"}) is None
+
+
+def test_missing_dimension_values_survive(tmp_path, sales_df):
+    assert sales_df["entity"].isna().any()
+    cache = DatasetCache(str(tmp_path))
+    cache.put("abc", MAPPING, sales_df)
+
+    restored = cache.get("abc", MAPPING)
+    pd.testing.assert_series_equal(restored["entity"].isna(), sales_df["entity"].isna())
+    assert restored["entity"].cat.codes.min() == -1
+
+    # Ключи словаря под маской пропуска — неотрицательные: файл читают и внешние движки
+    with pa.memory_map(str(cache.path("abc", MAPPING)), "r") as source:
+        column = pa.ipc.open_file(source).read_all()["entity"].combine_chunks()
+    indices = column.indices
+    keys = np.frombuffer(indices.buffers()[1], dtype=indices.type.to_pandas_dtype())
+    assert keys[indices.offset:indices.offset + len(indices)].min() >= 0
+    assert column.null_count == sales_df["entity"].isna().sum()
+
+
+def test_corrupt_file_is_a_miss(tmp_path, sales_df):
+    cache = DatasetCache(str(tmp_path))
+    cache.put("abc", MAPPING, sales_df)
+    cache.path("abc", MAPPING).write_bytes(b"not an arrow file")
+    assert cache.get("abc", MAPPING) is None
+
+
+def test_polars_reads_cached_file(tmp_path, sales_df):
+    pl = pytest.importorskip("polars")
+    cache = DatasetCache(str(tmp_path))
+    cache.put("abc", MAPPING, sales_df)
+    frame = pl.read_ipc(cache.path("abc", MAPPING))
+    assert frame["entity"].null_count() == sales_df["entity"].isna().sum()
+
+
+def test_disk_budget_evicts_least_recently_used(tmp_path, sales_df):
+    cache = DatasetCache(str(tmp_path))
+    for i, name in enumerate(["a", "b"]):
+        cache.put(name, MAPPING, sales_df)
+        os.utime(cache.path(name, MAPPING), (1_000 + i, 1_000 + i))
+    size = cache.path("a", MAPPING).stat().st_size
+    cache.max_bytes = 2 * size + size // 2
+
+    # Чтение обновляет mtime: "a" становится свежее "b"
+    assert cache.get("a", MAPPING) is not None
+    cache.put("c", MAPPING, sales_df)
+    assert cache.path("b", MAPPING) is None
+    assert cache.path("a", MAPPING) is not None and cache.path("c", MAPPING) is not None
+
+    # Файл больше всего бюджета остаётся — он только что записан и нужен сессии
+    cache.max_bytes = 1
+    cache.put_raw("d", sales_df)
+    assert cache.get_raw("d") is not None
+    assert sorted(p.name for p in tmp_path.glob("*.arrow")) == ["d.raw.arrow"]
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ui.components.charts import density_bins, downsample_line, line_trace, scatter_traces
+
+
+def reference_lttb(x, y, n_out):
+    """LTTB по описанию Steinarsson (2013), без оптимизаций"""
+    n = len(x)
+    every = (n - 2) / (n_out - 2)
+    out, a = [0], 0
+    for i in range(n_out - 2):
+        nxt = range(int((i + 1) * every) + 1, min(int((i + 2) * every) + 1, n))
+        avg_x, avg_y = np.mean(x[list(nxt)]), np.mean(y[list(nxt)])
+        bucket = range(int(i * every) + 1, int((i + 1) * every) + 1)
+        areas = [abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a])) for j in bucket]
+        a = bucket[int(np.argmax(areas))]
+        out.append(a)
+    return np.array(out + [n - 1])
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    x = np.arange(20_000, dtype=np.float64)
+    y = np.cumsum(rng.normal(size=len(x)))
+    y[12_345] += 500  # одиночный пик
+    return x, y
+
+
+def test_small_series_is_untouched(series):
+    x, y = series
+    np.testing.assert_array_equal(downsample_line(x[:100], y[:100], budget=500), np.arange(100))
+
+
+def test_lttb_matches_reference(series):
+    x, y = series
+    idx = downsample_line(x, y, budget=400)
+    assert len(idx) == 400
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert (np.diff(idx) > 0).all()
+    np.testing.assert_array_equal(idx, reference_lttb(x, y, 400))
+
+
+def test_minmax_keeps_extremes_of_every_bucket(series):
+    x, y = series
+    budget = 400
+    idx = downsample_line(x, y, budget=budget, method='minmax')
+    assert len(idx) <= budget
+    assert (np.diff(idx) > 0).all()
+    assert 12_345 in idx
+    assert np.argmin(y) in idx and np.argmax(y) in idx
+    for b in range(budget // 2):
+        start, end = b * len(y) // (budget // 2), (b + 1) * len(y) // (budget // 2)
+        kept = idx[(idx >= start) & (idx < end)]
+        assert y[kept].max() == y[start:end].max() and y[kept].min() == y[start:end].min()
+
+
+def test_dates_on_x_axis(series):
+    _, y = series
+    dates = pd.date_range('2020-01-01', periods=len(y), freq='h').to_numpy()
+    trace = line_trace(dates, y, budget=300)
+    assert len(trace.x) == 300
+    assert np.asarray(trace.x).dtype.kind == 'M'
+
+
+def test_density_bins_preserve_count():
+    rng = np.random.default_rng(1)
+    x, y = rng.normal(size=50_000), rng.normal(size=50_000)
+    bins = density_bins(x, y, budget=900)
+    assert len(bins) <= 900
+    assert bins['count'].sum() == 50_000
+
+
+def test_flagged_points_are_never_binned():
+    rng = np.random.default_rng(2)
+    y = rng.normal(size=30_000)
+    flags = np.zeros(len(y), dtype=bool)
+    flags[::1000] = True
+    normal, flagged = scatter_traces(np.arange(len(y)), y, flags, budget=500)
+    assert len(normal.x) <= 500
+    np.testing.assert_array_equal(flagged.y, y[flags])
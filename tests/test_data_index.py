@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+from core.data_index import DatasetIndex
+from ui.components.filter_manager import FilterManager
+
+
+def states(df):
+    days = df['date'].dt.normalize().unique()
+    entities = df['entity'].cat.categories.tolist()
+    categories = df['category'].cat.categories.tolist()
+    return [
+        {},
+        {'date_range': (days[10].date(), days[40].date())},
+        {'date_range': (days[-1].date(), days[-1].date())},
+        {'selected_entities': entities[:3]},
+        {'selected_entities': entities},
+        {'selected_categories': categories[1:2], 'selected_entities': entities[::2]},
+        {'date_range': (days[5].date(), days[90].date()), 'selected_categories': categories[:2]},
+        {'selected_entities': ['нет такого объекта']},
+    ]
+
+
+@pytest.mark.parametrize('case', range(8))
+def test_index_filter_matches_masks(sales_df, case):
+    state = states(sales_df)[case]
+    manager = FilterManager()
+    expected = manager._apply_masks(sales_df, state)
+    actual = manager.apply(sales_df, state, DatasetIndex(sales_df))
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected)
+
+
+def test_non_categorical_dimension_falls_back_to_masks(sales_df):
+    df = sales_df.astype({'entity': object})
+    index = DatasetIndex(df)
+    assert index.is_sorted and not index.has_codes('entity')
+    manager = FilterManager()
+    entities = sales_df['entity'].cat.categories.tolist()
+    for state in ({'selected_entities': entities[:2]},
+                  {'selected_entities': entities, 'date_range': (pd.Timestamp('2024-02-01'), pd.Timestamp('2024-03-01'))}):
+        pd.testing.assert_frame_equal(manager.apply(df, state, index).reset_index(drop=True),
+                                      manager._apply_masks(df, state))
+
+
+def test_date_slice_bounds(sales_df):
+    index = DatasetIndex(sales_df)
+    start, end = pd.Timestamp('2024-02-01'), pd.Timestamp('2024-02-10')
+    rows = index.date_slice(start, end)
+    dates = sales_df['date']
+    assert ((dates.iloc[rows] >= start) & (dates.iloc[rows] <= end)).all()
+    assert rows.stop - rows.start == ((dates >= start) & (dates <= end)).sum()
+    # Пустой диапазон — пустой срез, а не ошибка
+    empty = index.date_slice(end, start)
+    assert empty.stop == empty.start
+
+
+def test_selection_mask_excludes_missing(sales_df):
+    index = DatasetIndex(sales_df)
+    entities = sales_df['entity'].cat.categories.tolist()
+    mask = index.selection_mask('entity', entities, slice(0, len(sales_df)))
+    assert (mask == sales_df['entity'].notna().to_numpy()).all()
+    # Выбраны все значения, но есть пропуски — маска нужна, иначе пустые entity попадут в выборку
+    assert not index.is_full_selection('entity', entities)
+    assert index.is_full_selection('entity', [])
+    categories = sales_df['category'].cat.categories.tolist()
+    assert index.is_full_selection('category', categories)
+    assert not index.is_full_selection('category', categories[1:])
+
+
+def test_unsorted_frame_falls_back_to_masks(sales_df):
+    shuffled = sales_df.sample(frac=1, random_state=0).reset_index(drop=True)
+    index = DatasetIndex(shuffled)
+    assert not index.is_sorted
+    state = {'date_range': (pd.Timestamp('2024-02-01'), pd.Timestamp('2024-03-01'))}
+    manager = FilterManager()
+    pd.testing.assert_frame_equal(manager.apply(shuffled, state, index), manager._apply_masks(shuffled, state))
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from core.data_loader import DataLoader
+from ui.components.column_mapper import ColumnMapper
+
+MAPPING = {"date": "day", "value": "amount", "entity": "store", "category": "group",
+           "qty": "qty", "channel": "channel", "price": "price"}
+
+
+def write_csv(path, n_rows=5_000, seed=1):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "day": pd.date_range("2024-01-01", periods=n_rows, freq="37min").strftime("%d.%m.%Y %H:%M"),
+        "amount": rng.gamma(2, 100, n_rows).round(2),
+        "store": rng.choice([f"S{i:02d}" for i in range(20)], n_rows),
+        "group": rng.choice(["a", "b", "c"], n_rows),
+        # Диапазон qty растёт к концу файла: ранние чанки помещаются в int8, поздние — нет
+        "qty": np.arange(n_rows) // 10,
+        "channel": rng.choice(["web", "shop", None], n_rows),
+        "price": rng.random(n_rows),
+    }).to_csv(path, index=False)
+
+
+def test_streaming_matches_eager_load(tmp_path):
+    path = tmp_path / "sales.csv"
+    write_csv(path)
+
+    eager = ColumnMapper.apply(pd.read_csv(path), MAPPING)
+    streamed = DataLoader().load_streaming(str(path), MAPPING, chunksize=700)
+
+    pd.testing.assert_frame_equal(streamed, eager)
+
+
+def test_extra_columns_are_narrowed_losslessly(tmp_path):
+    path = tmp_path / "sales.csv"
+    write_csv(path)
+    df = ColumnMapper.apply(pd.read_csv(path), MAPPING)
+
+    assert df["qty"].dtype == np.int16
+    assert isinstance(df["channel"].dtype, pd.CategoricalDtype)
+    assert list(df["channel"].cat.categories) == ["shop", "web"]
+    # Случайные float64 во float32 не помещаются — колонка остаётся как есть
+    assert df["price"].dtype == np.float64
+
+
+def test_streaming_sorts_rows_across_chunks(tmp_path):
+    path = tmp_path / "sales.csv"
+    write_csv(path)
+    pd.read_csv(path).sample(frac=1, random_state=0).to_csv(path, index=False)
+
+    eager = ColumnMapper.apply(pd.read_csv(path), MAPPING)
+    streamed = DataLoader().load_streaming(str(path), MAPPING, chunksize=700)
+
+    assert streamed["date"].is_monotonic_increasing
+    pd.testing.assert_frame_equal(streamed, eager)
+
+
+def test_extra_columns_named_like_roles_are_kept():
+    raw = pd.DataFrame({
+        "day": ["01.02.2024", "02.02.2024"], "amount": [1.5, 2.5],
+        "value": ["a", "b"], "cal_day": [7, 8], "value_доп": [0.5, 0.25],
+    })
+    extra = ColumnMapper.extra_mapping(["value", "cal_day", "value_доп"])
+    assert extra == {"value_доп2": "value", "cal_day_доп": "cal_day", "value_доп": "value_доп"}
+
+    df = ColumnMapper.apply(raw, {"date": "day", "value": "amount", **extra})
+    assert df.columns.is_unique
+    assert df["value"].tolist() == [1.5, 2.5]
+    assert df["value_доп2"].astype(str).tolist() == ["a", "b"]
+    assert df["cal_day_доп"].tolist() == [7, 8]
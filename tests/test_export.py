@@ -0,0 +1,108 @@
+import gzip
+import os
+from concurrent.futures import Future
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from config import config
+from ui.components.export import ExportManager
+
+
+@pytest.fixture
+def rows():
+    return pd.DataFrame({
+        'date': pd.to_datetime(['2024-01-01 10:00', None, '2024-01-03 00:00']),
+        'entity': pd.Categorical(['A', None, 'B']),
+        'value': [1.5, np.nan, np.inf],
+        'ratio': np.array([-np.inf, 0.25, np.nan], dtype=np.float32),
+        'cal_day': np.array([19723, 19724, 19725], dtype=np.int32),
+    })
+
+
+@pytest.fixture
+def metrics():
+    return {
+        'abc_xyz': pd.DataFrame({'category': ['x', 'y'], 'value': [10.0, 0.0],
+                                 'abc_class': ['A', 'C'], 'cv': [12.5, np.nan], 'xyz_class': ['X', 'Z']}),
+        'scenarios': {'reduce_a': 10.0}, 'savings_a': 5, 'total_savings': 5,
+    }
+
+
+@pytest.fixture
+def built(request):
+    paths = []
+
+    def build(*args):
+        path = ExportManager.build(*args)
+        paths.append(path)
+        return path
+
+    yield build
+    for path in paths:
+        os.remove(path)
+
+
+def test_excel_writes_nan_and_inf_as_empty_cells(rows, metrics, built):
+    book = openpyxl.load_workbook(built(rows, metrics, 'xlsx'), read_only=True)
+    data = list(book['Исходные данные'].iter_rows(values_only=True))
+    assert data[0] == ('date', 'entity', 'value', 'ratio')  # служебные cal_* не экспортируются
+    assert data[1][2:] == (1.5, None)
+    assert data[2] == (None, None, None, 0.25)
+    assert data[3][2:] == (None, None)
+
+    abc = list(book['ABC-XYZ'].iter_rows(values_only=True))
+    assert abc[2] == ('y', 0, 'C', 'нет данных', 'Z')  # CV не определён — подпись, а не пустая ячейка
+
+
+def test_csv_and_parquet_keep_all_rows(rows, metrics, built):
+    with gzip.open(built(rows, metrics, 'csv.gz'), 'rt', encoding='utf-8-sig') as fh:
+        csv = pd.read_csv(fh)
+    assert list(csv.columns) == ['date', 'entity', 'value', 'ratio']
+    assert np.isinf(csv['value'].iloc[2])
+
+    parquet = pd.read_parquet(built(rows, metrics, 'parquet'))
+    pd.testing.assert_frame_equal(parquet, rows.drop(columns='cal_day'))
+
+
+def test_large_frame_is_split_across_sheets(monkeypatch, metrics, built):
+    monkeypatch.setattr(ExportManager, 'EXCEL_MAX_ROWS', 11)
+    df = pd.DataFrame({'value': np.arange(25, dtype=np.float64)})
+    book = openpyxl.load_workbook(built(df, metrics, 'xlsx'), read_only=True)
+    sheets = [name for name in book.sheetnames if name.startswith('Исходные данные')]
+    assert sheets == ['Исходные данные', 'Исходные данные (2)', 'Исходные данные (3)']
+    assert sum(book[name].max_row - 1 for name in sheets) == 25
+
+
+def test_excel_writes_timezone_aware_dates(metrics, built):
+    df = pd.DataFrame({'date': pd.to_datetime(['2024-01-03T08:15:00Z', '2024-01-04T00:00:00Z']), 'value': [1.0, 2.0]})
+    book = openpyxl.load_workbook(built(df, metrics, 'xlsx'), read_only=True)
+    data = list(book['Исходные данные'].iter_rows(values_only=True))
+    assert [row[0] for row in data[1:]] == [pd.Timestamp('2024-01-03 08:15'), pd.Timestamp('2024-01-04')]
+
+
+def test_old_reports_are_swept_on_build(tmp_path, monkeypatch, rows, metrics):
+    monkeypatch.setattr(config, 'EXPORT_TMP_DIR', str(tmp_path))
+    old, fresh = tmp_path / f'{ExportManager.TMP_PREFIX}old.xlsx', tmp_path / f'{ExportManager.TMP_PREFIX}fresh.xlsx'
+    other = tmp_path / 'report_not_ours.xlsx'
+    for path in (old, fresh, other):
+        path.write_bytes(b'x')
+    stale = os.path.getmtime(old) - (config.EXPORT_TMP_MAX_AGE_MIN + 1) * 60
+    os.utime(old, (stale, stale))
+    os.utime(other, (stale, stale))
+
+    path = ExportManager.build(rows, metrics, 'csv.gz')
+    assert not old.exists() and fresh.exists() and other.exists()
+    assert os.path.dirname(path) == str(tmp_path)
+
+
+def test_replaced_running_job_removes_its_file(tmp_path):
+    path = tmp_path / f'{ExportManager.TMP_PREFIX}running.parquet'
+    path.write_bytes(b'x')
+    future = Future()
+    ExportManager._discard({'future': future})
+    assert path.exists()
+    future.set_result(str(path))
+    assert not path.exists()
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from data.cache import FilterResultCache
+
+MB = 1024 * 1024
+
+
+def frame(mb: float) -> pd.DataFrame:
+    return pd.DataFrame({'value': np.zeros(int(mb * MB) // 8)})
+
+
+def test_lru_evicts_least_recently_used():
+    cache = FilterResultCache(max_mb=100, max_entries=3)
+    for key in 'abc':
+        cache.put(key, frame(0.1))
+    assert cache.get('a') is not None  # 'a' становится самым свежим
+    cache.put('d', frame(0.1))
+
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in 'acd')
+    assert cache.stats()['entries'] == 3
+
+
+def test_byte_budget_is_enforced():
+    cache = FilterResultCache(max_mb=3, max_entries=100)
+    for key in 'abcd':
+        cache.put(key, frame(1))
+    assert cache.get('a') is None
+    assert cache.stats()['size_mb'] <= 3
+
+    # Значение больше всего бюджета не кэшируется и никого не вытесняет
+    cache.put('huge', frame(5))
+    assert cache.get('huge') is None
+    assert cache.get('d') is not None
+
+
+def test_get_or_compute_counts_hits_and_misses():
+    cache = FilterResultCache(max_mb=10, max_entries=10)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return frame(0.01), {'total': 1.0}
+
+    first = cache.get_or_compute('k', compute)
+    second = cache.get_or_compute('k', compute)
+    assert second is first
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_size_counts_object_strings():
+    labels = [f'очень длинное название объекта {i:06d}' for i in range(50_000)]
+    df = pd.DataFrame({'note': pd.Series(labels, dtype=object)})
+    shallow = df.memory_usage(index=True, deep=False).sum()
+    # Указатели object-колонки — лишь малая часть: сами строки тоже в бюджете
+    assert FilterResultCache._estimate_size(df) > 10 * shallow
+    assert FilterResultCache._estimate_size((df, {'metric': df['note']})) > 20 * shallow
@@ -0,0 +1,20 @@
+from datetime import date
+
+from ui.components.filter_manager import FilterManager
+
+
+def test_filter_key_ignores_selection_order():
+    state = {'selected_entities': ['B', 'A', 'C'], 'selected_categories': ['y', 'x'],
+             'date_range': (date(2024, 1, 1), date(2024, 2, 1))}
+    reordered = {'selected_entities': ['C', 'B', 'A'], 'selected_categories': ['x', 'y'],
+                 'date_range': (date(2024, 1, 1), date(2024, 2, 1))}
+    assert FilterManager.filter_key(state) == FilterManager.filter_key(reordered)
+
+
+def test_filter_key_depends_on_filters_only():
+    state = {'selected_entities': ['A'], 'date_range': (date(2024, 1, 1), date(2024, 2, 1))}
+    assert FilterManager.filter_key(state) == FilterManager.filter_key({**state, 'reduce_a': 50.0})
+    assert FilterManager.filter_key(state) != FilterManager.filter_key({**state, 'selected_entities': ['A', 'B']})
+    # Диапазон — не множество: начало и конец не переставляются
+    swapped = {**state, 'date_range': (date(2024, 2, 1), date(2024, 1, 1))}
+    assert FilterManager.filter_key(state) != FilterManager.filter_key(swapped)
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from core.forecast_engine import ForecastEngine
+from data.cache import ForecastStateStore
+
+
+class FixedParamsEngine(ForecastEngine):
+    """Сетка из одной точки: полное обучение и дообновление идут по одной рекурсии"""
+    ALPHAS, BETAS, GAMMAS = (0.3,), (0.05,), (0.1,)
+
+
+def daily_rows(days: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2024-01-01', periods=days, freq='D')
+    frames = []
+    for i, entity in enumerate(['A', 'B', 'C']):
+        weekly = 20 * np.sin(2 * np.pi * np.arange(days) / 7)
+        value = 100 * (i + 1) + 0.5 * np.arange(days) + weekly + rng.normal(0, 5, days)
+        frames.append(pd.DataFrame({'date': dates, 'entity': entity, 'value': value}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_incremental_update_matches_full_fit(tmp_path):
+    store = ForecastStateStore(str(tmp_path))
+    history = daily_rows(130)
+    # 5 новых дней — меньше FORECAST_REFIT_EVERY_DAYS, состояния дообновляются
+    first = history[history['date'] < '2024-05-05']
+
+    FixedParamsEngine(max_workers=1).fit(first, 'entity', store=store, scope='s')
+    incremental = FixedParamsEngine(max_workers=1).fit(history, 'entity', store=store, scope='s')
+    full = FixedParamsEngine(max_workers=1).fit(history, 'entity')
+
+    # Параметры не переподбирались, fitted_date — от первого обучения
+    assert (incremental.state_['fitted_date'] == pd.Timestamp('2024-05-04')).all()
+    for col in ('level', 'trend', 'sigma', 'n_fitted'):
+        np.testing.assert_allclose(incremental.state_[col].to_numpy(dtype=float),
+                                   full.state_[col].to_numpy(dtype=float), rtol=1e-9)
+    pd.testing.assert_frame_equal(incremental.predict(14), full.predict(14), rtol=1e-9)
+
+
+def test_changed_history_is_refitted(tmp_path):
+    store = ForecastStateStore(str(tmp_path))
+    history = daily_rows(130)
+    FixedParamsEngine(max_workers=1).fit(history[history['date'] < '2024-05-05'], 'entity', store=store, scope='s')
+
+    # Те же имена рядов, но другие данные: последнее учтённое значение не совпадает
+    other = daily_rows(130, seed=1)
+    refit = FixedParamsEngine(max_workers=1).fit(other, 'entity', store=store, scope='s')
+    assert (refit.state_['fitted_date'] == other['date'].max()).all()
+
+
+def test_scopes_are_isolated(tmp_path):
+    store = ForecastStateStore(str(tmp_path))
+    FixedParamsEngine(max_workers=1).fit(daily_rows(100), 'entity', store=store, scope='dataset-1')
+    assert store.load('dataset-2') is None
+    assert ForecastStateStore.make_scope('key-1', 'entity') != ForecastStateStore.make_scope('key-2', 'entity')
+
+
+def test_forecast_shape_and_interval():
+    forecast = ForecastEngine(max_workers=1).forecast(daily_rows(90), 'entity', horizon=10)
+    assert len(forecast) == 30
+    assert set(forecast['entity']) == {'A', 'B', 'C'}
+    assert (forecast['lower'] <= forecast['forecast']).all() and (forecast['forecast'] <= forecast['upper']).all()
+    assert forecast['date'].min() == pd.Timestamp('2024-03-31')
+
+
+def test_batch_forecast_updates_states_on_a_longer_upload(tmp_path, monkeypatch):
+    import core.forecast_engine as forecast_engine
+    from config import config
+    from ui.tabs.forecast_tab import _batch_forecast, forecast_scope
+
+    monkeypatch.setattr(config, 'FORECAST_CACHE_DIR', str(tmp_path))
+    refitted, updated = [], []
+    fit_matrix, update_state = ForecastEngine._fit_matrix, forecast_engine._update_state
+    monkeypatch.setattr(ForecastEngine, '_fit_matrix',
+                        lambda self, matrix: refitted.extend(matrix.columns) or fit_matrix(self, matrix))
+    monkeypatch.setattr(forecast_engine, '_update_state',
+                        lambda group, *args: updated.extend(group.index) or update_state(group, *args))
+
+    history = daily_rows(130)
+    mapping = {'date': 'date', 'entity': 'entity', 'value': 'value'}
+    # Новая загрузка и более широкий диапазон дат меняют result_key, но не ключ состояний
+    scope = forecast_scope(mapping, 'entity', {'selected_entities': ['B', 'A']})
+    assert scope == forecast_scope(mapping, 'entity', {'selected_entities': ['A', 'B'],
+                                                       'date_range': ('2024-01-01', '2024-05-09')})
+
+    _batch_forecast('upload-1', scope, 'entity', 14, history[history['date'] < '2024-05-09'])
+    assert sorted(refitted) == ['A', 'B', 'C'] and not updated
+
+    refitted.clear()
+    _batch_forecast('upload-2', scope, 'entity', 14, history)
+    assert not refitted
+    assert sorted(updated) == ['A', 'B', 'C']
+
+
+def test_state_store_is_bounded(tmp_path):
+    store = ForecastStateStore(str(tmp_path))
+    state = FixedParamsEngine(max_workers=1).fit(daily_rows(60), 'entity').state_
+    store.save('old', state)
+    size = (tmp_path / 'old.pkl').stat().st_size
+    store.max_bytes = size + size // 2
+    store.save('new', state)
+    assert store.load('old') is None
+    assert store.load('new') is not None
@@ -0,0 +1,176 @@
+import math
+import os
+from functools import partial
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.analytics_engine import AnalyticsEngine
+from core.data_index import DatasetIndex
+from core.query_backend import BACKENDS, QueryBackend, create_backend
+from core.rollups import CALENDAR_COLS, TimeRollups
+from data.cache import DatasetCache
+from ui.components.export import ExportManager
+from ui.components.filter_manager import FilterManager
+
+MAPPING = {'date': 'date', 'entity': 'entity', 'category': 'category', 'value': 'value'}
+# value хранится во float32: pandas суммирует во float32, движки — во float64
+RTOL = 1e-6
+
+
+def filter_states(df: pd.DataFrame) -> Dict[str, Dict[str, Any]]:
+    start, end = df['date'].min().date(), df['date'].max().date()
+    middle = start + (end - start) / 2
+    entities = df['entity'].cat.categories.tolist()
+    categories = df['category'].cat.categories.tolist()
+    return {
+        'без фильтров': {},
+        'диапазон дат': {'date_range': (start, middle)},
+        'объекты': {'selected_entities': entities[:5]},
+        'категории': {'selected_categories': categories[:2]},
+        'всё вместе': {'date_range': (middle, end), 'selected_entities': entities[::3],
+                       'selected_categories': categories[1:]},
+        'пустой результат': {'selected_entities': ['нет такого объекта']},
+    }
+
+
+STATES = ['без фильтров', 'диапазон дат', 'объекты', 'категории', 'всё вместе', 'пустой результат']
+
+
+def normalize(value: Any) -> Any:
+    """Метрика в сравнимый вид: категории → строки, строки таблиц — в порядке ключей"""
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if isinstance(value, pd.DataFrame):
+        # Безымянный индекс — порядок строк после группировки, он у движков разный
+        frame = value.reset_index(drop=all(name is None for name in value.index.names))
+        for col in frame.columns:
+            if isinstance(frame[col].dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(frame[col]):
+                frame[col] = frame[col].astype(str)
+        keys = [c for c in frame.columns if frame[c].dtype == object] or list(frame.columns)
+        return frame.sort_values(keys).reset_index(drop=True)
+    if hasattr(value, 'frame'):  # ABCClassifier
+        return normalize(value.frame())
+    return value
+
+
+def assert_metrics_equal(expected: Dict[str, Any], actual: Dict[str, Any]) -> None:
+    assert expected.keys() == actual.keys()
+    for key, value in expected.items():
+        if key == 'period_aggregates':
+            continue  # проверяется через abc_xyz
+        left, right = normalize(value), normalize(actual[key])
+        if isinstance(left, pd.DataFrame):
+            pd.testing.assert_frame_equal(left, right, check_dtype=False, check_exact=False, rtol=RTOL, obj=key)
+        elif isinstance(left, float) or isinstance(right, float):
+            assert math.isclose(left, right, rel_tol=RTOL, abs_tol=1e-6), key
+        else:
+            assert left == right, key
+
+
+@pytest.fixture
+def dataset(sales_df, tmp_path):
+    cache = DatasetCache(str(tmp_path))
+    cache.put('check', MAPPING, sales_df)
+    return sales_df, cache.path('check', MAPPING)
+
+
+@pytest.fixture(params=list(BACKENDS))
+def backend(request, dataset) -> QueryBackend:
+    backend = create_backend(request.param, dataset[1])
+    if backend is None:
+        pytest.skip(f"{request.param} не установлен")
+    return backend
+
+
+def filtered_rows(df: pd.DataFrame, state: Dict[str, Any]) -> pd.DataFrame:
+    return FilterManager().apply(df, state, DatasetIndex(df))
+
+
+def comparable(frame: pd.DataFrame) -> pd.DataFrame:
+    """Одинаковые типы у pandas и движков: дата — в нс, измерения — строки"""
+    frame = frame.reset_index(drop=True).assign(date=frame['date'].astype('datetime64[ns]').to_numpy())
+    for col in ('entity', 'category'):
+        frame[col] = frame[col].astype(object)
+    return frame
+
+
+def test_abstract_base_cannot_be_instantiated(tmp_path):
+    with pytest.raises(TypeError):
+        QueryBackend(tmp_path / 'x.arrow')
+
+
+def test_create_backend_without_file_falls_back_to_pandas(tmp_path):
+    assert create_backend('polars', tmp_path / 'missing.arrow') is None
+    assert create_backend('pandas', tmp_path) is None
+
+
+@pytest.mark.parametrize('title', STATES)
+def test_metrics_match_pandas(backend, dataset, title):
+    df, _ = dataset
+    state = filter_states(df)[title]
+    engine = AnalyticsEngine()
+    expected = engine.calculate_base_metrics(filtered_rows(df, state), state)
+    actual = engine.calculate_base_metrics(backend.sample(state, len(df)), state, backend.cube(state))
+    assert_metrics_equal(expected, actual)
+
+
+@pytest.mark.parametrize('title', STATES)
+def test_count_sample_and_batches_match_filter(backend, dataset, title):
+    df, _ = dataset
+    state = filter_states(df)[title]
+    expected = filtered_rows(df, state)
+
+    assert backend.count(state) == len(expected)
+    # Лимит не меньше числа строк — выборка совпадает со всем фильтром
+    pd.testing.assert_frame_equal(comparable(backend.sample(state, len(df))), comparable(expected), check_dtype=False)
+
+    batches = list(backend.batches(state, 1_000))
+    assert batches and all(len(batch) <= 1_000 for batch in batches)
+    pd.testing.assert_frame_equal(comparable(pd.concat(batches, ignore_index=True)), comparable(expected),
+                                  check_dtype=False)
+
+
+def test_sample_is_capped_and_ordered(backend, dataset):
+    df, _ = dataset
+    state = {'selected_categories': df['category'].cat.categories[:2].tolist()}
+    sample = backend.sample(state, 500)
+    assert 0 < len(sample) <= 500
+    assert sample['date'].is_monotonic_increasing
+    assert set(sample['category'].astype(str)) <= set(state['selected_categories'])
+    # Словарь измерений — весь датасет, а не только попавшие в выборку значения
+    assert sample['entity'].cat.categories.tolist() == df['entity'].cat.categories.tolist()
+
+    empty = backend.sample(state, 0)
+    assert empty.empty and list(empty.columns) == list(df.columns)
+
+
+def test_dictionaries_and_bounds(backend, dataset):
+    df, _ = dataset
+    assert backend.dimension_values('entity') == df['entity'].cat.categories.tolist()
+    assert backend.dimension_values('category') == df['category'].cat.categories.tolist()
+    assert backend.date_bounds() == (df['date'].min(), df['date'].max())
+
+
+def test_rollups_from_hourly_totals_match_rows(backend, dataset):
+    df, _ = dataset
+    expected, actual = TimeRollups(df), TimeRollups(backend.hourly_totals())
+    for state in filter_states(df).values():
+        for freq in TimeRollups.FREQS:
+            pd.testing.assert_series_equal(actual.series(freq, state), expected.series(freq, state),
+                                           check_exact=False, rtol=RTOL)
+        np.testing.assert_allclose(actual.weekday_hour(state), expected.weekday_hour(state), rtol=RTOL)
+
+
+def test_export_streams_backend_batches(backend, dataset):
+    df, _ = dataset
+    state = filter_states(df)['всё вместе']
+    path = ExportManager.build(partial(backend.batches, state), {}, 'parquet')
+    try:
+        exported = pd.read_parquet(path)
+    finally:
+        os.remove(path)
+    expected = filtered_rows(df, state).drop(columns=list(CALENDAR_COLS))
+    pd.testing.assert_frame_equal(comparable(exported), comparable(expected), check_dtype=False)
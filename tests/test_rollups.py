@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.data_index import DatasetIndex
+from core.rollups import CALENDAR_COLS, TimeRollups, calendar_features, weekday
+from ui.components.filter_manager import FilterManager
+
+PERIOD_RULES = {'D': 'D', 'W': 'W-SUN', 'M': 'M'}
+
+
+def filter_states(df: pd.DataFrame):
+    entities = df['entity'].cat.categories.tolist()
+    categories = df['category'].cat.categories.tolist()
+    return [
+        {},
+        {'selected_entities': entities[:3]},
+        {'selected_categories': categories[1:3], 'selected_entities': entities[::2]},
+        # Диапазон начинается и кончается посреди недели и месяца
+        {'date_range': (pd.Timestamp('2024-01-10').date(), pd.Timestamp('2024-03-13').date())},
+        {'date_range': (pd.Timestamp('2024-02-07').date(), pd.Timestamp('2024-02-07').date()),
+         'selected_categories': categories[:1]},
+    ]
+
+
+def reference_rows(df: pd.DataFrame, state) -> pd.DataFrame:
+    """Строки, которые оставляет FilterManager: конец диапазона — полночь последнего дня"""
+    return FilterManager()._apply_masks(df, state)
+
+
+@pytest.fixture
+def rollups(sales_df):
+    return TimeRollups(sales_df)
+
+
+@pytest.mark.parametrize('freq', list(TimeRollups.FREQS))
+def test_series_matches_groupby(sales_df, rollups, freq):
+    for state in filter_states(sales_df):
+        rows = reference_rows(sales_df, state)
+        period = rows['date'].dt.to_period(PERIOD_RULES[freq]).dt.start_time
+        expected = rows['value'].astype(np.float64).groupby(period.to_numpy()).sum()
+        actual = rollups.series(freq, state)
+        np.testing.assert_array_equal(actual.index.to_numpy(), expected.index.to_numpy())
+        np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-9)
+
+
+def test_weekday_hour_matches_groupby(sales_df, rollups):
+    for state in filter_states(sales_df):
+        rows = reference_rows(sales_df, state)
+        expected = (rows['value'].astype(np.float64)
+                    .groupby([rows['date'].dt.dayofweek, rows['date'].dt.hour]).sum()
+                    .unstack(fill_value=0).reindex(index=range(7), columns=range(24), fill_value=0))
+        np.testing.assert_allclose(rollups.weekday_hour(state), expected.to_numpy(), rtol=1e-9, atol=1e-6)
+        np.testing.assert_allclose(rollups.by_weekday(state), expected.sum(axis=1).to_numpy(), rtol=1e-9)
+        np.testing.assert_allclose(rollups.by_hour(state), expected.sum(axis=0).to_numpy(), rtol=1e-9)
+
+
+def test_daily_rows_match_groupby(sales_df, rollups):
+    keys = ['date', 'entity', 'category']
+
+    def ordered(frame: pd.DataFrame) -> pd.DataFrame:
+        frame = frame.astype({'entity': str, 'category': str, 'value': np.float64})
+        return frame.sort_values(keys).reset_index(drop=True)
+
+    for state in filter_states(sales_df):
+        rows = reference_rows(sales_df, state)
+        expected = (rows.assign(date=rows['date'].dt.normalize(), value=rows['value'].astype(np.float64))
+                    .groupby(keys, observed=True, dropna=False)['value'].sum().reset_index())
+        pd.testing.assert_frame_equal(ordered(rollups.daily_rows(state)), ordered(expected),
+                                      check_exact=False, rtol=1e-9, check_dtype=False)
+
+
+def test_missing_entity_rows_stay_in_totals(sales_df, rollups):
+    assert sales_df['entity'].isna().any()
+    assert rollups.series('M', {}).sum() == pytest.approx(sales_df['value'].astype(np.float64).sum(), rel=1e-9)
+
+
+def test_totals_match_filter_manager_on_hourly_data(sales_df, rollups):
+    assert (sales_df['date'].dt.hour > 0).any()
+    for state in filter_states(sales_df):
+        filtered = FilterManager().apply(sales_df, state, DatasetIndex(sales_df))
+        expected = filtered['value'].astype(np.float64).sum()
+        for freq in TimeRollups.FREQS:
+            assert rollups.series(freq, state).sum() == pytest.approx(expected, rel=1e-9, abs=1e-6)
+        assert rollups.weekday_hour(state).sum() == pytest.approx(expected, rel=1e-9, abs=1e-6)
+
+
+def test_range_end_keeps_only_midnight_rows():
+    stamps = pd.to_datetime(['2024-03-01 00:00', '2024-03-01 18:00', '2024-03-02 00:00',
+                             '2024-03-02 00:30', '2024-03-02 09:00'])
+    df = pd.DataFrame({'date': stamps, 'value': [1.0, 2.0, 4.0, 8.0, 16.0]})
+    state = {'date_range': (pd.Timestamp('2024-03-01').date(), pd.Timestamp('2024-03-02').date())}
+    rollups = TimeRollups(df)
+    assert rollups.series('D', state).tolist() == [3.0, 4.0]
+    assert rollups.series('M', state).sum() == FilterManager().apply(df, state)['value'].sum() == 7.0
+
+
+def test_calendar_columns_are_optional(sales_df, rollups):
+    assert set(CALENDAR_COLS) <= set(sales_df.columns)
+    legacy = TimeRollups(sales_df.drop(columns=list(CALENDAR_COLS)))
+    for freq in TimeRollups.FREQS:
+        pd.testing.assert_series_equal(legacy.series(freq, {}), rollups.series(freq, {}))
+    np.testing.assert_array_equal(legacy.weekday_hour({}), rollups.weekday_hour({}))
+
+
+def test_calendar_features_match_datetime_accessors():
+    dates = pd.Series(pd.date_range('1969-12-25 22:00', '2031-03-02', freq='31h'))
+    codes = calendar_features(dates)
+    assert (codes['cal_day'] == (dates.dt.normalize() - pd.Timestamp('1970-01-01')).dt.days).all()
+    assert (codes['cal_dow'] == dates.dt.dayofweek).all()
+    assert (codes['cal_hour'] == dates.dt.hour).all()
+    months = dates.dt.to_period('M').astype('int64')
+    assert (codes['cal_month'] == months).all()
+    week_start = dates.dt.to_period('W-SUN').dt.start_time
+    assert (TimeRollups.period_start('W', codes['cal_week'].to_numpy()) == week_start.to_numpy()).all()
+    np.testing.assert_array_equal(weekday(dates.to_frame('date')), dates.dt.dayofweek.to_numpy())
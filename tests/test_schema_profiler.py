@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.schema_profiler import (
+    infer_roles,
+    parse_dates,
+    parse_numbers,
+    sniff_date_format,
+    sniff_formats,
+    sniff_number_format,
+)
+
+STAMPS = pd.Series(pd.date_range('2024-01-03 08:15', periods=200, freq='37h'))
+
+
+@pytest.mark.parametrize('fmt', ['%Y-%m-%d %H:%M:%S', '%d.%m.%Y %H:%M', '%d/%m/%Y', '%m/%d/%Y %H:%M', '%Y%m%d'])
+def test_date_format_round_trip(fmt):
+    text = STAMPS.dt.strftime(fmt)
+    assert sniff_date_format(text) == fmt
+    pd.testing.assert_series_equal(parse_dates(text, fmt), pd.to_datetime(text, format=fmt), check_dtype=False)
+
+
+def test_month_first_wins_ambiguous_dates():
+    # 01/02 и 02/01 одинаково разбираются обоими порядками — при равной доле берётся месяц-день, как в pd.to_datetime
+    text = pd.Series(['01/02/2024', '02/01/2024', '03/01/2024'])
+    assert sniff_date_format(text) == '%m/%d/%Y'
+    pd.testing.assert_series_equal(parse_dates(text, sniff_date_format(text)), pd.to_datetime(text), check_dtype=False)
+    # День больше 12 однозначно указывает на день-месяц
+    assert sniff_date_format(pd.Series(['13/01/2024', '28/02/2024', '31/12/2024'])) == '%d/%m/%Y'
+
+
+def test_iso_with_offset_and_fractions():
+    text = pd.Series(['2024-01-03T08:15:00.250+03:00', '2024-01-04T09:00:00.5+03:00'] * 10)
+    assert sniff_date_format(text) == 'ISO8601'
+    assert parse_dates(text, 'ISO8601').notna().all()
+
+
+def test_not_dates():
+    assert sniff_date_format(pd.Series(['магазин 1', 'магазин 2'] * 20)) is None
+    assert sniff_date_format(pd.Series(np.arange(40))) is None
+
+
+def test_parse_dates_falls_back_for_rare_other_layout():
+    text = pd.Series(['2024-01-03 08:15:00'] * 30 + ['2024-01-04', None])
+    parsed = parse_dates(text, sniff_date_format(text))
+    assert parsed.iloc[-2] == pd.Timestamp('2024-01-04')
+    assert pd.isna(parsed.iloc[-1])
+    assert parsed.iloc[:30].eq(pd.Timestamp('2024-01-03 08:15')).all()
+
+
+@pytest.mark.parametrize('values, expected_format, expected', [
+    (['1 234,56', '12,5', '-7,25'], (',', ' '), [1234.56, 12.5, -7.25]),
+    (['1.234,56', '12.345.678,9', '3,5'], (',', '.'), [1234.56, 12345678.9, 3.5]),
+    (['1,234.56', '12,345,678.9', '3.5'], ('.', ','), [1234.56, 12345678.9, 3.5]),
+    (['1,234', '12,345', '999'], ('.', ','), [1234.0, 12345.0, 999.0]),
+    # Одна точка и три знака — дробь, как у pd.to_numeric; несколько групп — тысячи
+    (['1.250', '12.500', '3.750'], ('.', ''), [1.25, 12.5, 3.75]),
+    (['1.250', '12.500.000', '3.750'], (',', '.'), [1250.0, 12500000.0, 3750.0]),
+    (['12,5', '3,25', '100'], (',', ''), [12.5, 3.25, 100.0]),
+    (['12.5', '3.25', '100'], ('.', ''), [12.5, 3.25, 100.0]),
+    (["1'234.5", "12'000", '7'], ('.', ' '), [1234.5, 12000.0, 7.0]),
+])
+def test_number_formats(values, expected_format, expected):
+    series = pd.Series(values * 10)
+    number_format = sniff_number_format(series)
+    assert number_format == expected_format
+    np.testing.assert_allclose(parse_numbers(series, number_format).to_numpy()[:len(values)], expected)
+
+
+def test_non_numeric_text_and_numeric_dtype():
+    assert sniff_number_format(pd.Series(['abc', 'магазин'] * 5)) is None
+    assert sniff_number_format(pd.Series([1.5, 2.5])) is None
+    # Без формата — обычный to_numeric, мусор — NaN
+    assert parse_numbers(pd.Series(['1.5', 'x'])).isna().tolist() == [False, True]
+
+
+def test_sniff_formats_uses_mapping():
+    df = pd.DataFrame({'Дата': STAMPS.dt.strftime('%d.%m.%Y'), 'Сумма': ['1 234,5'] * len(STAMPS)})
+    assert sniff_formats(df, {'date': 'Дата', 'value': 'Сумма'}) == {'date': '%d.%m.%Y', 'value': (',', ' ')}
+
+
+def test_infer_roles_by_name_and_by_statistics():
+    rng = np.random.default_rng(0)
+    n = 400
+    named = pd.DataFrame({
+        'order_date': STAMPS.sample(n, replace=True, random_state=0).dt.strftime('%Y-%m-%d').to_numpy(),
+        'revenue': rng.random(n) * 100,
+        'store': rng.choice([f'S{i}' for i in range(40)], n),
+        'category': rng.choice(['A', 'B', 'C'], n),
+    })
+    assert infer_roles(named) == {'date': 'order_date', 'value': 'revenue', 'entity': 'store', 'category': 'category'}
+
+    # Имена ни о чём не говорят: роли — по формату дат, дробности чисел и числу уникальных значений
+    anonymous = pd.DataFrame({
+        'c1': np.arange(n),
+        'c2': named['order_date'].str.replace('-', '.'),
+        'c3': [f'{v:.2f}'.replace('.', ',') for v in named['revenue']],
+        'c4': named['store'],
+        'c5': named['category'],
+    })
+    assert infer_roles(anonymous) == {'date': 'c2', 'value': 'c3', 'entity': 'c4', 'category': 'c5'}